@@ -1,7 +1,35 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+import base64
+import contextvars
+import hashlib
+import heapq
+import itertools
 import os
+import re
+import threading
+import time
 import pymysql
-from typing import List, Dict, Any
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List
+
+from cache import TTLCache
+from caedec_catalog import CatalogHolder
+from circuit_breaker import OPEN as CIRCUIT_OPEN, CircuitBreaker
+from fuzzy_search import FuzzyIndex, np as fuzzy_np
+from health import HealthMonitor
+from db_pool import ConnectionPool, ProcessLocalPool
+from llm_gate import LLMGate, LLMSaturated, DeadlineExceeded
+from metrics import (REGISTRY, REQUESTS, FALLBACKS, EMPTY_RESULTS, LLM_ERRORS, PROMPT_CHARS,
+                     ROUTES, LLM_CALLS_AVOIDED, COALESCED, CIRCUIT_TRANSITIONS, stage_timer, start_request_timings, current_request_timings, server_timing_header)
+from prompt_builder import SYSTEM_INSTRUCTION, build_contents, build_question, compact_prompt_chars, is_approximate
+from router import ROUTE_FOLLOW_UP, ROUTE_OPEN, RoutedMessage, caedec_query, classify_text, route_message
+from sessions import SessionStore, is_follow_up
+from singleflight import SingleFlight
+from suggest import SuggestIndex
+from search_export import CSV_DEFAULT_FIELDS, EXPORT_FIELDS, FORMATS, export_chunks, parse_fields, row_values
+from search_index import SearchIndex, extract_keywords, normalize_question, normalize_text, parse_caedec_numbers
 
 # Intentamos importar el SDK oficial de Google GenAI si está instalado
 try:
@@ -17,7 +45,20 @@ except Exception:
 
 load_dotenv()
 
+
+
+class RowJSONProvider(DefaultJSONProvider):
+    """Serializa también las filas de solo lectura del snapshot (snapshot.Row) como objetos JSON."""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Mapping):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
+
 app = Flask(__name__, static_folder='static', template_folder='templates')
+app.json = RowJSONProvider(app)
 
 DB_CONFIG = {
     'host': os.getenv('DB_HOST', 'localhost'),
@@ -29,46 +70,340 @@ DB_CONFIG = {
 }
 
 
+# Pool de conexiones: se reutilizan las conexiones en lugar de abrir una por llamada.
+# Se crea al primer uso en cada proceso (cada worker tras un fork tiene el suyo).
+db_pool = ProcessLocalPool(lambda: ConnectionPool(
+    lambda: pymysql.connect(**DB_CONFIG),
+    min_size=int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+    max_size=int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+    max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+    wait_timeout=float(os.getenv('DB_POOL_WAIT_TIMEOUT', '5')),
+    health_check_interval=float(os.getenv('DB_POOL_HEALTH_CHECK_INTERVAL', '0')),
+))
+
+
 def get_db_connection():
+    """Presta una conexión del pool; `connection.close()` la devuelve al pool."""
     try:
-        connection = pymysql.connect(**DB_CONFIG)
+        with stage_timer('db_connect'):
+            connection = db_pool.acquire()
         return connection
     except Exception as e:
         print(f"Error conectando a la base de datos: {e}")
         return None
 
 
-def search_in_database(query: str, limit: int = 10) -> List[Dict[str, Any]]:
+# Índice invertido opcional en memoria: SEARCH_INDEX_SOURCE = 'db' | 'csv' | 'snapshot' (vacío = desactivado)
+SEARCH_INDEX_SOURCE = os.getenv('SEARCH_INDEX_SOURCE', '').strip().lower()
+CAEDEC_CSV_PATH = os.getenv('CAEDEC_CSV_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CAEDEC1.csv'))
+# Snapshot columnar con el índice ya construido, generado con `python snapshot.py` (se abre con mmap)
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'informacion.snap'))
+
+search_index = None
+
+
+def init_search_index():
+    """Construye el índice en memoria al arrancar según SEARCH_INDEX_SOURCE."""
+    global search_index
+
+    if SEARCH_INDEX_SOURCE not in ('db', 'csv', 'snapshot'):
+        return None
+
+    try:
+        if SEARCH_INDEX_SOURCE == 'csv':
+            search_index = SearchIndex.from_csv(CAEDEC_CSV_PATH)
+        elif SEARCH_INDEX_SOURCE == 'snapshot':
+            search_index = SearchIndex.from_snapshot(SNAPSHOT_PATH)
+        else:
+            connection = get_db_connection()
+            if not connection:
+                return None
+            try:
+                search_index = SearchIndex.from_connection(connection)
+            finally:
+                connection.close()
+        print(f"Índice de búsqueda cargado desde '{SEARCH_INDEX_SOURCE}': {len(search_index)} registros")
+    except Exception as e:
+        print(f"Error construyendo el índice de búsqueda: {e}")
+        search_index = None
+    return search_index
+
 
+# Catálogo de actividades CAEDEC: se reconstruye si cambian COUNT(*) o MAX(id) de la tabla
+CAEDEC_CATALOG_REFRESH_INTERVAL = float(os.getenv('CAEDEC_CATALOG_REFRESH_INTERVAL', '60'))
+
+
+def _catalog_version():
+    """Versión de los datos: tamaño del índice en memoria, o (COUNT(*), MAX(id)) de la tabla."""
+    if search_index is not None:
+        return ('index', len(search_index))
     connection = get_db_connection()
     if not connection:
-        return []
+        raise RuntimeError('No se pudo conectar a la base de datos')
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS count, MAX(id) AS max_id FROM informacion")
+            result = cursor.fetchone() or {}
+            return (result.get('count'), result.get('max_id'))
+    finally:
+        connection.close()
 
-    STOP_WORDS = {
-        'el', 'la', 'de', 'del', 'los', 'las', 'un', 'una', 'unos', 'unas',
-        'es', 'son', 'esta', 'este', 'esa', 'ese', 'cual', 'que', 'quien',
-        'como', 'donde', 'cuando', 'por', 'para', 'con', 'sin', 'sobre',
-        'en', 'al', 'a', 'y', 'o', 'pero', 'si', 'no', 'me', 'te', 'se',
-        'cual', 'cuales', 'cuanto', 'cuantos', 'tiene', 'tienen', 'hay',
-        'eres', 'soy', 'somos', 'tengo', 'tienes', 'ser', 'estar',
-        'empresa', 'empresas', 'empresarial', 'empresariales',
-        'compania', 'compañia', 'companias', 'compañias',
-        'sociedad', 'sociedades', 'sa', 'srl', 'ltda',
-        'informacion', 'información', 'datos', 'dato',
-        'caedec', 'caeded', 'codigo', 'código', 'numero', 'número',
-        'nombre', 'llamada', 'llama', 'llamado', 'llamados'
-    }
 
+def _load_all_rows():
+    """Todas las filas de `informacion` (del índice en memoria si está cargado)."""
+    if search_index is not None:
+        return search_index.rows
+    connection = get_db_connection()
+    if not connection:
+        raise RuntimeError('No se pudo conectar a la base de datos')
     try:
         with connection.cursor() as cursor:
-            # Extraer palabras clave de la consulta y convertir a mayúsculas
-            keywords = query.upper().split()
+            cursor.execute(f"SELECT {SEARCH_COLUMNS} FROM informacion ORDER BY id")
+            return cursor.fetchall()
+    finally:
+        connection.close()
+
+
+caedec_catalog = CatalogHolder(_catalog_version, _load_all_rows, check_interval=CAEDEC_CATALOG_REFRESH_INTERVAL)
+
+
+def refresh_data():
+    """
+    Carga de datos de cada proceso, desde el hilo de `health_monitor` (nunca al
+    importar la app): precalienta el pool de conexiones, construye el índice en
+    memoria si se lee de la BD y comprueba la versión del catálogo CAEDEC, que
+    al cambiar reconstruye también /suggest y la búsqueda aproximada. Lo que
+    falla (p. ej. con la BD caída) se reintenta en la siguiente recogida.
+    """
+    try:
+        db_pool.warm_up()
+    except Exception as e:
+        print(f"No se pudo precalentar el pool de conexiones: {e}")
+    if SEARCH_INDEX_SOURCE == 'db' and search_index is None:
+        init_search_index()
+
+    previous = caedec_catalog.catalog
+    catalog = caedec_catalog.refresh_if_due()
+    if catalog is not None and catalog is not previous:
+        print(f"Catálogo CAEDEC cargado: {len(catalog)} códigos, {catalog.total_companies} empresas")
+
+
+def caedec_counts(codes) -> Dict[int, int]:
+    """Número total de empresas por código según el catálogo (vacío si no está cargado)."""
+    catalog = caedec_catalog.get()
+    return catalog.counts(codes) if catalog is not None else {}
+
+
+# Autocompletado de /suggest: se reconstruye con las mismas filas que el catálogo CAEDEC cuando cambian los datos
+SUGGEST_LIMIT = int(os.getenv('SUGGEST_LIMIT', '8'))
+SUGGEST_MIN_CHARS = int(os.getenv('SUGGEST_MIN_CHARS', '2'))
+
+suggest_index = None
+
+
+def build_suggest_index(rows, catalog):
+    """Oyente de `caedec_catalog`: reconstruye el índice de autocompletado con las filas ya cargadas."""
+    global suggest_index
+
+    # Mientras se construye se sigue usando el índice anterior
+    suggest_index = SuggestIndex(rows, catalog, catalog.version)
 
-            # Detectar si hay números (posible CAEDEC)
-            numbers = [k for k in keywords if k.isdigit()]
-            # Filtrar palabras de texto: longitud >= 2, no números, no stop words
-            text_keywords = [k for k in keywords if len(k) >= 2 and not k.isdigit() and k.lower() not in STOP_WORDS]
 
+def get_suggest_index():
+    """Índice de autocompletado vigente (None hasta que se carga el catálogo)."""
+    return suggest_index
+
+
+caedec_catalog.add_listener(build_suggest_index)
+
+
+# Columnas devueltas por las búsquedas (sin las columnas auxiliares *_norm y content_hash)
+SEARCH_COLUMNS = 'id, nombre, nombreLargo, caedec, descripcion'
+
+# Búsqueda de texto en SQL: 'auto' (FULLTEXT si el servidor tiene los índices, si no LIKE), 'fulltext' o 'like'
+SEARCH_SQL_BACKEND = os.getenv('SEARCH_SQL_BACKEND', 'auto').strip().lower()
+FULLTEXT_MIN_TOKEN = int(os.getenv('SEARCH_FULLTEXT_MIN_TOKEN', '3'))
+# Errores de MySQL que indican que no hay soporte/índices FULLTEXT (columna o índice inexistente, motor sin FULLTEXT)
+FULLTEXT_UNSUPPORTED_ERRORS = {1054, 1191, 1214}
+
+_fulltext_supported = SEARCH_SQL_BACKEND != 'like'
+
+
+def fulltext_expression(keyword: str):
+    """
+    Convierte una palabra clave en un término de MATCH ... AGAINST (BOOLEAN MODE) por prefijo.
+    Devuelve None si no tiene ningún término indexable (más corto que el mínimo de InnoDB).
+    """
+    terms = [t for t in re.sub(r'[^\w]+', ' ', normalize_text(keyword)).split() if len(t) >= FULLTEXT_MIN_TOKEN]
+    if not terms:
+        return None
+    if len(terms) == 1:
+        return terms[0] + '*'
+    return '(' + ' '.join(f'+{t}*' for t in terms) + ')'
+
+
+def search_fulltext(cursor, text_keywords: List[str], numbers: List[str], limit: int):
+    """
+    Búsqueda con los índices FULLTEXT de migrations/001_search_indexes.sql.
+
+    Mantiene los pesos de la búsqueda con LIKE (3 nombre, 2 nombreLargo,
+    1 descripcion, 10 CAEDEC) y la columna `relevancia`. Devuelve None si
+    la consulta no se puede resolver con FULLTEXT o el servidor no lo soporta,
+    para que se use la búsqueda con LIKE. Las palabras clave más cortas que el
+    mínimo indexable (p. ej. "S.A.") se ignoran si queda alguna otra.
+    """
+    global _fulltext_supported
+
+    if not _fulltext_supported:
+        return None
+    expressions = [e for e in (fulltext_expression(k) for k in text_keywords) if e]
+    if not expressions:
+        return None
+
+    relevance_parts = []
+    relevance_params = []
+    for expression in expressions:
+        relevance_parts.append("3 * (MATCH(i.nombre_norm) AGAINST(%s IN BOOLEAN MODE) > 0)")
+        relevance_parts.append("2 * (MATCH(i.nombreLargo_norm) AGAINST(%s IN BOOLEAN MODE) > 0)")
+        relevance_parts.append("(MATCH(i.descripcion_norm) AGAINST(%s IN BOOLEAN MODE) > 0)")
+        relevance_params.extend([expression, expression, expression])
+
+    match_sql = ("SELECT id FROM informacion "
+                 "WHERE MATCH(nombre_norm, nombreLargo_norm, descripcion_norm) AGAINST(%s IN BOOLEAN MODE)")
+    match_params = [' '.join(expressions)]
+
+    caedec_values = parse_caedec_numbers(numbers)
+    if caedec_values:
+        for value in caedec_values:
+            relevance_parts.append("10 * (i.caedec = %s)")
+            relevance_params.append(value)
+        match_sql += f" UNION SELECT id FROM informacion WHERE caedec IN ({', '.join(['%s'] * len(caedec_values))})"
+        match_params.extend(caedec_values)
+
+    sql = f"""
+        SELECT i.id, i.nombre, i.nombreLargo, i.caedec, i.descripcion,
+        ({' + '.join(relevance_parts)}) AS relevancia
+        FROM ({match_sql}) m
+        JOIN informacion i ON i.id = m.id
+        ORDER BY relevancia DESC, i.id
+        LIMIT %s
+    """
+
+    try:
+        with stage_timer('fulltext_sql'):
+            cursor.execute(sql, relevance_params + match_params + [limit])
+            return cursor.fetchall()
+    except pymysql.err.MySQLError as e:
+        if SEARCH_SQL_BACKEND == 'auto' and e.args and e.args[0] in FULLTEXT_UNSUPPORTED_ERRORS:
+            print(f"FULLTEXT no disponible, se usará la búsqueda con LIKE: {e}")
+            _fulltext_supported = False
+            return None
+        raise
+
+
+# Búsqueda aproximada por trigramas (fuzzy_search.py, requiere numpy), desactivada por defecto:
+# 'fallback' solo cuando la búsqueda exacta no encuentra nada, 'blend' la combina siempre, 'off' la desactiva.
+# Sus filas llegan al prompt marcadas como coincidencias aproximadas
+FUZZY_SEARCH = os.getenv('FUZZY_SEARCH', 'off').strip().lower()
+FUZZY_MIN_SCORE = float(os.getenv('FUZZY_MIN_SCORE', '0.3'))
+# En 'blend': relevancia final = relevancia exacta + FUZZY_BLEND_WEIGHT * similitud
+FUZZY_BLEND_WEIGHT = float(os.getenv('FUZZY_BLEND_WEIGHT', '10'))
+
+fuzzy_index = None
+
+
+def build_fuzzy_index(rows, catalog):
+    """
+    Oyente de `caedec_catalog`: construye la matriz de trigramas con las filas
+    ya cargadas si FUZZY_SEARCH está activado y hay numpy.
+    """
+    global fuzzy_index
+
+    if FUZZY_SEARCH not in ('fallback', 'blend'):
+        return None
+    if fuzzy_np is None:
+        print("Búsqueda aproximada desactivada: numpy no está instalado")
+        return None
+
+    index = FuzzyIndex(rows)
+    fuzzy_index = index
+    print(f"Índice aproximado ({FUZZY_SEARCH}) cargado: {len(index)} registros, {index.nbytes / 1e6:.1f} MB")
+    return index
+
+
+caedec_catalog.add_listener(build_fuzzy_index)
+
+
+def apply_fuzzy(query: str, results: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """Completa (fallback) o reordena (blend) los resultados exactos con la similitud por trigramas."""
+    if fuzzy_index is None or (FUZZY_SEARCH == 'fallback' and results):
+        return results
+
+    with stage_timer('fuzzy'):
+        scores = fuzzy_index.scores(query)
+        if scores is None:
+            return results
+        top = fuzzy_index.top(scores, limit, FUZZY_MIN_SCORE)
+        if FUZZY_SEARCH == 'fallback':
+            return fuzzy_index.rows_with_scores(top)
+
+        candidates = {row.get('id'): dict(row) for row in results}
+        for row in fuzzy_index.rows_with_scores(top):
+            candidates.setdefault(row.get('id'), row)
+        for row in candidates.values():
+            pos = fuzzy_index.position(row.get('id'))
+            row['similitud'] = round(float(scores[pos]), 4) if pos is not None else 0.0
+        ranked = sorted(candidates.values(),
+                        key=lambda r: (-((r.get('relevancia') or 0) + FUZZY_BLEND_WEIGHT * r['similitud']), r.get('id')))
+        return ranked[:limit]
+
+
+# Las peticiones idénticas simultáneas comparten una sola búsqueda y una sola llamada a la IA
+COALESCE_REQUESTS = os.getenv('COALESCE_REQUESTS', '1') == '1'
+search_flight = SingleFlight()
+llm_flight = SingleFlight()
+
+
+@stage_timer('search')
+def search_in_database(query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Busca filas relevantes para la consulta (búsqueda exacta de `search_exact`)
+    y aplica la búsqueda aproximada según FUZZY_SEARCH. Si la misma búsqueda
+    ya está en curso en otra petición, espera y reutiliza su resultado.
+    """
+    if not COALESCE_REQUESTS:
+        return apply_fuzzy(query, search_exact(query, limit), limit)
+    # Misma clave solo si las palabras clave son idénticas (extract_keywords usa upper + split)
+    key = (' '.join(query.upper().split()), limit)
+    results, shared = search_flight.do(key, lambda: apply_fuzzy(query, search_exact(query, limit), limit))
+    if shared:
+        COALESCED.inc(kind='search')
+        return [dict(row) for row in results]
+    return results
+
+
+def search_exact(query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    # Extraer palabras clave (texto en mayúsculas sin stop words) y números (posible CAEDEC)
+    with stage_timer('keywords'):
+        text_keywords, numbers = extract_keywords(query)
+
+    # Consultas que solo piden códigos CAEDEC: se resuelven con el catálogo
+    if numbers and not text_keywords:
+        catalog = caedec_catalog.get()
+        if catalog is not None:
+            with stage_timer('caedec_catalog'):
+                return catalog.lookup(parse_caedec_numbers(numbers), limit)
+
+    # Si el índice en memoria está cargado, se resuelve sin consultar MySQL
+    if search_index is not None:
+        return search_index.search(query, limit)
+
+    connection = get_db_connection()
+    if not connection:
+        return []
+
+    try:
+        with connection.cursor() as cursor:
             # Si hay números, buscar por CAEDEC exacto primero
             if numbers and not text_keywords:
                 caedec_conditions = []
@@ -82,17 +417,24 @@ def search_in_database(query: str, limit: int = 10) -> List[Dict[str, Any]]:
                         pass
 
                 if caedec_conditions:
-                    sql = f"SELECT * FROM informacion WHERE {' OR '.join(caedec_conditions)} LIMIT %s"
-                    cursor.execute(sql, caedec_params + [limit])
-                    return cursor.fetchall()
+                    sql = f"SELECT {SEARCH_COLUMNS} FROM informacion WHERE {' OR '.join(caedec_conditions)} LIMIT %s"
+                    with stage_timer('caedec_sql'):
+                        cursor.execute(sql, caedec_params + [limit])
+                        return cursor.fetchall()
 
             # Construir búsqueda por texto
             if not text_keywords and not numbers:
                 # Si no hay palabras clave válidas, devolver registros aleatorios
-                sql = "SELECT * FROM informacion ORDER BY RAND() LIMIT %s"
+                sql = f"SELECT {SEARCH_COLUMNS} FROM informacion ORDER BY RAND() LIMIT %s"
                 cursor.execute(sql, (limit,))
                 return cursor.fetchall()
 
+            # Con índices FULLTEXT se evita recorrer la tabla completa con LIKE
+            if text_keywords:
+                results = search_fulltext(cursor, text_keywords, numbers, limit)
+                if results is not None:
+                    return results
+
             # Construir cálculo de relevancia dinámico y condiciones de búsqueda
             # Usar UPPER() para hacer la búsqueda case-insensitive
             relevance_parts = []
@@ -102,7 +444,7 @@ def search_in_database(query: str, limit: int = 10) -> List[Dict[str, Any]]:
 
             # Procesar palabras de texto
             for keyword in text_keywords:
-                search_param = f"%{keyword}%"
+                search_param = like_pattern(keyword)
 
                 # Condición de búsqueda (OR) - case-insensitive usando UPPER()
                 search_conditions.append(
@@ -129,14 +471,14 @@ def search_in_database(query: str, limit: int = 10) -> List[Dict[str, Any]]:
                         pass
 
             if not search_conditions:
-                sql = "SELECT * FROM informacion ORDER BY RAND() LIMIT %s"
+                sql = f"SELECT {SEARCH_COLUMNS} FROM informacion ORDER BY RAND() LIMIT %s"
                 cursor.execute(sql, (limit,))
                 return cursor.fetchall()
 
             relevance_sql = " + ".join(relevance_parts)
 
             sql = f"""
-                SELECT *, 
+                SELECT {SEARCH_COLUMNS},
                 ({relevance_sql}) as relevancia
                 FROM informacion
                 WHERE {' OR '.join(search_conditions)}
@@ -146,8 +488,9 @@ def search_in_database(query: str, limit: int = 10) -> List[Dict[str, Any]]:
 
             # Combinar todos los parámetros: relevancia + búsqueda + limit
             final_params = relevance_params + all_params + [limit]
-            cursor.execute(sql, final_params)
-            results = cursor.fetchall()
+            with stage_timer('relevance_sql'):
+                cursor.execute(sql, final_params)
+                results = cursor.fetchall()
             return results
 
     except Exception as e:
@@ -159,6 +502,287 @@ def search_in_database(query: str, limit: int = 10) -> List[Dict[str, Any]]:
         connection.close()
 
 
+def like_pattern(keyword: str) -> str:
+    """
+    Patrón LIKE que busca la palabra clave como subcadena literal: escapa
+    ``\\``, ``%`` y ``_`` (con el carácter de escape por defecto de MySQL), igual
+    que las compara el índice en memoria.
+    """
+    escaped = keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def keyword_conditions(text_keywords: List[str], caedec_values: List[int]):
+    """
+    Condiciones de búsqueda con LIKE (cualquier palabra clave en nombre,
+    nombreLargo o descripcion, o cualquiera de los CAEDEC) y sus parámetros.
+    Devuelve ``(where_sql, params)``; sin palabras clave ni códigos, ``('', [])``.
+    """
+    conditions = []
+    params: List[Any] = []
+    for keyword in text_keywords:
+        search_param = like_pattern(keyword)
+        conditions.append("(UPPER(nombre) LIKE %s OR UPPER(nombreLargo) LIKE %s OR UPPER(descripcion) LIKE %s)")
+        params.extend([search_param, search_param, search_param])
+    if caedec_values:
+        conditions.append(f"caedec IN ({', '.join(['%s'] * len(caedec_values))})")
+        params.extend(caedec_values)
+    return ' OR '.join(conditions), params
+
+
+def keyword_relevance(text_keywords: List[str], caedec_values: List[int]):
+    """Expresión de relevancia con los pesos de la búsqueda (3 nombre, 2 nombreLargo, 1 descripcion, 10 CAEDEC)."""
+    parts = []
+    params: List[Any] = []
+    for keyword in text_keywords:
+        search_param = like_pattern(keyword)
+        parts.append("(CASE WHEN UPPER(nombre) LIKE %s THEN 3 ELSE 0 END)")
+        parts.append("(CASE WHEN UPPER(nombreLargo) LIKE %s THEN 2 ELSE 0 END)")
+        parts.append("(CASE WHEN UPPER(descripcion) LIKE %s THEN 1 ELSE 0 END)")
+        params.extend([search_param, search_param, search_param])
+    for value in caedec_values:
+        parts.append("(CASE WHEN caedec = %s THEN 10 ELSE 0 END)")
+        params.append(value)
+    return ' + '.join(parts), params
+
+
+# Filas por bloque al exportar (fetchmany del cursor sin buffer y tamaño de cada fragmento de la respuesta)
+EXPORT_CHUNK_ROWS = int(os.getenv('EXPORT_CHUNK_ROWS', '1000'))
+# Exportaciones simultáneas contra MySQL (cada una ocupa una conexión propia); con todas ocupadas, 503
+EXPORT_MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', '4'))
+EXPORT_RETRY_AFTER = int(os.getenv('EXPORT_RETRY_AFTER', '5'))
+export_slots = threading.BoundedSemaphore(max(1, EXPORT_MAX_CONCURRENT))
+
+
+def export_batches_from_index(text_keywords: List[str], caedec_values: List[int], fields: List[str],
+                              limit: int = None) -> Iterator[List[tuple]]:
+    """Filas que coinciden, en orden de id, leídas del índice en memoria por bloques."""
+    rows = search_index.rows
+    if text_keywords or caedec_values:
+        positions = sorted(search_index.score(text_keywords, caedec_values))
+    else:
+        positions = range(len(rows))
+    if limit is not None:
+        positions = positions[:limit]
+    for start in range(0, len(positions), EXPORT_CHUNK_ROWS):
+        yield row_values((rows[pos] for pos in positions[start:start + EXPORT_CHUNK_ROWS]), fields)
+
+
+def open_export_cursor(text_keywords: List[str], caedec_values: List[int], fields: List[str], limit: int = None):
+    """
+    Abre una conexión propia (fuera del pool: queda ocupada mientras dura la
+    descarga) con un cursor sin buffer (SSCursor) y ejecuta la consulta. Las
+    filas se leen luego con `fetchmany`, sin cargar el resultado en memoria.
+    Quien llama debe tener reservado uno de los `export_slots`.
+    """
+    where_sql, params = keyword_conditions(text_keywords, caedec_values)
+    sql = f"SELECT {', '.join(fields)} FROM informacion"
+    if where_sql:
+        sql += f" WHERE {where_sql}"
+    sql += " ORDER BY id"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+
+    connection = pymysql.connect(**{**DB_CONFIG, 'cursorclass': pymysql.cursors.SSCursor})
+    try:
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+    except Exception:
+        connection.close()
+        raise
+    return connection, cursor
+
+
+def export_batches_from_cursor(cursor, release: Callable[[], None]) -> Iterator[List[tuple]]:
+    """
+    Bloques de filas del cursor. Un error a mitad de la descarga se propaga: el
+    servidor corta la respuesta sin el último fragmento (ni el final del gzip),
+    así el cliente ve una descarga incompleta en lugar de un archivo truncado
+    que parece válido.
+    """
+    try:
+        while True:
+            batch = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not batch:
+                return
+            yield batch
+    except Exception:
+        app.logger.exception('Error exportando resultados; se corta la descarga')
+        raise
+    finally:
+        release()
+
+
+def export_release(connection) -> Callable[[], None]:
+    """
+    Función que cierra la conexión de una exportación y libera su plaza una
+    sola vez, la llame el generador al terminar o el servidor al cerrar la
+    respuesta (también si el cliente se desconecta antes del primer bloque).
+    """
+    lock = threading.Lock()
+    released = []
+
+    def release():
+        with lock:
+            if released:
+                return
+            released.append(True)
+        try:
+            # Cerrar la conexión (no el cursor) evita leer el resto del resultado
+            connection.close()
+        except Exception:
+            pass
+        finally:
+            export_slots.release()
+
+    return release
+
+
+# Campos que puede pedir /search y tamaño de página
+SEARCH_RESULT_FIELDS = EXPORT_FIELDS + ('relevancia',)
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 200
+
+
+def encode_search_cursor(relevancia: int, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{relevancia}:{row_id}".encode()).decode().rstrip('=')
+
+
+def decode_search_cursor(cursor: str):
+    """(relevancia, id) de la última fila de la página anterior; lanza ValueError si el cursor no es válido."""
+    try:
+        relevancia, row_id = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().split(':')
+        return int(relevancia), int(row_id)
+    except Exception:
+        raise ValueError('cursor no válido')
+
+
+def ranked_page(text_keywords: List[str], caedec_values: List[int], after=None, limit: int = SEARCH_PAGE_SIZE):
+    """
+    Filas que coinciden ordenadas por (relevancia DESC, id) con la columna
+    `relevancia`, empezando después de `after` = (relevancia, id): paginación
+    por clave en lugar de OFFSET, así cada página cuesta lo mismo.
+    """
+    if search_index is not None:
+        rows = search_index.rows
+        ids = search_index.ids
+        scored = ((score, ids[pos], pos) for pos, score in search_index.score(text_keywords, caedec_values).items())
+        if after is not None:
+            scored = (item for item in scored if item[0] < after[0] or (item[0] == after[0] and item[1] > after[1]))
+        top = heapq.nsmallest(limit, scored, key=lambda item: (-item[0], item[1]))
+        return [{**rows[pos], 'relevancia': score} for score, _, pos in top]
+
+    connection = get_db_connection()
+    if not connection:
+        raise RuntimeError('No se pudo conectar a la base de datos')
+    try:
+        where_sql, where_params = keyword_conditions(text_keywords, caedec_values)
+        relevance_sql, relevance_params = keyword_relevance(text_keywords, caedec_values)
+        sql = f"""
+            SELECT * FROM (
+                SELECT {SEARCH_COLUMNS}, ({relevance_sql}) AS relevancia
+                FROM informacion
+                WHERE {where_sql}
+            ) ranked
+        """
+        params = relevance_params + where_params
+        if after is not None:
+            sql += " WHERE relevancia < %s OR (relevancia = %s AND id > %s)"
+            params += [after[0], after[0], after[1]]
+        sql += " ORDER BY relevancia DESC, id LIMIT %s"
+        params.append(limit)
+        with connection.cursor() as cursor:
+            with stage_timer('search_api_sql'):
+                cursor.execute(sql, params)
+                return list(cursor.fetchall())
+    finally:
+        connection.close()
+
+
+def data_version():
+    """
+    Versión de los datos sin consultar la BD: la del catálogo CAEDEC
+    ((COUNT(*), MAX(id)) o el tamaño del índice en memoria), que se comprueba
+    en segundo plano. None si el catálogo no está cargado.
+    """
+    catalog = caedec_catalog.catalog
+    return catalog.version if catalog is not None else None
+
+
+# Consultas por bloque en search_many (acota el tamaño de cada SQL combinado)
+BATCH_SEARCH_CHUNK = int(os.getenv('BATCH_SEARCH_CHUNK', '200'))
+
+
+def search_many(queries: List[str], limit: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+    """Como `search_in_database` para varias consultas: `search_many_exact` más la búsqueda aproximada."""
+    return {query: apply_fuzzy(query, rows, limit) for query, rows in search_many_exact(queries, limit).items()}
+
+
+def search_many_exact(queries: List[str], limit: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Resuelve varias consultas con pocas idas y vueltas a la BD.
+
+    Por cada bloque de consultas se hace un único SELECT con todos los CAEDEC
+    (``caedec IN (...)``) y todas las palabras clave (LIKE), y cada consulta se
+    ordena después en Python con los mismos pesos que `search_in_database`
+    (SearchIndex sobre las filas candidatas). Las consultas sin palabras clave
+    comparten un único ``ORDER BY RAND()``. Devuelve {consulta: filas}.
+    """
+    unique = list(dict.fromkeys(queries))
+    if search_index is not None:
+        return {query: search_index.search(query, limit) for query in unique}
+
+    results: Dict[str, List[Dict[str, Any]]] = {query: [] for query in unique}
+    connection = get_db_connection()
+    if not connection:
+        return results
+
+    try:
+        with connection.cursor() as cursor:
+            with stage_timer('keywords'):
+                extracted = {query: extract_keywords(query) for query in unique}
+            searchable = [q for q in unique if extracted[q][0] or parse_caedec_numbers(extracted[q][1])]
+            random_queries = [q for q in unique if not (extracted[q][0] or parse_caedec_numbers(extracted[q][1]))]
+
+            for start in range(0, len(searchable), max(1, BATCH_SEARCH_CHUNK)):
+                chunk = searchable[start:start + max(1, BATCH_SEARCH_CHUNK)]
+                keywords = list(dict.fromkeys(k for q in chunk for k in extracted[q][0]))
+                caedec_values = list(dict.fromkeys(v for q in chunk for v in parse_caedec_numbers(extracted[q][1])))
+
+                conditions = []
+                params: List[Any] = []
+                if caedec_values:
+                    conditions.append(f"caedec IN ({', '.join(['%s'] * len(caedec_values))})")
+                    params.extend(caedec_values)
+                for keyword in keywords:
+                    conditions.append("(UPPER(nombre) LIKE %s OR UPPER(nombreLargo) LIKE %s OR UPPER(descripcion) LIKE %s)")
+                    params.extend([like_pattern(keyword)] * 3)
+
+                sql = f"SELECT {SEARCH_COLUMNS} FROM informacion WHERE {' OR '.join(conditions)} ORDER BY id"
+                with stage_timer('batch_sql'):
+                    cursor.execute(sql, params)
+                    candidates = SearchIndex.from_rows(cursor.fetchall())
+                for query in chunk:
+                    results[query] = candidates.search(query, limit)
+
+            if random_queries:
+                cursor.execute(f"SELECT {SEARCH_COLUMNS} FROM informacion ORDER BY RAND() LIMIT %s",
+                               (limit * len(random_queries),))
+                rows = cursor.fetchall()
+                for i, query in enumerate(random_queries):
+                    results[query] = list(rows[i * limit:(i + 1) * limit])
+        return results
+
+    except Exception as e:
+        print(f"Error buscando en la base de datos (lote): {e}")
+        import traceback
+        traceback.print_exc()
+        return results
+    finally:
+        connection.close()
+
+
 def format_db_results(results: List[Dict[str, Any]]) -> str:
     """Formatea los resultados de la base de datos en un texto legible."""
     if not results:
@@ -180,79 +804,550 @@ def format_db_results(results: List[Dict[str, Any]]) -> str:
     return formatted
 
 
-def generate_ai_response_with_context(user_question: str, db_results: List[Dict[str, Any]]) -> str:
+# Cliente de Gemini compartido por todo el proceso (se crea una sola vez)
+_genai_client = None
+_genai_client_lock = threading.Lock()
+
+# Caché de respuestas: clave = modelo + pregunta normalizada + ids de las filas recuperadas
+answer_cache = TTLCache(
+    maxsize=int(os.getenv('ANSWER_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('ANSWER_CACHE_TTL', '300')),
+)
+
+
+def get_genai_client():
+    """Devuelve el cliente de Gemini del proceso, o None si no hay SDK o API key."""
+    global _genai_client
+
+    if _genai_client is not None:
+        return _genai_client
+
+    gemini_key = os.getenv('GEMINI_API_KEY')
+    if not genai or not gemini_key:
+        return None
+
+    with _genai_client_lock:
+        if _genai_client is None:
+            os.environ.setdefault('GEMINI_API_KEY', gemini_key)
+            kwargs = {'api_key': gemini_key}
+            # GEMINI_BASE_URL permite apuntar a un servidor local (p. ej. fake_gemini.py)
+            base_url = os.getenv('GEMINI_BASE_URL')
+            # Las llamadas que siguen en segundo plano tras LLM_CALL_TIMEOUT terminan como mucho en CHAT_REQUEST_TIMEOUT
+            kwargs['http_options'] = {'timeout': int(CHAT_REQUEST_TIMEOUT * 1000)}
+            if base_url:
+                kwargs['http_options']['base_url'] = base_url
+            try:
+                _genai_client = genai.Client(**kwargs)
+            except TypeError:
+                _genai_client = genai.Client()
+    return _genai_client
+
+
+# Llamadas a la IA acotadas: máximo en curso, cola limitada y fecha límite por petición
+llm_gate = LLMGate(
+    max_concurrency=int(os.getenv('LLM_MAX_CONCURRENCY', '4')),
+    max_queue=int(os.getenv('LLM_MAX_QUEUE', '16')),
+    retry_after=int(os.getenv('LLM_RETRY_AFTER', '2')),
+)
+CHAT_REQUEST_TIMEOUT = float(os.getenv('CHAT_REQUEST_TIMEOUT', '30'))
+# Fecha límite de cada llamada al modelo: pasado este tiempo se responde con la respuesta local
+LLM_CALL_TIMEOUT = float(os.getenv('LLM_CALL_TIMEOUT', '10'))
+# En streaming LLM_CALL_TIMEOUT limita solo la espera del primer fragmento; después cada fragmento
+# debe llegar en LLM_STREAM_IDLE_TIMEOUT segundos y el stream entero durar como mucho LLM_STREAM_MAX_DURATION
+LLM_STREAM_IDLE_TIMEOUT = float(os.getenv('LLM_STREAM_IDLE_TIMEOUT', '10'))
+LLM_STREAM_MAX_DURATION = float(os.getenv('LLM_STREAM_MAX_DURATION', '120'))
+
+# Tras varios fallos (o respuestas más lentas que LLM_CALL_TIMEOUT) se deja de llamar al modelo un tiempo
+llm_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('LLM_BREAKER_FAILURES', '5')),
+    reset_timeout=float(os.getenv('LLM_BREAKER_COOLDOWN', '30')),
+    half_open_max_calls=int(os.getenv('LLM_BREAKER_HALF_OPEN_CALLS', '1')),
+    on_transition=lambda previous, state: CIRCUIT_TRANSITIONS.inc(state=state),
+)
+
+
+def llm_available() -> bool:
+    """Indica si hay un modelo disponible (SDK + API key, o un cliente ya configurado)."""
+    return _genai_client is not None or (genai is not None and bool(os.getenv('GEMINI_API_KEY')))
+
+
+def llm_deadline(deadline: float = None) -> float:
+    """Fecha límite de una llamada al modelo: LLM_CALL_TIMEOUT desde ahora, sin pasar la de la petición."""
+    call_deadline = time.monotonic() + LLM_CALL_TIMEOUT
+    return call_deadline if deadline is None else min(deadline, call_deadline)
+
+
+def record_llm_outcome(started: float, error: str = None, first_chunk_at: float = None):
+    """
+    Informa al circuit breaker del resultado de una llamada (las más lentas que
+    el límite cuentan como fallo). En streaming se mide hasta el primer
+    fragmento: un stream largo que va produciendo texto no es lento.
+    """
+    finished = first_chunk_at if first_chunk_at is not None else time.monotonic()
+    if error is not None:
+        llm_breaker.record_failure(error)
+    elif finished - started > LLM_CALL_TIMEOUT:
+        llm_breaker.record_failure('lenta')
+    else:
+        llm_breaker.record_success()
+
+
+def answer_cache_key(user_question: str, db_results: List[Dict[str, Any]], model: str, session=None):
+    # Con sesión, el historial forma parte de la clave: la misma pregunta puede depender de turnos anteriores
+    context = session.context_key() if session is not None and session.turns else None
+    return (model, normalize_question(user_question), tuple(row.get('id') for row in db_results), context)
+
+
+def needs_llm_call(user_question: str, db_results: List[Dict[str, Any]], session=None) -> bool:
+    """Indica si responder requiere llamar al modelo (hay IA y la respuesta no está en caché)."""
+    if not llm_available() or not llm_breaker.available():
+        return False
+    gemini_model = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+    return not answer_cache.peek(answer_cache_key(user_question, db_results, gemini_model, session))
+
+
+# Sesiones de conversación (sessions.py): historial acotado y últimas filas por session_id
+sessions = SessionStore(
+    max_sessions=int(os.getenv('SESSION_MAX_SESSIONS', '1000')),
+    idle_ttl=float(os.getenv('SESSION_IDLE_TTL', '1800')),
+    max_bytes=int(os.getenv('SESSION_MAX_BYTES', str(32 * 1024 * 1024))),
+    max_turns=int(os.getenv('SESSION_MAX_TURNS', '6')),
+)
+
+
+def remaining(deadline: float) -> float:
+    return max(0.0, deadline - time.monotonic())
+
+
+def run_llm_call(message: str, db_results: List[Dict[str, Any]], session=None, deadline: float = None) -> str:
+    """
+    Genera la respuesta con la IA dentro de `llm_gate`. Las peticiones
+    simultáneas con la misma clave de caché (pregunta normalizada, filas,
+    modelo e historial) esperan a la primera y comparten su respuesta o su error.
+    """
+    deadline = llm_deadline(deadline)
+    call = lambda: llm_gate.run(generate_ai_response_with_context, message, db_results, session, deadline=deadline)
+    # El turno que registre la llamada queda pendiente: si la petición no espera a la
+    # respuesta (fecha límite), la llamada termina en segundo plano sin tocar la sesión
+    pending = []
+    token = _pending_turns.set(pending)
+    try:
+        if not COALESCE_REQUESTS:
+            answer, shared = call(), False
+        else:
+            key = answer_cache_key(message, db_results, os.getenv('GEMINI_MODEL', 'gemini-2.5-flash'), session)
+            try:
+                answer, shared = llm_flight.do(key, call, timeout=remaining(deadline))
+            except TimeoutError:
+                raise DeadlineExceeded('La respuesta de la IA superó el tiempo límite')
+    finally:
+        _pending_turns.reset(token)
+
+    if shared:
+        COALESCED.inc(kind='llm')
+        record_turn(session, message, answer, db_results)
+    for turn in pending:
+        sessions.record(*turn)
+    return answer
+
+
+def stream_llm_call(message: str, db_results: List[Dict[str, Any]], session=None, deadline: float = None) -> Iterator[str]:
+    """
+    Como `run_llm_call`, en streaming: la primera petición emite los fragmentos
+    a medida que llegan y las que esperan reciben la respuesta completa de una vez.
+    El iterador devuelto debe empezar a consumirse enseguida (la clave queda
+    ocupada hasta que termina). La fecha límite de la petición y LLM_CALL_TIMEOUT
+    se aplican al primer fragmento; después, LLM_STREAM_IDLE_TIMEOUT entre
+    fragmentos y LLM_STREAM_MAX_DURATION para el stream completo.
+    """
+    first_deadline = llm_deadline(deadline)
+    stream_deadline = time.monotonic() + LLM_STREAM_MAX_DURATION
+
+    def stream():
+        return llm_gate.stream(stream_ai_response_with_context, message, db_results, session, deadline=first_deadline,
+                               idle_timeout=LLM_STREAM_IDLE_TIMEOUT, max_deadline=stream_deadline)
+
+    if not COALESCE_REQUESTS:
+        return stream()
+
+    key = answer_cache_key(message, db_results, os.getenv('GEMINI_MODEL', 'gemini-2.5-flash'), session)
+    call, leader = llm_flight.begin(key)
+    if leader:
+        return llm_flight.stream(key, call, stream())
+
+    COALESCED.inc(kind='llm')
+
+    def follow():
+        try:
+            # El líder puede tardar lo que dure su stream, no solo hasta su primer fragmento
+            answer = ''.join(llm_flight.wait(call, remaining(stream_deadline)))
+        except TimeoutError:
+            raise DeadlineExceeded('La respuesta de la IA superó el tiempo límite')
+        record_turn(session, message, answer, db_results)
+        yield answer
+
+    return follow()
+
+
+# Turnos registrados dentro de `run_llm_call` (el contexto se copia al hilo de llm_gate):
+# pasan a la sesión solo si la petición devuelve esa respuesta
+_pending_turns: contextvars.ContextVar = contextvars.ContextVar('pending_turns', default=None)
+
+
+def record_turn(session, user_text: str, answer: str, db_results: List[Dict[str, Any]], includes_data: bool = False):
+    """Guarda el turno en la sesión (si la hay)."""
+    if session is None:
+        return
+    pending = _pending_turns.get()
+    if pending is not None:
+        pending.append((session, user_text, answer, db_results, includes_data))
+        return
+    sessions.record(session, user_text, answer, db_results, includes_data)
+
+
+def llm_contents(user_question: str, db_results: List[Dict[str, Any]], session=None):
+    """
+    Devuelve (texto del turno, contents para el modelo, si el turno incluye los datos).
+    Sin sesión es el prompt completo. Con sesión se envía el historial y el
+    turno actual lleva los datos solo si ningún turno anterior los incluyó.
+    """
+    if session is None:
+        prompt = build_prompt(user_question, db_results)
+        return prompt, prompt, True
+    include_data = not session.has_context_for(db_results)
+    turn = build_prompt(user_question, db_results) if include_data else build_question(user_question)
+    return turn, session.contents(turn), include_data
+
+
+def local_answer(db_results: List[Dict[str, Any]]) -> str:
+    """Respuesta simple sin IA, usando el primer registro encontrado."""
+    if not db_results:
+        return "No encontré información sobre eso en la base de datos."
+    first = db_results[0]
+    if is_approximate(first):
+        return (f"No encontré coincidencias exactas; lo más parecido es {first.get('nombre', 'este registro')}: "
+                f"{first.get('descripcion', 'Sin descripción')}")
+    return f"Encontré información sobre {first.get('nombre', 'este registro')}: {first.get('descripcion', 'Sin descripción')}"
+
+
+def emergency_answer(db_results: List[Dict[str, Any]]) -> str:
+    """Respuesta de emergencia cuando falla la llamada a la IA."""
+    if not db_results:
+        return "No encontré información sobre eso en la base de datos."
+    first = db_results[0]
+    if is_approximate(first):
+        return local_answer(db_results)
+    return f"Encontré que {first.get('nombre', 'este registro')} tiene el CAEDEC {first.get('caedec', 'desconocido')}: {first.get('descripcion', 'Sin descripción')}"
+
+
+@stage_timer('prompt_build')
+def build_prompt(user_question: str, db_results: List[Dict[str, Any]]) -> str:
+    """
+    Construye el contenido del prompt (datos de la BD agrupados por CAEDEC y la
+    pregunta). Las reglas fijas se envían aparte como SYSTEM_INSTRUCTION.
+    """
+    codes = {row.get('caedec') for row in db_results if row.get('caedec') is not None}
+    contents = build_contents(user_question, db_results, caedec_counts=caedec_counts(codes))
+    PROMPT_CHARS.observe(compact_prompt_chars(contents))
+    return contents
+
+
+def generation_config() -> Dict[str, Any]:
+    """Configuración de la llamada al modelo con las reglas como instrucción de sistema."""
+    return {'system_instruction': SYSTEM_INSTRUCTION}
+
+
+def generate_ai_response_with_context(user_question: str, db_results: List[Dict[str, Any]], session=None) -> str:
     """
     Genera una respuesta conversacional usando la IA de Gemini con datos de la base de datos.
     La IA responde de forma natural, pero SOLO con información de la BD.
+    Con `session`, se envía el historial de la conversación y el turno se guarda en ella.
     """
-    gemini_key = os.getenv('GEMINI_API_KEY')
     gemini_model = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
 
-    if not genai or not gemini_key:
+    if not llm_available():
         # Si no hay API disponible, devolver respuesta simple
-        if not db_results:
-            return "No encontré información sobre eso en la base de datos."
-        # Formatear una respuesta básica
-        first = db_results[0]
-        return f"Encontré información sobre {first.get('nombre', 'este registro')}: {first.get('descripcion', 'Sin descripción')}"
-
+        FALLBACKS.inc(reason='no_llm')
+        answer = local_answer(db_results)
+        record_turn(session, user_question, answer, db_results)
+        return answer
+
+    # Las preguntas repetidas con las mismas filas no vuelven a llamar al modelo
+    cache_key = answer_cache_key(user_question, db_results, gemini_model, session)
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        record_turn(session, user_question, cached, db_results)
+        return cached
+
+    # Con el circuito abierto no se llama al modelo
+    if not llm_breaker.allow():
+        FALLBACKS.inc(reason='circuit_open')
+        answer = local_answer(db_results)
+        record_turn(session, user_question, answer, db_results)
+        return answer
+
+    turn, contents, includes_data = user_question, None, False
+    started = time.monotonic()
     try:
-        os.environ.setdefault('GEMINI_API_KEY', gemini_key)
-        try:
-            client = genai.Client(api_key=gemini_key)
-        except TypeError:
-            client = genai.Client()
-
-        # Preparar los datos en formato estructurado para el prompt
-        db_info = ""
-        for row in db_results:
-            db_info += f"\n- Nombre: {row.get('nombre', 'N/A')}"
-            if row.get('nombreLargo'):
-                db_info += f"\n  Nombre completo: {row.get('nombreLargo')}"
-            if row.get('caedec'):
-                db_info += f"\n  CAEDEC: {row.get('caedec')}"
-            if row.get('descripcion'):
-                db_info += f"\n  Descripción: {row.get('descripcion')}"
-            db_info += "\n"
-
-        # Prompt optimizado para conversación natural
-        system_prompt = f"""Eres un asistente conversacional que ayuda a los usuarios con información de una base de datos de empresas y actividades económicas.
-
-REGLAS IMPORTANTES:
-1. Responde de forma NATURAL y CONVERSACIONAL, como si fueras un asistente humano amigable.
-2. SOLO usa la información que se te proporciona del contexto de la base de datos a continuación.
-3. NO inventes datos ni uses información externa o conocimiento general.
-4. Si te preguntan sobre temas NO relacionados con la base de datos (clima, fecha actual, noticias, recetas, programación, matemáticas, etc.), responde amablemente: "Lo siento, solo tengo acceso a información de empresas y actividades económicas en mi base de datos. No puedo ayudarte con ese tema debido a las restricciones de la aplicación."
-5. Si NO encuentras información relevante en los datos proporcionados, di: "No encontré información sobre eso en la base de datos."
-6. Responde de forma DIRECTA y CONCISA, sin listar todos los registros a menos que te lo pidan explícitamente.
-7. Si te preguntan por un dato específico (como CAEDEC, descripción, nombre), proporciona SOLO ese dato de forma clara.
-8. Mantén un tono amable y profesional.
-
-DATOS DISPONIBLES DE LA BASE DE DATOS:
-{db_info}
-
-PREGUNTA DEL USUARIO:
-{user_question}
-
-Responde de forma natural y conversacional, usando ÚNICAMENTE la información proporcionada arriba."""
-
-        response = client.models.generate_content(
-            model=gemini_model,
-            contents=system_prompt
-        )
-
-        if response and hasattr(response, 'text'):
+        client = get_genai_client()
+
+        turn, contents, includes_data = llm_contents(user_question, db_results, session)
+        with stage_timer('llm'):
+            response = client.models.generate_content(
+                model=gemini_model,
+                contents=contents,
+                config=generation_config()
+            )
+        record_llm_outcome(started)
+
+        # Si la petición ya respondió con la respuesta local, esta respuesta queda en la caché
+        if response and hasattr(response, 'text') and response.text:
+            answer_cache.set(cache_key, response.text)
+            record_turn(session, turn, response.text, db_results, includes_data)
             return response.text
         else:
             return "No pude generar una respuesta en este momento."
 
     except Exception as e:
         print(f"Error al generar respuesta con IA: {e}")
-        if not db_results:
-            return "No encontré información sobre eso en la base de datos."
+        record_llm_outcome(started, type(e).__name__)
+        LLM_ERRORS.inc()
+        FALLBACKS.inc(reason='llm_error')
         # Respuesta de emergencia
-        first = db_results[0]
-        return f"Encontré que {first.get('nombre', 'este registro')} tiene el CAEDEC {first.get('caedec', 'desconocido')}: {first.get('descripcion', 'Sin descripción')}"
+        answer = emergency_answer(db_results)
+        record_turn(session, user_question, answer, db_results)
+        return answer
+
+
+def stream_ai_response_with_context(user_question: str, db_results: List[Dict[str, Any]], session=None) -> Iterator[str]:
+    """
+    Igual que `generate_ai_response_with_context`, pero devuelve la respuesta
+    por fragmentos a medida que el modelo los genera (generate_content_stream).
+    Sin IA disponible, la respuesta local se emite como un único fragmento.
+    """
+    gemini_model = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+
+    if not llm_available():
+        FALLBACKS.inc(reason='no_llm')
+        answer = local_answer(db_results)
+        record_turn(session, user_question, answer, db_results)
+        yield answer
+        return
+
+    cache_key = answer_cache_key(user_question, db_results, gemini_model, session)
+    cached = answer_cache.get(cache_key)
+    if cached is not None:
+        record_turn(session, user_question, cached, db_results)
+        yield cached
+        return
+
+    if not llm_breaker.allow():
+        FALLBACKS.inc(reason='circuit_open')
+        answer = local_answer(db_results)
+        record_turn(session, user_question, answer, db_results)
+        yield answer
+        return
+
+    parts = []
+    started = time.monotonic()
+    first_chunk_at = None
+    outcome_recorded = False
+    try:
+        client = get_genai_client()
+
+        turn, contents, includes_data = llm_contents(user_question, db_results, session)
+        with stage_timer('llm_stream'):
+            for chunk in client.models.generate_content_stream(
+                model=gemini_model,
+                contents=contents,
+                config=generation_config()
+            ):
+                text = getattr(chunk, 'text', None)
+                if text:
+                    if first_chunk_at is None:
+                        first_chunk_at = time.monotonic()
+                    parts.append(text)
+                    yield text
+        record_llm_outcome(started, first_chunk_at=first_chunk_at)
+        outcome_recorded = True
+
+    except Exception as e:
+        print(f"Error al generar respuesta con IA (stream): {e}")
+        record_llm_outcome(started, type(e).__name__, first_chunk_at)
+        outcome_recorded = True
+        LLM_ERRORS.inc()
+        if not parts:
+            FALLBACKS.inc(reason='llm_error')
+            answer = emergency_answer(db_results)
+            record_turn(session, user_question, answer, db_results)
+            yield answer
+        else:
+            # El usuario ya recibió parte de la respuesta: queda en la sesión tal como llegó
+            record_turn(session, turn, ''.join(parts), db_results, includes_data)
+        return
+    finally:
+        # El stream se cortó a medias (cliente o límite entre fragmentos): cuenta según el primer fragmento
+        if not outcome_recorded:
+            record_llm_outcome(started, first_chunk_at=first_chunk_at)
+
+    if parts:
+        answer = ''.join(parts)
+        answer_cache.set(cache_key, answer)
+        record_turn(session, turn, answer, db_results, includes_data)
+    else:
+        yield "No pude generar una respuesta en este momento."
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Formatea un evento Server-Sent Events con datos JSON."""
+    return f"event: {event}\ndata: {app.json.dumps(data)}\n\n"
+
+
+NO_RESULTS_REPLY = 'Lo siento, no encontré información relevante en la base de datos para responder tu pregunta. Por favor, intenta reformular tu pregunta o pregunta sobre empresas o actividades económicas que puedan estar en nuestros registros.'
+
+
+@stage_timer('route')
+def route_chat_message(message: str, search=None, session=None):
+    """
+    Clasifica el mensaje (router.py) y cuenta la ruta. Saludos, preguntas fuera
+    de tema, CAEDEC exactos y nombres exactos traen ya la respuesta en `reply`.
+    Las preguntas de seguimiento de una sesión reutilizan sus últimas filas.
+    """
+    if session is not None and session.last_rows and is_follow_up(message):
+        ROUTES.inc(route=ROUTE_FOLLOW_UP)
+        return RoutedMessage(ROUTE_FOLLOW_UP, session.last_rows, None)
+
+    routed = route_message(message, search or search_in_database, limit=5, caedec_counts=caedec_counts)
+    ROUTES.inc(route=routed.route)
+    if routed.reply is not None and routed.route != ROUTE_OPEN and llm_available():
+        LLM_CALLS_AVOIDED.inc(route=routed.route)
+    return routed
+
+
+def llm_busy_response(error: LLMSaturated, db_results: List[Dict[str, Any]]):
+    """Respuesta 503 con Retry-After cuando la cola de la IA está llena."""
+    FALLBACKS.inc(reason='saturated')
+    response = jsonify({
+        'error': 'El asistente está ocupado, intenta de nuevo en unos segundos',
+        'fallback_reply': local_answer(db_results)
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+
+# Lotes de /chat/batch: mensajes máximos, llamadas simultáneas a la IA y fecha límite del lote
+BATCH_MAX_MESSAGES = int(os.getenv('BATCH_MAX_MESSAGES', '500'))
+BATCH_LLM_PARALLELISM = int(os.getenv('BATCH_LLM_PARALLELISM', '4'))
+BATCH_REQUEST_TIMEOUT = float(os.getenv('BATCH_REQUEST_TIMEOUT', '120'))
+
+
+def chat_batch(messages: List[str], parallelism: int = None, timeout: float = None) -> List[Dict[str, Any]]:
+    """
+    Responde una lista de mensajes como /chat, en el mismo orden.
+
+    Las búsquedas de todos los mensajes se resuelven juntas con `search_many`
+    y las respuestas de la IA se generan con como mucho `parallelism`
+    llamadas simultáneas (que además pasan por `llm_gate`). Cada elemento es
+    ``{'index', 'message', 'route', 'reply'}`` o, si falla, ``{'index',
+    'message', 'error'}`` con `fallback_reply` cuando hay filas. Se puede usar
+    desde scripts:
+
+        from app import chat_batch
+        for item in chat_batch(['caedec 74990', 'plastoform']):
+            print(item.get('reply') or item['error'])
+    """
+    parallelism = max(1, parallelism or BATCH_LLM_PARALLELISM)
+    deadline = time.monotonic() + (BATCH_REQUEST_TIMEOUT if timeout is None else timeout)
+    items: List[Dict[str, Any]] = []
+    for i, message in enumerate(messages):
+        item: Dict[str, Any] = {'index': i, 'message': message}
+        if not isinstance(message, str) or not message.strip():
+            item['error'] = 'No se proporcionó ningún mensaje'
+        items.append(item)
+    valid = [item for item in items if 'error' not in item]
+
+    # Una sola pasada de búsqueda para todos los mensajes que la necesitan
+    queries = {}
+    for item in valid:
+        message = item['message'].strip()
+        if classify_text(message) is None:
+            queries[item['index']] = caedec_query(message) or message
+    found = search_many(list(queries.values()), limit=5)
+
+    pending = []
+    for item in valid:
+        message = item['message'].strip()
+        try:
+            routed = route_chat_message(message, search=lambda query, limit=5: found.get(query, []))
+        except Exception as e:
+            item['error'] = f'Error al procesar el mensaje: {e}'
+            continue
+        item['route'] = routed.route
+        if routed.reply is not None:
+            item['reply'] = routed.reply
+        elif not routed.db_results:
+            EMPTY_RESULTS.inc()
+            item['reply'] = NO_RESULTS_REPLY
+        else:
+            pending.append((item, message, routed.db_results))
+
+    def answer(item, message, db_results):
+        try:
+            if not needs_llm_call(message, db_results):
+                item['reply'] = generate_ai_response_with_context(message, db_results)
+            elif time.monotonic() >= deadline:
+                raise DeadlineExceeded('La respuesta de la IA superó el tiempo límite')
+            else:
+                item['reply'] = run_llm_call(message, db_results, deadline=deadline)
+        except LLMSaturated:
+            FALLBACKS.inc(reason='saturated')
+            item.update(error='El asistente está ocupado', fallback_reply=local_answer(db_results))
+        except DeadlineExceeded:
+            FALLBACKS.inc(reason='timeout')
+            item.update(error='La respuesta tardó demasiado', fallback_reply=local_answer(db_results))
+        except Exception as e:
+            print(f"Error en el lote de /chat/batch: {e}")
+            item.update(error='Error al procesar tu pregunta', detail=str(e))
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(parallelism, len(pending)), thread_name_prefix='batch') as executor:
+            for args in pending:
+                executor.submit(contextvars.copy_context().run, answer, *args)
+    return items
+
+
+# Cabecera Server-Timing con los tiempos por etapa: siempre con METRICS_TIMING_HEADER=1,
+# o por petición enviando la cabecera X-Debug-Timing
+METRICS_TIMING_HEADER = os.getenv('METRICS_TIMING_HEADER', '').lower() in ('1', 'true', 'yes')
+
+REGISTRY.gauge('chatai_db_pool_connections', 'Conexiones del pool por estado',
+               lambda: {state: db_pool.stats()[state] for state in ('in_use', 'idle', 'waiting')}, label='state')
+REGISTRY.gauge('chatai_llm_calls', 'Llamadas a la IA en curso y en cola',
+               lambda: {state: llm_gate.stats()[state] for state in ('in_flight', 'queued')}, label='state')
+REGISTRY.gauge('chatai_answer_cache_entries', 'Respuestas en la caché', lambda: len(answer_cache))
+REGISTRY.gauge('chatai_llm_circuit_open', 'Circuit breaker de la IA abierto (1) o no (0)',
+               lambda: int(llm_breaker.state == CIRCUIT_OPEN))
+
+
+@app.before_request
+def before_request_metrics():
+    start_request_timings()
+    REQUESTS.inc(endpoint=request.endpoint or 'unknown')
+
+
+@app.after_request
+def add_timing_header(response):
+    timings = current_request_timings()
+    if timings and (METRICS_TIMING_HEADER or request.headers.get('X-Debug-Timing')):
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    """Métricas en formato de texto de Prometheus."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 
 @app.route('/')
@@ -271,35 +1366,354 @@ def chat():
     if not message:
         return jsonify({'error': 'No se proporcionó ningún mensaje'}), 400
 
+    deadline = time.monotonic() + CHAT_REQUEST_TIMEOUT
+    session = sessions.get(data.get('session_id'))
+    db_results = []
     try:
-        # Buscar información relevante en la base de datos
-        db_results = search_in_database(message, limit=5)
+        # Clasificar el mensaje y buscar información relevante en la base de datos
+        # (o reutilizar las filas de la sesión en preguntas de seguimiento)
+        routed = route_chat_message(message, session=session)
+        db_results = routed.db_results
+
+        # Saludos, preguntas fuera de tema y búsquedas exactas no necesitan la IA
+        if routed.reply is not None:
+            record_turn(session, message, routed.reply, db_results)
+            return jsonify({'reply': routed.reply})
 
         if not db_results:
-            return jsonify({
-                'reply': 'Lo siento, no encontré información relevante en la base de datos para responder tu pregunta. Por favor, intenta reformular tu pregunta o pregunta sobre empresas o actividades económicas que puedan estar en nuestros registros.'
-            })
+            EMPTY_RESULTS.inc()
+            return jsonify({'reply': NO_RESULTS_REPLY})
 
-        # Generar respuesta con IA usando los resultados de la base de datos
-        ai_response = generate_ai_response_with_context(message, db_results)
+        # Generar respuesta con IA usando los resultados de la base de datos.
+        # Las respuestas locales o en caché no ocupan hueco en la cola de la IA.
+        if not needs_llm_call(message, db_results, session):
+            return jsonify({'reply': generate_ai_response_with_context(message, db_results, session)})
+
+        ai_response = run_llm_call(message, db_results, session, deadline)
 
         return jsonify({'reply': ai_response})
 
+    except LLMSaturated as e:
+        return llm_busy_response(e, db_results)
+    except DeadlineExceeded:
+        # La IA no respondió a tiempo: se responde ya con la respuesta local (y es la que queda en la sesión)
+        FALLBACKS.inc(reason='timeout')
+        answer = local_answer(db_results)
+        record_turn(session, message, answer, db_results)
+        return jsonify({'reply': answer, 'fallback': 'timeout'})
+
     except Exception as e:
         print(f"Error en el endpoint /chat: {e}")
         return jsonify({
             'error': 'Error al procesar tu pregunta',
             'detail': str(e)
         }), 500
+
+
+@app.route('/search')
+def search_api():
+    """
+    Resultados de la búsqueda sin IA, paginados por (relevancia, id):
+    /search?q=MINERA&caedec=1111&fields=id,nombre,relevancia&limit=20&cursor=<next_cursor>
+    Con If-None-Match y los datos sin cambios responde 304 sin buscar.
+    """
+    query = request.args.get('q', '').strip()
+    try:
+        fields = parse_fields(request.args.get('fields'), SEARCH_RESULT_FIELDS, SEARCH_RESULT_FIELDS)
+        codes = [int(c) for c in request.args.get('caedec', '').split(',') if c.strip()]
+        limit = max(1, min(int(request.args.get('limit', SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor') or None
+        after = decode_search_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': 'Parámetros no válidos', 'detail': str(e)}), 400
+
+    text_keywords, numbers = extract_keywords(query)
+    caedec_values = list(dict.fromkeys(parse_caedec_numbers(numbers) + codes))
+    if not text_keywords and not caedec_values:
+        return jsonify({'error': 'Se necesita q con alguna palabra clave o caedec'}), 400
+
+    # ETag: versión de los datos + todo lo que determina la respuesta
+    version = data_version()
+    etag = None
+    if version is not None:
+        key = repr((version, sorted(text_keywords), sorted(caedec_values), fields, limit, after))
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+        if request.if_none_match.contains_weak(etag):
+            return Response(status=304, headers={'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'})
+
+    try:
+        with stage_timer('search_api'):
+            rows = ranked_page(text_keywords, caedec_values, after, limit + 1)
+    except Exception as e:
+        print(f"Error en el endpoint /search: {e}")
+        return jsonify({'error': 'Error al buscar', 'detail': str(e)}), 500
+
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_search_cursor(last['relevancia'], last['id'])
+    response = jsonify({
+        'q': query,
+        'caedec': codes,
+        'results': [{field: row.get(field) for field in fields} for row in page],
+        'next_cursor': next_cursor,
+    })
+    if etag is not None:
+        response.headers['ETag'] = f'"{etag}"'
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/search/export')
+def search_export():
+    """
+    Exporta todas las filas que coinciden (sin LIMIT de búsqueda) en orden de id:
+    /search/export?q=MINERA&caedec=1111,74990&format=ndjson|csv&fields=nombre,caedec&gzip=1
+    """
+    query = request.args.get('q', '').strip()
+    fmt = request.args.get('format', 'ndjson').strip().lower()
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format debe ser uno de: {', '.join(FORMATS)}"}), 400
+    try:
+        fields = parse_fields(request.args.get('fields'), CSV_DEFAULT_FIELDS if fmt == 'csv' else EXPORT_FIELDS)
+        codes = [int(c) for c in request.args.get('caedec', '').split(',') if c.strip()]
+        limit = request.args.get('limit')
+        limit = max(0, int(limit)) if limit not in (None, '') else None
+    except ValueError as e:
+        return jsonify({'error': 'Parámetros no válidos', 'detail': str(e)}), 400
+
+    text_keywords, numbers = extract_keywords(query)
+    caedec_values = list(dict.fromkeys(parse_caedec_numbers(numbers) + codes))
+
+    release = None
+    if search_index is not None:
+        batches = export_batches_from_index(text_keywords, caedec_values, fields, limit)
+    else:
+        if not export_slots.acquire(blocking=False):
+            response = jsonify({'error': 'Hay demasiadas exportaciones en curso, intenta de nuevo en unos segundos'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(EXPORT_RETRY_AFTER)
+            return response
+        try:
+            connection, cursor = open_export_cursor(text_keywords, caedec_values, fields, limit)
+        except Exception as e:
+            export_slots.release()
+            print(f"Error en el endpoint /search/export: {e}")
+            return jsonify({'error': 'Error al consultar la base de datos', 'detail': str(e)}), 500
+        release = export_release(connection)
+        batches = export_batches_from_cursor(cursor, release)
+
+    compress = request.args.get('gzip') == '1' or request.accept_encodings['gzip'] > 0
+    mimetype, extension = FORMATS[fmt]
+    headers = {
+        'Content-Disposition': f'attachment; filename="informacion.{extension}"',
+        'Vary': 'Accept-Encoding',
+        'X-Accel-Buffering': 'no',
+    }
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+    response = Response(export_chunks(batches, fields, fmt, compress), content_type=mimetype, headers=headers)
+    if release is not None:
+        response.call_on_close(release)
+    return response
+
+
+@app.route('/suggest')
+def suggest():
+    """Autocompletado de nombres de empresa y códigos CAEDEC: /suggest?q=<prefijo>&limit=8."""
+    prefix = request.args.get('q', '').strip()
+    try:
+        limit = max(1, min(int(request.args.get('limit', SUGGEST_LIMIT)), 50))
+    except ValueError:
+        return jsonify({'error': 'limit debe ser un número entero'}), 400
+
+    if len(prefix) < SUGGEST_MIN_CHARS:
+        return jsonify({'q': prefix, 'suggestions': []})
+
+    index = get_suggest_index()
+    if index is None:
+        return jsonify({'error': 'El autocompletado no está disponible'}), 503
+    with stage_timer('suggest'):
+        suggestions = [s.to_dict() for s in index.suggest(prefix, limit)]
+    return jsonify({'q': prefix, 'suggestions': suggestions})
+
+
+@app.route('/chat/batch', methods=['POST'])
+def chat_batch_endpoint():
+    """
+    Responde varias preguntas en una sola petición: {"messages": [...]}.
+    Devuelve {"results": [...]} en el orden de entrada con errores por elemento.
+    """
+    data = request.get_json(silent=True) or {}
+    messages = data.get('messages')
+
+    if not isinstance(messages, list) or not messages:
+        return jsonify({'error': 'Se esperaba una lista "messages" no vacía'}), 400
+    if len(messages) > BATCH_MAX_MESSAGES:
+        return jsonify({'error': f'Como máximo {BATCH_MAX_MESSAGES} mensajes por lote'}), 413
+
+    try:
+        return jsonify({'results': chat_batch(messages)})
+    except Exception as e:
+        print(f"Error en el endpoint /chat/batch: {e}")
+        return jsonify({
+            'error': 'Error al procesar el lote',
+            'detail': str(e)
+        }), 500
+
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Versión en streaming de /chat (Server-Sent Events).
+
+    Emite primero un evento `results` con los registros encontrados, luego
+    eventos `token` con los fragmentos de la respuesta y finalmente `done`.
+    """
+    data = request.get_json() or {}
+    message = data.get('message', '').strip()
+
+    if not message:
+        return jsonify({'error': 'No se proporcionó ningún mensaje'}), 400
+
+    deadline = time.monotonic() + CHAT_REQUEST_TIMEOUT
+    session = sessions.get(data.get('session_id'))
+    try:
+        routed = route_chat_message(message, session=session)
+        db_results = routed.db_results
+    except Exception as e:
+        print(f"Error en el endpoint /chat/stream: {e}")
         return jsonify({
             'error': 'Error al procesar tu pregunta',
             'detail': str(e)
         }), 500
 
+    tokens = None
+    # Turnos que registre la llamada al modelo (en el hilo de llm_gate): pasan a la
+    # sesión solo si el stream termina bien; si falla se registra lo que vio el usuario
+    pending = []
+    if routed.reply is not None:
+        record_turn(session, message, routed.reply, db_results)
+        tokens = iter([routed.reply])
+    elif db_results:
+        if needs_llm_call(message, db_results, session):
+            context_token = _pending_turns.set(pending)
+            try:
+                # Se reserva el hueco antes de responder para poder devolver 503 si está lleno
+                tokens = stream_llm_call(message, db_results, session, deadline)
+                first = next(tokens, None)
+            except LLMSaturated as e:
+                return llm_busy_response(e, db_results)
+            except DeadlineExceeded:
+                FALLBACKS.inc(reason='timeout')
+                first = None
+                pending = []
+                answer = local_answer(db_results)
+                record_turn(session, message, answer, db_results)
+                tokens = iter([answer])
+            finally:
+                _pending_turns.reset(context_token)
+            if first is not None:
+                tokens = itertools.chain([first], tokens)
+        else:
+            tokens = stream_ai_response_with_context(message, db_results, session)
+
+    def events():
+        yield sse_event('results', {'results': db_results})
+        if tokens is None:
+            EMPTY_RESULTS.inc()
+            yield sse_event('token', {'text': NO_RESULTS_REPLY})
+        else:
+            parts = []
+            try:
+                for text in tokens:
+                    parts.append(text)
+                    yield sse_event('token', {'text': text})
+            except DeadlineExceeded:
+                FALLBACKS.inc(reason='timeout')
+                fallback = local_answer(db_results)
+                record_turn(session, message, ''.join(parts) or fallback, db_results)
+                yield sse_event('error', {'error': 'La respuesta tardó demasiado', 'fallback_reply': fallback})
+            except Exception as e:
+                print(f"Error en el endpoint /chat/stream: {e}")
+                record_turn(session, message, ''.join(parts) or emergency_answer(db_results), db_results)
+                yield sse_event('error', {'error': 'Error al procesar tu pregunta', 'detail': str(e)})
+            else:
+                for turn in pending:
+                    sessions.record(*turn)
+        yield sse_event('done', {})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+# Tamaño de página por defecto y máximo de /caedec y /caedec/<code>
+CAEDEC_PAGE_SIZE = 50
+CAEDEC_MAX_PAGE_SIZE = 500
+
+
+def page_args(after_name: str):
+    """Lee `after` y `limit` de la query string; lanza ValueError si no son enteros."""
+    after = request.args.get(after_name)
+    limit = int(request.args.get('limit', CAEDEC_PAGE_SIZE))
+    return (int(after) if after not in (None, '') else None), max(1, min(limit, CAEDEC_MAX_PAGE_SIZE))
+
+
+@app.route('/caedec')
+def caedec_list():
+    """Catálogo de actividades CAEDEC paginado por código: /caedec?after=<code>&limit=50."""
+    catalog = caedec_catalog.get()
+    if catalog is None:
+        return jsonify({'error': 'El catálogo CAEDEC no está disponible'}), 503
+    try:
+        after, limit = page_args('after')
+    except ValueError:
+        return jsonify({'error': 'after y limit deben ser números enteros'}), 400
+
+    entries = catalog.page(after, limit)
+    return jsonify({
+        'items': [entry.to_dict() for entry in entries],
+        'total_codes': len(catalog),
+        'next_after': entries[-1].code if len(entries) == limit else None
+    })
+
+
+@app.route('/caedec/<int:code>')
+def caedec_detail(code: int):
+    """Actividad CAEDEC con sus empresas paginadas por id: /caedec/1111?after_id=<id>&limit=50."""
+    catalog = caedec_catalog.get()
+    if catalog is None:
+        return jsonify({'error': 'El catálogo CAEDEC no está disponible'}), 503
+    entry = catalog.get(code)
+    if entry is None:
+        return jsonify({'error': f'No existe el CAEDEC {code}'}), 404
+    try:
+        after_id, limit = page_args('after_id')
+    except ValueError:
+        return jsonify({'error': 'after_id y limit deben ser números enteros'}), 400
+
+    companies = [{'id': row.get('id'), 'nombre': row.get('nombre'), 'nombreLargo': row.get('nombreLargo')}
+                 for row in catalog.companies(code, after_id, limit)]
+    return jsonify({
+        **entry.to_dict(),
+        'companies': companies,
+        'next_after_id': companies[-1]['id'] if len(companies) == limit else None
+    })
+
+
+def collect_health() -> Dict[str, Any]:
+    """
+    Recoge el estado para /status y /test_db (una conexión, COUNT(*) y filas
+    de ejemplo, más las estadísticas en memoria) después de actualizar los
+    datos del proceso con `refresh_data`. Lo ejecuta `health_monitor` en
+    segundo plano cada HEALTH_REFRESH_INTERVAL segundos.
+    """
+    # Datos en memoria primero: con un índice local no dependen de la BD
+    refresh_data()
 
-@app.route('/status')
-def status():
-    """Devuelve información de diagnóstico sobre la configuración."""
     gemini_key = os.getenv('GEMINI_API_KEY')
     gemini_model = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
 
@@ -309,65 +1723,116 @@ def status():
     # Verificar conexión a la base de datos
     db_connected = False
     db_records = 0
+    samples = []
+    db_error = None
     try:
         connection = get_db_connection()
         if connection:
             db_connected = True
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT COUNT(*) as count FROM informacion")
-                result = cursor.fetchone()
-                db_records = result['count'] if result else 0
-            connection.close()
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*) as count FROM informacion")
+                    result = cursor.fetchone()
+                    db_records = result['count'] if result else 0
+
+                    cursor.execute(f"SELECT {SEARCH_COLUMNS} FROM informacion LIMIT 3")
+                    samples = list(cursor.fetchall())
+            finally:
+                connection.close()
+        else:
+            db_error = 'No se pudo conectar a la base de datos'
     except Exception as e:
         print(f"Error verificando base de datos: {e}")
+        db_error = str(e)
 
     # Determinar el modo: 'sdk' si tiene API key y SDK, sino 'echo'
     mode = 'sdk' if (sdk_installed and has_key) else 'echo'
 
-    return jsonify({
-        'sdk_installed': sdk_installed,
-        'has_key': has_key,
-        'gemini_model': gemini_model,
-        'db_connected': db_connected,
-        'db_records': db_records,
-        'mode': mode
-    })
+    if db_connected and db_error is None:
+        test_db_body = {'status': 'connected', 'total_records': db_records, 'sample_records': samples}
+    else:
+        test_db_body = {'error': 'Error al conectar con la base de datos', 'detail': db_error}
+
+    return {
+        'status': {
+            'sdk_installed': sdk_installed,
+            'has_key': has_key,
+            'gemini_model': gemini_model,
+            'db_connected': db_connected,
+            'db_records': db_records,
+            'db_pool': db_pool.stats(),
+            'answer_cache': answer_cache.stats(),
+            'llm_gate': llm_gate.stats(),
+            'caedec_catalog': caedec_catalog.stats(),
+            'sessions': sessions.stats(),
+            'coalescing': {'enabled': COALESCE_REQUESTS, 'search': search_flight.stats(), 'llm': llm_flight.stats()},
+            'llm_call_timeout': LLM_CALL_TIMEOUT,
+            'llm_stream_idle_timeout': LLM_STREAM_IDLE_TIMEOUT,
+            'llm_stream_max_duration': LLM_STREAM_MAX_DURATION,
+            'circuit_breaker': llm_breaker.stats(),
+            'mode': mode
+        },
+        'test_db': test_db_body,
+    }
+
+
+# /status y /test_db responden con el último estado recogido en segundo plano
+health_monitor = HealthMonitor(collect_health, interval=float(os.getenv('HEALTH_REFRESH_INTERVAL', '15')))
+
+
+def health_info(snapshot) -> Dict[str, Any]:
+    return {
+        'checked_at': round(snapshot.checked_at, 3),
+        'age_seconds': round(max(0.0, time.time() - snapshot.checked_at), 3),
+        **health_monitor.stats(),
+    }
+
+
+@app.route('/status')
+def status():
+    """Devuelve información de diagnóstico sobre la configuración (del último estado recogido)."""
+    snapshot = health_monitor.get()
+    if snapshot.value is None:
+        return jsonify({'error': 'Estado no disponible', 'detail': snapshot.error}), 503
+    return jsonify({**snapshot.value['status'], 'health': health_info(snapshot)})
 
 
 @app.route('/test_db')
 def test_db():
-    """Endpoint de prueba para verificar la conexión a la base de datos."""
-    try:
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'error': 'No se pudo conectar a la base de datos'}), 500
+    """Endpoint de prueba para verificar la conexión a la base de datos (del último estado recogido)."""
+    snapshot = health_monitor.get()
+    if snapshot.value is None:
+        return jsonify({'error': 'Estado no disponible', 'detail': snapshot.error}), 503
+    body = snapshot.value['test_db']
+    return jsonify({**body, 'health': health_info(snapshot)}), (500 if 'error' in body else 200)
 
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) as count FROM informacion")
-            result = cursor.fetchone()
-            count = result['count'] if result else 0
 
-            cursor.execute("SELECT * FROM informacion LIMIT 3")
-            samples = cursor.fetchall()
+@app.route('/healthz')
+def healthz():
+    """Liveness: el proceso responde. No consulta la BD ni la IA."""
+    return jsonify({'status': 'ok'})
 
-        connection.close()
 
-        return jsonify({
-            'status': 'connected',
-            'total_records': count,
-            'sample_records': samples
-        })
-    except Exception as e:
-        return jsonify({
-            'error': 'Error al conectar con la base de datos',
-            'detail': str(e)
-        }), 500
+@app.before_request
+def start_background_tasks():
+    """
+    Arranca el hilo de salud del proceso con la primera petición (en cada
+    worker, también tras un fork con preload); su primera recogida carga el
+    catálogo y precalienta el pool con `refresh_data`.
+    """
+    health_monitor.start()
+
 
+# Importar la app no abre conexiones: el índice desde CSV o snapshot no usa la BD
+# (y con preload el snapshot queda mapeado una vez en el padre); desde la BD lo carga `refresh_data`
+if SEARCH_INDEX_SOURCE != 'db':
+    init_search_index()
 
 # Print minimal startup diagnostics
 print('__STARTUP__: SDK_installed=' + str(genai is not None) +
       ", GEMINI_API_KEY_set=" + str(bool(os.getenv('GEMINI_API_KEY'))) +
-      ", DB_configured=" + str(DB_CONFIG['database']))
+      ", DB_configured=" + str(DB_CONFIG['database']) +
+      ", search_index=" + (SEARCH_INDEX_SOURCE or 'off'))
 
 if __name__ == '__main__':
     app.run(host='127.0.0.1', port=5000, debug=True)
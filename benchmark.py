@@ -0,0 +1,258 @@
+"""
+Benchmark reproducible de /chat, search_in_database y la construcción del prompt.
+
+Levanta la app en este mismo proceso contra la base de datos configurada
+(--backend mysql, cargando CAEDEC1.csv con --load) o contra el índice en
+memoria construido desde el CSV (--backend csv, no requiere MySQL), y un
+servidor Gemini falso (fake_gemini.py) con latencia configurable. Luego
+reproduce una mezcla fija de consultas a varios niveles de concurrencia y
+guarda p50/p95/p99 y el throughput de cada etapa en un JSON para comparar
+entre commits.
+
+Uso:
+    python benchmark.py --backend csv --concurrency 1 4 16 --requests 200 --llm-latency 0.2
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from fake_gemini import FakeGeminiServer
+
+# Mezcla de consultas: números CAEDEC, nombres de empresas, solo stop words y fuera de tema
+QUERY_MIX = {
+    'caedec': ['caedec 74990', '1111', 'el caedec 45209 a que corresponde?', 'codigo 51341'],
+    'nombre': ['ARTESANIAS PUNCHAY', 'holandes', 'empresa minera clavijo', 'estancias san juan',
+               'editora hermenca', 'plastoform'],
+    'stop_words': ['que es la empresa', 'de la', 'cual es el nombre', 'hay datos'],
+    'fuera_de_tema': ['que version de gemini eres', 'cual es el clima hoy', 'receta de pan', 'hola'],
+}
+
+
+def build_workload(total: int, seed: int) -> List[Dict[str, str]]:
+    """Genera una lista reproducible de consultas repartidas entre las categorías."""
+    rng = random.Random(seed)
+    categories = sorted(QUERY_MIX)
+    workload = []
+    for i in range(total):
+        category = categories[i % len(categories)]
+        workload.append({'category': category, 'query': rng.choice(QUERY_MIX[category])})
+    return workload
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def legacy_prompt(user_question: str, db_results: List[Dict[str, Any]], rules: str) -> str:
+    """
+    Prompt con el formato anterior (reglas + un bloque por registro dentro de
+    `contents`), solo para comparar tamaños con el formato compacto.
+    """
+    db_info = ""
+    for row in db_results:
+        db_info += f"\n- Nombre: {row.get('nombre', 'N/A')}"
+        if row.get('nombreLargo'):
+            db_info += f"\n  Nombre completo: {row.get('nombreLargo')}"
+        if row.get('caedec'):
+            db_info += f"\n  CAEDEC: {row.get('caedec')}"
+        if row.get('descripcion'):
+            db_info += f"\n  Descripción: {row.get('descripcion')}"
+        db_info += "\n"
+    return (f"{rules}\n\nDATOS DISPONIBLES DE LA BASE DE DATOS:\n{db_info}\n\nPREGUNTA DEL USUARIO:\n{user_question}\n\n"
+            "Responde de forma natural y conversacional, usando ÚNICAMENTE la información proporcionada arriba.")
+
+
+def prompt_sizes(chat_app, rows_by_query: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Caracteres enviados al modelo por consulta con el formato compacto
+    (instrucción de sistema + `contents`) y con el anterior, que repetía las
+    reglas (las de SYSTEM_INSTRUCTION) dentro de cada prompt.
+    """
+    from prompt_builder import SYSTEM_INSTRUCTION, compact_prompt_chars
+
+    compact = []
+    legacy = []
+    for query, rows in rows_by_query.items():
+        if not rows:
+            continue
+        compact.append(compact_prompt_chars(chat_app.build_prompt(query, rows)))
+        legacy.append(len(legacy_prompt(query, rows, SYSTEM_INSTRUCTION)))
+    if not compact:
+        return {}
+    return {
+        'queries': len(compact),
+        'compact_mean_chars': round(statistics.fmean(compact), 1),
+        'legacy_mean_chars': round(statistics.fmean(legacy), 1),
+        'reduction_pct': round(100 * (1 - sum(compact) / sum(legacy)), 1),
+    }
+
+
+def summarize(latencies: List[float], errors: int, wall_time: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    return {
+        'requests': len(values) + errors,
+        'errors': errors,
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'mean_ms': round(statistics.fmean(values) * 1000, 3) if values else 0.0,
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+        'throughput_rps': round(len(values) / wall_time, 2) if wall_time > 0 else 0.0,
+    }
+
+
+def run_stage(fn: Callable[[Dict[str, str]], bool], workload: List[Dict[str, str]], concurrency: int) -> Dict[str, Any]:
+    """Ejecuta `fn` para cada consulta con `concurrency` hilos y mide cada llamada."""
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def task(item):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ok = fn(item)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(task, workload))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark de /chat y sus etapas.')
+    parser.add_argument('--backend', choices=['csv', 'mysql'], default='csv',
+                        help='csv: índice en memoria desde CAEDEC1.csv; mysql: base de datos configurada en .env')
+    parser.add_argument('--load', action='store_true', help='Con --backend mysql, recargar CAEDEC1.csv antes de medir')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=200, help='Peticiones por etapa y nivel de concurrencia')
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='Latencia del Gemini falso en segundos')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args(argv)
+
+    fake = FakeGeminiServer(latency=args.llm_latency).start()
+
+    # La configuración de app.py se lee al importar, así que se fija antes
+    os.environ['GEMINI_API_KEY'] = os.environ.get('BENCH_GEMINI_API_KEY', 'fake-key')
+    os.environ['GEMINI_BASE_URL'] = fake.base_url
+    os.environ['SEARCH_INDEX_SOURCE'] = 'csv' if args.backend == 'csv' else ''
+    # Sin caché de respuestas: se mide la ruta completa en cada petición
+    os.environ.setdefault('ANSWER_CACHE_SIZE', '0')
+
+    if args.backend == 'mysql' and args.load:
+        import load_caedec
+        if load_caedec.main(['--mode', 'replace']) != 0:
+            return 1
+
+    import app as chat_app
+    from werkzeug.serving import make_server
+
+    # Importar la app no carga el catálogo CAEDEC: se carga aquí para no medirlo dentro de las etapas
+    chat_app.refresh_data()
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, chat_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    chat_url = f'http://127.0.0.1:{server.server_port}/chat'
+
+    def call_search(item):
+        chat_app.search_in_database(item['query'], limit=5)
+        return True
+
+    rows_by_query = {q: chat_app.search_in_database(q, limit=5) for qs in QUERY_MIX.values() for q in qs}
+
+    def call_prompt(item):
+        chat_app.build_prompt(item['query'], rows_by_query[item['query']])
+        return True
+
+    def call_chat(item):
+        body = json.dumps({'message': item['query']}).encode('utf-8')
+        req = urllib.request.Request(chat_url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                resp.read()
+                return resp.status == 200
+        except urllib.error.HTTPError:
+            return False
+
+    stages = {
+        'search_in_database': call_search,
+        'build_prompt': call_prompt,
+        'chat': call_chat,
+    }
+
+    workload = build_workload(args.requests, args.seed)
+    results: Dict[str, Any] = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'backend': args.backend,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'llm_latency_s': args.llm_latency,
+            'seed': args.seed,
+            'python': sys.version.split()[0],
+        },
+        'stages': {},
+    }
+
+    results['prompt_chars'] = prompt_sizes(chat_app, rows_by_query)
+    if results['prompt_chars']:
+        sizes = results['prompt_chars']
+        print(f"prompt: compacto={sizes['compact_mean_chars']} caracteres, anterior={sizes['legacy_mean_chars']} "
+              f"({sizes['reduction_pct']}% menos)")
+
+    try:
+        for stage, fn in stages.items():
+            results['stages'][stage] = {}
+            for concurrency in args.concurrency:
+                summary = run_stage(fn, workload, concurrency)
+                results['stages'][stage][str(concurrency)] = summary
+                print(f"{stage:20s} c={concurrency:<3d} p50={summary['p50_ms']:9.3f}ms "
+                      f"p95={summary['p95_ms']:9.3f}ms p99={summary['p99_ms']:9.3f}ms "
+                      f"rps={summary['throughput_rps']:9.2f} errores={summary['errors']}")
+    finally:
+        server.shutdown()
+        fake.stop()
+
+    results['fake_llm_requests'] = fake.requests
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Benchmark de la búsqueda aproximada por trigramas (fuzzy_search.py).
+
+Construye la matriz TF-IDF sobre CAEDEC1.csv (~15.5k filas) y sobre copias
+del CSV hasta el tamaño pedido (p. ej. 1M filas), y mide la latencia por
+consulta de `FuzzyIndex.search` con una lista fija de consultas con errores
+de escritura. Guarda el tiempo de construcción, la memoria de la matriz y
+p50/p95/p99 por tamaño en un JSON.
+
+Uso:
+    python benchmark_fuzzy.py --rows 15530 1000000 --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+from benchmark import git_commit, summarize
+from search_index import SearchIndex
+
+# Nombres mal escritos y consultas parciales
+FUZZY_QUERIES = ['holandez', 'artesania punchai', 'plastofrom', 'minera clavijo', 'editora ermenca',
+                 'estancia san juan', 'cooperativa de aorro', 'construcora', 'farmacia', 'importadora de repuestos']
+
+
+def scaled_rows(rows: List[Dict[str, Any]], total: int) -> List[Dict[str, Any]]:
+    """Repite las filas del CSV con ids nuevos hasta llegar a `total` filas."""
+    if total <= len(rows):
+        return rows[:total]
+    return [{**rows[i % len(rows)], 'id': i + 1} for i in range(total)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark de la búsqueda aproximada por trigramas.')
+    parser.add_argument('--csv', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CAEDEC1.csv'))
+    parser.add_argument('--rows', type=int, nargs='+', default=[15530, 1000000], help='Tamaños de la tabla a medir')
+    parser.add_argument('--repeat', type=int, default=20, help='Veces que se repite la lista de consultas')
+    parser.add_argument('--limit', type=int, default=5)
+    parser.add_argument('--output', default='bench_fuzzy_results.json')
+    args = parser.parse_args(argv)
+
+    from fuzzy_search import FuzzyIndex, np
+    if np is None:
+        print('Se necesita numpy para este benchmark (pip install numpy)')
+        return 1
+
+    base_rows = list(SearchIndex.from_csv(args.csv).rows)
+    results: Dict[str, Any] = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {'repeat': args.repeat, 'limit': args.limit, 'python': sys.version.split()[0],
+                   'numpy': np.__version__},
+        'sizes': {},
+    }
+
+    for total in args.rows:
+        rows = scaled_rows(base_rows, total)
+        start = time.perf_counter()
+        index = FuzzyIndex(rows)
+        build_s = time.perf_counter() - start
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for query in FUZZY_QUERIES:
+                t = time.perf_counter()
+                index.search(query, args.limit)
+                latencies.append(time.perf_counter() - t)
+        summary = summarize(latencies, 0, time.perf_counter() - start)
+        summary.update({'rows': len(rows), 'build_s': round(build_s, 3), 'matrix_mb': round(index.nbytes / 1e6, 1)})
+        results['sizes'][str(len(rows))] = summary
+        print(f"filas={len(rows):<8d} construcción={build_s:7.2f}s matriz={summary['matrix_mb']:7.1f}MB "
+              f"p50={summary['p50_ms']:8.3f}ms p95={summary['p95_ms']:8.3f}ms p99={summary['p99_ms']:8.3f}ms")
+        del index, rows
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""
+Benchmark del arranque con SEARCH_INDEX_SOURCE=csv frente a snapshot.
+
+Genera el snapshot desde CAEDEC1.csv en un directorio temporal y mide, para
+cada origen, el tiempo de abrir el índice de búsqueda (`SearchIndex`), de
+construir el catálogo CAEDEC y el índice de /suggest con sus filas, y la
+latencia de `SearchIndex.search` con una lista fija de consultas. Cada
+medición de arranque se repite `--repeat` veces y se guarda la mediana en un
+JSON junto con el commit.
+
+Uso:
+    python benchmark_snapshot.py --repeat 5 --queries 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict
+
+from benchmark import QUERY_MIX, git_commit, summarize
+from caedec_catalog import CaedecCatalog
+from search_index import SearchIndex
+from snapshot import _csv_rows, write_snapshot
+from suggest import SuggestIndex
+
+SEARCH_QUERIES = [query for category in ('caedec', 'nombre') for query in QUERY_MIX[category]] + [
+    'servicios de transporte', 'plast', 'importadora de repuestos', 'descuentos 52390']
+
+
+def timed(fn: Callable[[], Any]):
+    start = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - start
+
+
+def measure(open_index: Callable[[], SearchIndex], repeat: int, queries: int) -> Dict[str, Any]:
+    """Mediana de los tiempos de arranque y latencia de búsqueda sobre el último índice abierto."""
+    times = {'index_s': [], 'catalog_s': [], 'suggest_s': []}
+    for _ in range(repeat):
+        index, elapsed = timed(open_index)
+        times['index_s'].append(elapsed)
+        catalog, elapsed = timed(lambda: CaedecCatalog(index.rows))
+        times['catalog_s'].append(elapsed)
+        _, elapsed = timed(lambda: SuggestIndex(index.rows, catalog))
+        times['suggest_s'].append(elapsed)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(queries):
+        for query in SEARCH_QUERIES:
+            _, elapsed = timed(lambda: index.search(query, 10))
+            latencies.append(elapsed)
+    result = {name: round(statistics.median(values), 4) for name, values in times.items()}
+    result['total_s'] = round(sum(result.values()), 4)
+    result['search'] = summarize(latencies, 0, time.perf_counter() - start)
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark del arranque con el CSV frente al snapshot.')
+    parser.add_argument('--csv', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CAEDEC1.csv'))
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones de cada medición de arranque')
+    parser.add_argument('--queries', type=int, default=20, help='Veces que se repite la lista de consultas')
+    parser.add_argument('--output', default='bench_snapshot_results.json')
+    args = parser.parse_args(argv)
+
+    results: Dict[str, Any] = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {'repeat': args.repeat, 'queries': args.queries, 'python': sys.version.split()[0]},
+        'sources': {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'informacion.snap')
+        rows, write_s = timed(lambda: write_snapshot(_csv_rows(args.csv), path))
+        results['snapshot'] = {'rows': rows, 'write_s': round(write_s, 3), 'mb': round(os.path.getsize(path) / 1e6, 1)}
+        print(f"Snapshot: {rows} filas, {results['snapshot']['mb']} MB, generado en {write_s:.2f}s")
+
+        sources = {'csv': lambda: SearchIndex.from_csv(args.csv), 'snapshot': lambda: SearchIndex.from_snapshot(path)}
+        for name, open_index in sources.items():
+            result = results['sources'][name] = measure(open_index, args.repeat, args.queries)
+            print(f"{name:<9s} índice={result['index_s']:7.4f}s catálogo={result['catalog_s']:7.4f}s "
+                  f"suggest={result['suggest_s']:7.4f}s total={result['total_s']:7.4f}s "
+                  f"búsqueda p50={result['search']['p50_ms']:.3f}ms p95={result['search']['p95_ms']:.3f}ms")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Catálogo precalculado de actividades CAEDEC.
+
+Para cada código guarda la descripción canónica (la más frecuente entre sus
+filas), el número de empresas y la lista ordenada de ids. Sirve los
+endpoints /caedec y /caedec/<code> con paginación por clave (``after``) y
+las búsquedas que solo piden códigos CAEDEC, sin consultar la tabla.
+
+`CatalogHolder` reconstruye el catálogo cuando cambia la versión de los
+datos (p. ej. ``COUNT(*)`` y ``MAX(id)`` de `informacion`), comprobándola
+como mucho una vez cada `check_interval` segundos desde un hilo en segundo
+plano; las peticiones solo leen el catálogo ya construido. Las filas se leen
+una sola vez por versión y se pasan también a los oyentes registrados con
+`add_listener` (autocompletado, búsqueda aproximada), que se reconstruyen
+con los mismos datos.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter
+from collections.abc import Sequence as SequenceABC
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from search_index import column_values
+
+
+class CaedecEntry(NamedTuple):
+    code: int
+    description: Optional[str]
+    count: int
+    ids: Tuple[int, ...]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'code': self.code, 'description': self.description, 'count': self.count}
+
+
+class CaedecCatalog:
+    """Códigos CAEDEC ordenados con su descripción, conteo e ids de empresas."""
+
+    def __init__(self, rows: Iterable[Mapping[str, Any]], version: Hashable = None):
+        self.version = version
+        if not isinstance(rows, SequenceABC):
+            rows = list(rows)
+        # Las filas se guardan por posición y se leen solo al devolverlas (en el snapshot, sin crearlas antes)
+        self._rows: Sequence[Mapping[str, Any]] = rows
+        self._positions: Dict[int, int] = {}
+        ids_by_code: Dict[int, List[int]] = {}
+        descriptions: Dict[int, Counter] = {}
+
+        columns = zip(column_values(rows, 'id'), column_values(rows, 'caedec'), column_values(rows, 'descripcion'))
+        for pos, (row_id, caedec, descripcion) in enumerate(columns):
+            if row_id is None or caedec is None:
+                continue
+            code = int(caedec)
+            self._positions[row_id] = pos
+            ids_by_code.setdefault(code, []).append(row_id)
+            descripcion = (descripcion or '').strip()
+            if descripcion:
+                descriptions.setdefault(code, Counter())[descripcion] += 1
+
+        self._entries: Dict[int, CaedecEntry] = {}
+        for code, ids in ids_by_code.items():
+            ids.sort()
+            # Counter.most_common conserva el orden de aparición en los empates
+            common = descriptions.get(code)
+            description = common.most_common(1)[0][0] if common else None
+            self._entries[code] = CaedecEntry(code, description, len(ids), tuple(ids))
+        self._codes = sorted(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, code: int) -> bool:
+        return code in self._entries
+
+    @property
+    def total_companies(self) -> int:
+        return len(self._positions)
+
+    def get(self, code: int) -> Optional[CaedecEntry]:
+        return self._entries.get(code)
+
+    def counts(self, codes: Iterable[int]) -> Dict[int, int]:
+        """Número de empresas de cada código conocido."""
+        return {code: self._entries[code].count for code in codes if code in self._entries}
+
+    def page(self, after: Optional[int] = None, limit: int = 50) -> List[CaedecEntry]:
+        """Códigos mayores que `after`, en orden ascendente."""
+        start = 0 if after is None else bisect_right(self._codes, after)
+        return [self._entries[code] for code in self._codes[start:start + limit]]
+
+    def companies(self, code: int, after_id: Optional[int] = None, limit: int = 50) -> List[Mapping[str, Any]]:
+        """Empresas del código con id mayor que `after_id`, en orden de id."""
+        entry = self._entries.get(code)
+        if entry is None:
+            return []
+        start = 0 if after_id is None else bisect_right(entry.ids, after_id)
+        return [self._rows[self._positions[row_id]] for row_id in entry.ids[start:start + limit]]
+
+    def lookup(self, codes: Sequence[int], limit: int) -> List[Dict[str, Any]]:
+        """
+        Filas de cualquiera de los códigos en orden de id, como
+        ``SELECT ... WHERE caedec = a OR caedec = b LIMIT n``.
+        """
+        id_lists = [self._entries[code].ids for code in dict.fromkeys(codes) if code in self._entries]
+        ids = heapq.merge(*id_lists)
+        return [dict(self._rows[self._positions[row_id]]) for _, row_id in zip(range(limit), ids)]
+
+
+class CatalogHolder:
+    """
+    Mantiene el catálogo vigente. `load_version()` devuelve la versión actual
+    de los datos y `load_rows()` las filas con las que reconstruirlo. Tras
+    cada reconstrucción se llama a los oyentes con ``(rows, catalog)``.
+    """
+
+    def __init__(self, load_version: Callable[[], Hashable], load_rows: Callable[[], Iterable[Mapping[str, Any]]],
+                 check_interval: float = 60.0):
+        self.load_version = load_version
+        self.load_rows = load_rows
+        self.check_interval = check_interval
+        self.catalog: Optional[CaedecCatalog] = None
+        self.refreshes = 0
+        self._listeners: List[Callable[[Sequence[Mapping[str, Any]], CaedecCatalog], None]] = []
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[Sequence[Mapping[str, Any]], CaedecCatalog], None]):
+        """Registra una función que se llama con las filas y el catálogo nuevo en cada reconstrucción."""
+        self._listeners.append(listener)
+
+    def refresh(self, force: bool = False) -> Optional[CaedecCatalog]:
+        """Comprueba la versión de los datos y reconstruye el catálogo si cambió."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            version = self.load_version()
+            if force or self.catalog is None or version != self.catalog.version:
+                rows = self.load_rows()
+                if not isinstance(rows, SequenceABC):
+                    rows = list(rows)
+                catalog = CaedecCatalog(rows, version)
+                for listener in self._listeners:
+                    try:
+                        listener(rows, catalog)
+                    except Exception as e:
+                        # Un oyente que falla conserva su versión anterior; el catálogo se actualiza igual
+                        print(f"Error reconstruyendo {getattr(listener, '__name__', listener)}: {e}")
+                # Se publica después de los oyentes: quien ve la versión nueva ve también sus índices
+                self.catalog = catalog
+                self.refreshes += 1
+            return self.catalog
+
+    def get(self) -> Optional[CaedecCatalog]:
+        """Catálogo actual, sin consultar la BD (las comprobaciones las hace `refresh_if_due` en segundo plano)."""
+        return self.catalog
+
+    def refresh_if_due(self) -> Optional[CaedecCatalog]:
+        """
+        Comprueba la versión y reconstruye el catálogo si pasó `check_interval`
+        desde la última comprobación, también cuando no hay catálogo o la
+        anterior falló (p. ej. con la BD caída al arrancar). Pensado para un
+        hilo en segundo plano: si otro hilo ya está comprobando no espera.
+        """
+        if time.monotonic() - self._checked_at < self.check_interval or self._lock.locked():
+            return self.catalog
+        try:
+            return self.refresh()
+        except Exception as e:
+            print(f"Error actualizando el catálogo CAEDEC: {e}")
+            return self.catalog
+
+    def stats(self) -> Dict[str, Any]:
+        catalog = self.catalog
+        return {
+            'codes': len(catalog) if catalog else 0,
+            'companies': catalog.total_companies if catalog else 0,
+            'version': list(catalog.version) if catalog and isinstance(catalog.version, tuple) else None,
+            'refreshes': self.refreshes,
+            'check_interval': self.check_interval,
+        }
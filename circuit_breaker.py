@@ -0,0 +1,135 @@
+"""
+Circuit breaker para las llamadas a la IA.
+
+Estados:
+
+- ``closed``: las llamadas pasan con normalidad. Tras `failure_threshold`
+  fallos seguidos (errores o respuestas más lentas que el límite) pasa a ``open``.
+- ``open``: no se llama al modelo y se responde con la respuesta local durante
+  `reset_timeout` segundos.
+- ``half_open``: pasado ese tiempo se dejan pasar como mucho
+  `half_open_max_calls` llamadas de prueba. Si salen bien el circuito se
+  cierra; si alguna falla vuelve a ``open`` otro periodo completo.
+
+Las últimas transiciones se guardan con su motivo para mostrarlas en /status.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Transiciones recientes que se conservan para /status
+TRANSITION_HISTORY = 20
+
+
+class CircuitBreaker:
+    """Circuit breaker con contador de fallos consecutivos y sondas en half-open."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1,
+                 on_transition: Optional[Callable[[str, str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self._on_transition = on_transition
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        self._transitions: deque = deque(maxlen=TRANSITION_HISTORY)
+        self.short_circuited = 0
+        self.successes = 0
+        self.failures = 0
+
+    def _transition(self, state: str, reason: str):
+        previous, self._state = self._state, state
+        if state == OPEN:
+            self._opened_at = self._clock()
+        if state == HALF_OPEN:
+            self._probes = 0
+            self._probe_successes = 0
+        if state == CLOSED:
+            self._failures = 0
+        self._transitions.append({'at': round(time.time(), 3), 'from': previous, 'to': state, 'reason': reason})
+        print(f"Circuit breaker de la IA: {previous} -> {state} ({reason})")
+        if self._on_transition:
+            self._on_transition(previous, state)
+
+    def _current_state(self) -> str:
+        # Con el lock tomado: pasado el tiempo de espera, open pasa a half_open
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN, 'fin de la espera')
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def available(self) -> bool:
+        """Indica si una llamada podría pasar ahora, sin reservar una sonda."""
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (state == HALF_OPEN and self._probes < self.half_open_max_calls)
+
+    def allow(self) -> bool:
+        """
+        Indica si se puede llamar al modelo. En half_open reserva una de las
+        sondas; quien recibe True debe informar luego con `record_success` o
+        `record_failure`.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_max_calls:
+                    self._transition(CLOSED, 'sondas correctas')
+            elif state == CLOSED:
+                self._failures = 0
+
+    def record_failure(self, reason: str = 'error'):
+        with self._lock:
+            self.failures += 1
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._transition(OPEN, f'sonda fallida: {reason}')
+            elif state == CLOSED:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._transition(OPEN, f'{self._failures} fallos seguidos: {reason}')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            retry_in = max(0.0, self.reset_timeout - (self._clock() - self._opened_at)) if state == OPEN else 0.0
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'failure_threshold': self.failure_threshold,
+                'reset_timeout': self.reset_timeout,
+                'half_open_max_calls': self.half_open_max_calls,
+                'retry_in': round(retry_in, 3),
+                'successes': self.successes,
+                'failures': self.failures,
+                'short_circuited': self.short_circuited,
+                'transitions': list(self._transitions),
+            }
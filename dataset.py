@@ -0,0 +1,66 @@
+"""
+Utilidades para leer el dataset CAEDEC1.csv.
+
+El archivo viene separado por ';' con la cabecera
+``Nombre;Nombre Largo;CAEDED;Descripcion`` y codificación latin-1.
+"""
+import csv
+import os
+from typing import Dict, Any, Iterator, Mapping, Optional
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'CAEDEC1.csv')
+CSV_DELIMITER = ';'
+CSV_ENCODING = os.getenv('CAEDEC_CSV_ENCODING', 'latin-1')
+
+# Columnas del CSV en el mismo orden que las columnas de la tabla `informacion`
+CSV_HEADER = ['Nombre', 'Nombre Largo', 'CAEDED', 'Descripcion']
+TABLE_COLUMNS = ['nombre', 'nombreLargo', 'caedec', 'descripcion']
+
+
+def parse_caedec(value: Any) -> Optional[int]:
+    """Convierte el valor de la columna CAEDEC a entero (None si está vacío o no es numérico)."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _clean_text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value).strip() or None
+
+
+def clean_row(row: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Valores de una fila tal como se guardan en la tabla: textos sin espacios
+    en los extremos (vacío = None) y CAEDEC como entero. Se aplica igual a
+    las filas del CSV y a las leídas de la BD.
+    """
+    return {
+        'nombre': _clean_text(row.get('nombre')),
+        'nombreLargo': _clean_text(row.get('nombreLargo')),
+        'caedec': parse_caedec(row.get('caedec')),
+        'descripcion': _clean_text(row.get('descripcion')),
+    }
+
+
+def iter_caedec_csv(path: str = DEFAULT_CSV_PATH, encoding: str = CSV_ENCODING) -> Iterator[Dict[str, Any]]:
+    """
+    Recorre el CSV y devuelve cada fila como diccionario con las columnas de la tabla.
+    Las filas vacías o incompletas se ignoran.
+    """
+    with open(path, newline='', encoding=encoding) as f:
+        reader = csv.reader(f, delimiter=CSV_DELIMITER)
+        header = next(reader, None)
+        if header is None:
+            return
+        for values in reader:
+            if len(values) < len(TABLE_COLUMNS) or not any(v.strip() for v in values):
+                continue
+            yield clean_row(dict(zip(TABLE_COLUMNS, values)))
@@ -0,0 +1,291 @@
+"""
+Pool de conexiones acotado y thread-safe para MySQL.
+
+Las conexiones se crean con la función `connect` que recibe el pool (por
+ejemplo ``lambda: pymysql.connect(**DB_CONFIG)``), así que se puede probar con
+un MySQL/MariaDB local o con un driver falso que implemente ``cursor()``,
+``rollback()``, ``close()`` y opcionalmente ``ping()``.
+
+`ProcessLocalPool` crea el pool al primer uso y uno nuevo en cada proceso
+hijo tras un fork (gunicorn con ``--preload``, multiprocessing), para que los
+workers no compartan los sockets del proceso padre.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class PoolTimeout(Exception):
+    """No se liberó ninguna conexión dentro del tiempo de espera."""
+
+
+def default_health_check(raw) -> bool:
+    """Comprueba la conexión con ``ping()`` si el driver lo soporta."""
+    ping = getattr(raw, 'ping', None)
+    if ping is None:
+        return True
+    try:
+        ping(reconnect=False)
+    except TypeError:
+        ping()
+    return True
+
+
+class PooledConnection:
+    """
+    Envoltorio de una conexión prestada por el pool.
+
+    Delega todo en la conexión real, salvo ``close()``, que la devuelve al pool
+    en lugar de cerrarla. Así el código existente (``connection.close()``) no cambia.
+    """
+
+    def __init__(self, pool: 'ConnectionPool', raw, created_at: float):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def close(self, discard: bool = False):
+        if self._released:
+            return
+        self._released = True
+        self._pool.release(self._raw, self._created_at, discard=discard)
+
+    def discard(self):
+        """Devuelve la conexión indicando que está rota y debe cerrarse."""
+        self.close(discard=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Pool con tamaño mínimo/máximo, verificación al prestar, reciclado por
+    antigüedad (max_lifetime) y espera acotada (wait_timeout) cuando está lleno.
+    """
+
+    def __init__(self, connect: Callable[[], Any], min_size: int = 1, max_size: int = 10,
+                 max_lifetime: float = 1800.0, wait_timeout: float = 5.0,
+                 health_check: Optional[Callable[[Any], bool]] = default_health_check,
+                 health_check_interval: float = 0.0):
+        if max_size < 1:
+            raise ValueError('max_size debe ser >= 1')
+        self._connect = connect
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.wait_timeout = wait_timeout
+        self.health_check = health_check
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        # Conexiones libres: (conexión, creada_en, devuelta_en)
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        self._checkouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._timeouts = 0
+        self._failed_checks = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # --- ciclo de vida -------------------------------------------------------
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.max_lifetime) and now - created_at >= self.max_lifetime
+
+    def _close_raw(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def _create(self):
+        raw = self._connect()
+        with self._cond:
+            self._created += 1
+        return raw
+
+    def warm_up(self):
+        """Abre conexiones hasta llegar a min_size."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                raw = self._create()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                now = time.monotonic()
+                self._idle.append((raw, now, now))
+                self._cond.notify()
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        """Presta una conexión; lanza PoolTimeout si no hay ninguna libre a tiempo."""
+        timeout = self.wait_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            raw = None
+            create = False
+            with self._cond:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f'No hay conexiones libres tras {timeout:.1f}s (max_size={self.max_size})')
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+                if self._idle:
+                    # LIFO: se reutiliza la conexión más reciente (la más "caliente")
+                    raw, created_at, returned_at = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+                self._in_use += 1
+
+            now = time.monotonic()
+            if create:
+                try:
+                    raw = self._create()
+                except Exception:
+                    self._forget()
+                    raise
+                created_at = now
+            else:
+                if self._expired(created_at, now) or not self._check(raw, now - returned_at):
+                    self._close_raw(raw)
+                    self._forget(discarded=True)
+                    continue
+
+            waited = time.monotonic() - start
+            with self._cond:
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            return PooledConnection(self, raw, created_at)
+
+    def _check(self, raw, idle_for: float) -> bool:
+        if self.health_check is None or idle_for < self.health_check_interval:
+            return True
+        try:
+            if self.health_check(raw):
+                return True
+        except Exception:
+            pass
+        with self._cond:
+            self._failed_checks += 1
+        return False
+
+    def _forget(self, discarded: bool = False):
+        """Descuenta una conexión prestada que no vuelve al pool."""
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            if discarded:
+                self._discarded += 1
+            self._cond.notify()
+
+    def release(self, raw, created_at: float, discard: bool = False):
+        """Devuelve una conexión al pool (la cierra si está rota o es demasiado antigua)."""
+        if not discard:
+            try:
+                # Termina la transacción implícita para no conservar snapshots viejos
+                raw.rollback()
+            except Exception:
+                discard = True
+        now = time.monotonic()
+        if discard or self._expired(created_at, now):
+            self._close_raw(raw)
+            self._forget(discarded=True)
+            return
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append((raw, created_at, now))
+            self._cond.notify()
+
+    def close_all(self):
+        """Cierra las conexiones libres (las prestadas se cierran al devolverse si exceden max_lifetime)."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for raw, _created, _returned in idle:
+            self._close_raw(raw)
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas para dimensionar el pool."""
+        with self._cond:
+            return {
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiting': self._waiting,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'checkouts': self._checkouts,
+                'created': self._created,
+                'discarded': self._discarded,
+                'failed_health_checks': self._failed_checks,
+                'timeouts': self._timeouts,
+                'wait_time_total_ms': round(self._wait_total * 1000, 3),
+                'wait_time_max_ms': round(self._wait_max * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_total * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+            }
+
+
+class ProcessLocalPool:
+    """
+    Pool creado con `factory()` al primer uso en cada proceso. Tras un fork el
+    hijo crea el suyo y abandona el heredado sin cerrar sus conexiones: el
+    socket es el mismo que usa el padre y cerrarlo enviaría COM_QUIT por él.
+    """
+
+    def __init__(self, factory: Callable[[], ConnectionPool]):
+        self._factory = factory
+        self._pool: Optional[ConnectionPool] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> ConnectionPool:
+        pool = self._pool
+        if pool is not None and self._pid == os.getpid():
+            return pool
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = self._factory()
+                self._pid = os.getpid()
+            return self._pool
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledConnection:
+        return self.get().acquire(timeout)
+
+    def warm_up(self):
+        self.get().warm_up()
+
+    def stats(self) -> Dict[str, Any]:
+        return self.get().stats()
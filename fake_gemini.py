@@ -0,0 +1,136 @@
+"""
+Servidor local que imita la API REST de Gemini (generateContent y
+streamGenerateContent) con latencia configurable.
+
+Sirve para pruebas de carga y para probar la app sin llamar a Google:
+
+    python fake_gemini.py --port 8765 --latency 0.5
+    GEMINI_API_KEY=fake GEMINI_BASE_URL=http://127.0.0.1:8765 python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+def _response_body(text: str) -> dict:
+    return {
+        'candidates': [{
+            'content': {'parts': [{'text': text}], 'role': 'model'},
+            'finishReason': 'STOP',
+            'index': 0,
+        }],
+        'usageMetadata': {'promptTokenCount': 0, 'candidatesTokenCount': len(text.split())},
+    }
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    server: 'FakeGeminiServer'
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        return
+
+    def _send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        self.server.count_request()
+
+        if random.random() < self.server.error_rate:
+            time.sleep(self.server.latency)
+            self._send_json(500, {'error': {'code': 500, 'message': 'fake error', 'status': 'INTERNAL'}})
+            return
+
+        # Se parte por espacios (no por cualquier blanco) para conservar los saltos de línea de la respuesta
+        words = self.server.reply.split(' ')
+        if ':streamGenerateContent' in self.path:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            delay = self.server.latency / max(1, len(words))
+            for i, word in enumerate(words):
+                time.sleep(delay)
+                # Pausa larga después de `stall_after` fragmentos (stream atascado)
+                if i == self.server.stall_after:
+                    time.sleep(self.server.stall)
+                chunk = json.dumps(_response_body(word + ' '))
+                self.wfile.write(f'data: {chunk}\r\n\r\n'.encode('utf-8'))
+                self.wfile.flush()
+            self.close_connection = True
+        elif ':generateContent' in self.path:
+            time.sleep(self.server.latency)
+            self._send_json(200, _response_body(self.server.reply))
+        else:
+            self._send_json(404, {'error': {'code': 404, 'message': 'not found', 'status': 'NOT_FOUND'}})
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    """
+    Servidor falso; `latency` en segundos y `error_rate` entre 0 y 1. Con
+    `stall_after` = n, el stream se detiene `stall` segundos tras n fragmentos.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.2,
+                 error_rate: float = 0.0, reply: Optional[str] = None):
+        super().__init__((host, port), FakeGeminiHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.reply = reply or 'Respuesta de prueba generada por el servidor Gemini falso.'
+        self.stall_after: Optional[int] = None
+        self.stall = 0.0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self) -> 'FakeGeminiServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor Gemini falso para pruebas locales.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help='Segundos por respuesta')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fracción de respuestas con error 500')
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(args.host, args.port, args.latency, args.error_rate)
+    print(f'Servidor Gemini falso en {server.base_url} (latencia={args.latency}s, errores={args.error_rate:.0%})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""
+Búsqueda tolerante a errores de escritura con TF-IDF de trigramas de caracteres.
+
+Cada fila (nombre, nombreLargo y descripcion, con pesos 3/2/1 como en la
+búsqueda exacta) se convierte una sola vez en un vector TF-IDF de trigramas
+normalizado (norma L2). La matriz se guarda por columnas (formato tipo CSC:
+`indptr`, `indices`, `data` en arrays de NumPy), así que puntuar una consulta
+contra todas las filas es juntar las columnas de sus trigramas y sumar con un
+único ``np.bincount``; el top-k sale de ``np.argpartition``.
+
+"holandez" o "artesania punchai" no aparecen como subcadena en la tabla,
+pero comparten la mayoría de sus trigramas con "HOLANDES" y "ARTESANIAS
+PUNCHAY". NumPy es opcional: sin él `FuzzyIndex` no se puede construir y la
+app sigue usando solo la búsqueda exacta.
+"""
+import math
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from search_index import STOP_WORDS, TEXT_FIELDS, normalize_question
+
+NGRAM_SIZE = 3
+
+
+def char_ngrams(text: Any, n: int = NGRAM_SIZE) -> List[str]:
+    """Trigramas de cada palabra normalizada, con un espacio de relleno a cada lado (" HOL", ..., "ES ")."""
+    grams = []
+    for word in normalize_question(text or '').split():
+        padded = f' {word} '
+        if len(padded) <= n:
+            grams.append(padded)
+        else:
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def query_text(query: str) -> str:
+    """Texto de la consulta sin stop words ni números (lo que se compara con los nombres)."""
+    return ' '.join(w for w in normalize_question(query).split() if not w.isdigit() and w.lower() not in STOP_WORDS)
+
+
+class FuzzyIndex:
+    """
+    Matriz TF-IDF de trigramas (filas x trigramas) guardada por columnas.
+
+    `search(query, limit)` devuelve ``[(posición, similitud coseno)]`` de
+    mayor a menor similitud.
+    """
+
+    def __init__(self, rows: Sequence[Mapping[str, Any]], fields: Sequence[Tuple[str, int]] = TEXT_FIELDS):
+        if np is None:
+            raise RuntimeError('La búsqueda aproximada requiere numpy (pip install numpy)')
+
+        self.rows = rows
+        self.fields = tuple(fields)
+        self._vocabulary: Dict[str, int] = {}
+        self._positions: Dict[Any, int] = {}
+
+        # Las filas con el mismo texto (p. ej. datos repetidos) comparten su vector
+        vectors: Dict[tuple, Tuple[Any, Any]] = {}
+        row_cols = []
+        row_tf = []
+        for pos, row in enumerate(rows):
+            if row.get('id') is not None:
+                self._positions[row['id']] = pos
+            key = tuple(row.get(field) for field, _ in self.fields)
+            vector = vectors.get(key)
+            if vector is None:
+                counts: Dict[int, float] = {}
+                for (field, weight), text in zip(self.fields, key):
+                    for gram in char_ngrams(text):
+                        col = self._vocabulary.setdefault(gram, len(self._vocabulary))
+                        counts[col] = counts.get(col, 0) + weight
+                vector = vectors[key] = (np.fromiter(counts.keys(), dtype=np.int32, count=len(counts)),
+                                         np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+            row_cols.append(vector[0])
+            row_tf.append(vector[1])
+
+        n_rows = len(rows)
+        n_cols = len(self._vocabulary)
+        lengths = np.fromiter((len(c) for c in row_cols), dtype=np.int64, count=n_rows)
+        cols = np.concatenate(row_cols) if n_rows else np.zeros(0, dtype=np.int32)
+        data = np.concatenate(row_tf) if n_rows else np.zeros(0, dtype=np.float32)
+        row_ids = np.repeat(np.arange(n_rows, dtype=np.int32), lengths)
+        del row_cols, row_tf, vectors
+
+        # TF sublineal x IDF suavizado, normalizado por fila
+        df = np.bincount(cols, minlength=n_cols)
+        self._idf = (np.log((1.0 + n_rows) / (1.0 + df)) + 1.0).astype(np.float32)
+        self._unknown_idf = float(math.log(1.0 + n_rows) + 1.0)
+        data = (1.0 + np.log(data)) * self._idf[cols]
+        norms = np.sqrt(np.bincount(row_ids, weights=data * data, minlength=n_rows)).astype(np.float32)
+        norms[norms == 0] = 1.0
+        data /= norms[row_ids]
+
+        # Orden por columna (CSC): las filas de cada trigrama quedan contiguas
+        order = np.argsort(cols, kind='stable')
+        self._indices = row_ids[order]
+        self._data = data[order].astype(np.float32)
+        self._indptr = np.zeros(n_cols + 1, dtype=np.int64)
+        np.cumsum(df, out=self._indptr[1:])
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria de los arrays de la matriz en bytes."""
+        return self._indices.nbytes + self._data.nbytes + self._indptr.nbytes + self._idf.nbytes
+
+    def position(self, row_id: Any) -> Optional[int]:
+        return self._positions.get(row_id)
+
+    def scores(self, query: str):
+        """Similitud coseno de la consulta con todas las filas (array de NumPy), o None si no hay texto."""
+        grams = char_ngrams(query_text(query))
+        if not grams:
+            return None
+
+        counts: Dict[str, int] = {}
+        for gram in grams:
+            counts[gram] = counts.get(gram, 0) + 1
+
+        cols = []
+        weights = []
+        norm = 0.0
+        for gram, tf in counts.items():
+            col = self._vocabulary.get(gram)
+            # Los trigramas que no existen en los datos cuentan en la norma de la consulta
+            idf = float(self._idf[col]) if col is not None else self._unknown_idf
+            weight = (1.0 + math.log(tf)) * idf
+            norm += weight * weight
+            if col is not None:
+                cols.append(col)
+                weights.append(weight)
+        if not cols:
+            return np.zeros(len(self.rows), dtype=np.float32)
+
+        starts = self._indptr[cols]
+        ends = self._indptr[np.asarray(cols) + 1]
+        lengths = ends - starts
+        # Índices de todas las entradas de las columnas de la consulta, en un solo array
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths) + np.arange(lengths.sum())
+        column_weights = np.repeat(np.asarray(weights, dtype=np.float32) / math.sqrt(norm), lengths)
+        return np.bincount(self._indices[offsets], weights=self._data[offsets] * column_weights,
+                           minlength=len(self.rows))
+
+    @staticmethod
+    def top(scores, limit: int, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """Top-k de un vector de similitudes: [(posición, similitud)] por encima de `min_score`."""
+        k = min(limit, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(scores, len(scores) - k)[len(scores) - k:] if k < len(scores) else np.arange(len(scores))
+        # Mayor similitud primero; en empate, orden de tabla
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(int(pos), float(scores[pos])) for pos in top if scores[pos] > min_score]
+
+    def search(self, query: str, limit: int = 10, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """Top-k por similitud: [(posición, similitud)], sin las filas por debajo de `min_score`."""
+        scores = self.scores(query)
+        if scores is None:
+            return []
+        return self.top(scores, limit, min_score)
+
+    def rows_with_scores(self, top: Iterable[Tuple[int, float]]) -> List[Dict[str, Any]]:
+        """Copias de las filas de `top` con la columna `similitud`."""
+        results = []
+        for pos, score in top:
+            row = dict(self.rows[pos])
+            row['similitud'] = round(score, 4)
+            results.append(row)
+        return results
+
+    def search_rows(self, query: str, limit: int = 10, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """Como `search`, pero devuelve las filas con la columna `similitud`."""
+        return self.rows_with_scores(self.search(query, limit, min_score))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping[str, Any]]) -> 'FuzzyIndex':
+        return cls(list(rows))
@@ -0,0 +1,100 @@
+"""
+Estado de salud precalculado para /status y /test_db.
+
+Un hilo en segundo plano ejecuta cada `interval` segundos la función de
+recogida (conexión a la BD, número de filas, modo de la IA, estadísticas de
+pool y cachés) y publica el resultado como un objeto nuevo. Los endpoints solo
+leen la referencia al último resultado, sin locks ni consultas a la BD, así
+que responder cuesta lo mismo aunque el balanceador los consulte sin parar.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+
+class HealthSnapshot(NamedTuple):
+    value: Any
+    checked_at: float      # time.time() de la recogida
+    duration: float        # segundos que tardó la recogida
+    error: Optional[str]
+
+
+class HealthMonitor:
+    """Recoge el estado periódicamente en un hilo y deja el último resultado en `snapshot`."""
+
+    def __init__(self, collect: Callable[[], Any], interval: float = 15.0):
+        self.collect = collect
+        self.interval = max(0.5, interval)
+        self.snapshot: Optional[HealthSnapshot] = None
+        self.refreshes = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def refresh(self) -> HealthSnapshot:
+        """Ejecuta la recogida ahora y publica el resultado (si falla se conserva el valor anterior)."""
+        start = time.perf_counter()
+        previous = self.snapshot
+        try:
+            value, error = self.collect(), None
+        except Exception as e:
+            print(f"Error actualizando el estado de salud: {e}")
+            value, error = (previous.value if previous else None), str(e)
+            self.failures += 1
+        self.refreshes += 1
+        # Una sola asignación: los lectores ven el resultado anterior o el nuevo, nunca uno a medias
+        self.snapshot = HealthSnapshot(value, time.time(), time.perf_counter() - start, error)
+        return self.snapshot
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def running(self) -> bool:
+        """True si el hilo de actualización de este proceso está vivo."""
+        thread = self._thread
+        return thread is not None and thread.is_alive() and self._pid == os.getpid()
+
+    def start(self):
+        """Arranca el hilo de actualización (también tras un fork, donde el hilo del padre no existe)."""
+        if self.running():
+            return
+        with self._lock:
+            if self.running():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get(self) -> HealthSnapshot:
+        """Último estado publicado; la primera vez (antes de que el hilo termine su recogida) se calcula aquí."""
+        snapshot = self.snapshot
+        if snapshot is not None and self._pid == os.getpid():
+            return snapshot
+        self.start()
+        with self._lock:
+            if self.snapshot is None:
+                return self.refresh()
+        return self.snapshot
+
+    def age(self) -> Optional[float]:
+        snapshot = self.snapshot
+        return None if snapshot is None else max(0.0, time.time() - snapshot.checked_at)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            'interval': self.interval,
+            'refreshes': self.refreshes,
+            'failures': self.failures,
+            'last_duration_ms': round(snapshot.duration * 1000, 3) if snapshot else None,
+            'last_error': snapshot.error if snapshot else None,
+        }
@@ -0,0 +1,191 @@
+"""
+Ejecución acotada de las llamadas a la IA.
+
+Las llamadas al modelo se ejecutan en un pool de hilos propio con un número
+máximo de llamadas simultáneas y una cola de espera limitada. Si la cola está
+llena la petición se rechaza al instante (503 + Retry-After) en lugar de
+bloquear otro worker de Flask, y cada petición espera como mucho hasta su
+fecha límite.
+
+Mientras espera, la petición sigue ocupando su worker de Flask. Por eso
+también se rechaza al instante la llamada que, según la duración media de las
+últimas llamadas y las que tiene delante en la cola, no empezaría antes de su
+fecha límite: no tiene sentido retener el worker hasta agotarla. Aun así, para
+que /status y las búsquedas sigan respondiendo con la IA saturada, el servidor
+necesita más workers (hilos) que `max_concurrency + max_queue`.
+"""
+import math
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class LLMSaturated(Exception):
+    """No hay hueco en la cola de llamadas a la IA."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'Cola de IA llena, reintentar en {retry_after}s')
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """La llamada a la IA no terminó antes de la fecha límite de la petición."""
+
+
+_DONE = object()
+
+# Peso de la última llamada en la media móvil de duración
+DURATION_SMOOTHING = 0.2
+
+
+class LLMGate:
+    """Limita las llamadas a la IA en curso (max_concurrency) y en espera (max_queue)."""
+
+    def __init__(self, max_concurrency: int = 4, max_queue: int = 16, retry_after: int = 2):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='llm')
+        self._slots = threading.BoundedSemaphore(self.max_concurrency + self.max_queue)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        # Media móvil de la duración de las llamadas, para estimar la espera en cola
+        self._avg_duration: Optional[float] = None
+
+    def _release(self, _future=None):
+        with self._lock:
+            self._admitted -= 1
+        self._slots.release()
+
+    def _run(self, fn: Callable, args, kwargs):
+        with self._lock:
+            self._running += 1
+        start = time.monotonic()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            duration = time.monotonic() - start
+            with self._lock:
+                self._running -= 1
+                self.completed += 1
+                avg = self._avg_duration
+                self._avg_duration = duration if avg is None else avg + DURATION_SMOOTHING * (duration - avg)
+
+    def expected_wait(self) -> float:
+        """Segundos estimados hasta que empiece una llamada nueva (0 si hay un hilo libre)."""
+        with self._lock:
+            ahead = self._admitted - self.max_concurrency + 1
+            avg = self._avg_duration
+        if ahead <= 0 or avg is None:
+            return 0.0
+        return math.ceil(ahead / self.max_concurrency) * avg
+
+    def _reject(self):
+        with self._lock:
+            self.rejected += 1
+        raise LLMSaturated(self.retry_after)
+
+    def submit(self, fn: Callable, *args, deadline: Optional[float] = None, **kwargs):
+        """
+        Encola la llamada; lanza LLMSaturated si no hay hueco o si, con
+        `deadline` (time.monotonic()), no empezaría antes de la fecha límite
+        (DeadlineExceeded si esta ya pasó).
+        """
+        if deadline is not None:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                self._timed_out()
+            if self.expected_wait() >= left:
+                self._reject()
+        if not self._slots.acquire(blocking=False):
+            self._reject()
+        with self._lock:
+            self._admitted += 1
+        try:
+            # Se copia el contexto para conservar los datos de la petición (p. ej. tiempos por etapa)
+            context = contextvars.copy_context()
+            future = self._executor.submit(context.run, self._run, fn, args, kwargs)
+        except Exception:
+            self._release()
+            raise
+        # Se libera el hueco al terminar o al cancelarse mientras esperaba en cola
+        future.add_done_callback(self._release)
+        return future
+
+    def _timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+        raise DeadlineExceeded('La respuesta de la IA superó el tiempo límite')
+
+    def run(self, fn: Callable, *args, deadline: Optional[float] = None, **kwargs) -> Any:
+        """Ejecuta `fn` en el pool y espera su resultado hasta `deadline` (time.monotonic())."""
+        future = self.submit(fn, *args, deadline=deadline, **kwargs)
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()
+            self._timed_out()
+
+    def stream(self, gen_fn: Callable[..., Iterator], *args, deadline: Optional[float] = None,
+               idle_timeout: Optional[float] = None, max_deadline: Optional[float] = None, **kwargs) -> Iterator:
+        """
+        Ejecuta el generador `gen_fn` en el pool y devuelve sus elementos a
+        medida que llegan. `deadline` limita la admisión y la espera del primer
+        fragmento; después cada fragmento debe llegar en `idle_timeout`
+        segundos y el stream terminar antes de `max_deadline` (ambos opcionales),
+        así una respuesta larga que sigue produciendo texto no se corta.
+        """
+        chunks: 'queue.Queue' = queue.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                for item in gen_fn(*args, **kwargs):
+                    if cancelled.is_set():
+                        return
+                    chunks.put((item, None))
+            except Exception as e:
+                chunks.put((None, e))
+            finally:
+                chunks.put((_DONE, None))
+
+        future = self.submit(produce, deadline=deadline)
+        limit = deadline
+        try:
+            while True:
+                timeout = None if limit is None else max(0.0, limit - time.monotonic())
+                try:
+                    item, error = chunks.get(timeout=timeout)
+                except queue.Empty:
+                    future.cancel()
+                    self._timed_out()
+                if error is not None:
+                    raise error
+                if item is _DONE:
+                    return
+                yield item
+                limits = [t for t in (max_deadline, idle_timeout and time.monotonic() + idle_timeout) if t]
+                limit = min(limits) if limits else None
+        finally:
+            cancelled.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'in_flight': self._running,
+                'queued': self._admitted - self._running,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'avg_duration_ms': round(self._avg_duration * 1000, 3) if self._avg_duration is not None else None,
+            }
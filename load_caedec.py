@@ -0,0 +1,252 @@
+"""
+Carga masiva de CAEDEC1.csv en la tabla `informacion`.
+
+Lee el CSV por bloques y los inserta con INSERT de varias filas dentro de
+transacciones, sin depender de `LOAD DATA LOCAL INFILE`.
+
+Modos:
+  - replace      Reemplaza todo el contenido en una sola transacción (las
+                 consultas ven los datos anteriores hasta el COMMIT).
+  - append       Solo inserta las filas del CSV, confirmando cada bloque.
+  - incremental  Compara por hash de contenido. Las filas sin cambios no se
+                 tocan; una fila modificada se actualiza en su lugar (mismo
+                 id) emparejándola por nombre con una fila que ya no está en
+                 el CSV; las demás se insertan, y las que sobran se borran
+                 (salvo --keep-missing). Todo en una sola transacción: las
+                 consultas ven la versión anterior completa hasta el COMMIT.
+
+Uso:
+    python load_caedec.py [--csv CAEDEC1.csv] [--mode incremental] [--batch-size 1000]
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+from collections import defaultdict, deque
+from itertools import islice
+from typing import Any, Deque, Dict, Hashable, Iterable, Iterator, List, Mapping, Tuple
+
+import pymysql
+
+from dataset import DEFAULT_CSV_PATH, CSV_ENCODING, TABLE_COLUMNS, clean_row, iter_caedec_csv
+
+try:
+    from dotenv import load_dotenv
+except Exception:
+    def load_dotenv(*args, **kwargs):
+        return
+
+load_dotenv()
+
+DB_CONFIG = {
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', ''),
+    'database': os.getenv('DB_NAME', 'chatai'),
+    'charset': 'utf8mb4',
+    'cursorclass': pymysql.cursors.DictCursor,
+    'autocommit': False,
+}
+
+INSERT_SQL = (
+    "INSERT INTO informacion (nombre, nombreLargo, caedec, descripcion, content_hash) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+
+UPDATE_SQL = (
+    "UPDATE informacion SET nombre = %s, nombreLargo = %s, caedec = %s, descripcion = %s, content_hash = %s "
+    "WHERE id = %s"
+)
+
+
+def content_hash(row: Mapping[str, Any]) -> str:
+    """
+    Hash SHA-1 del contenido de una fila (nombre, nombreLargo, caedec,
+    descripcion), normalizado con `clean_row` para que una fila del CSV y la
+    misma fila leída de la BD den el mismo hash.
+    """
+    row = clean_row(row)
+    values = ['' if row.get(col) is None else str(row.get(col)) for col in TABLE_COLUMNS]
+    return hashlib.sha1('\x1f'.join(values).encode('utf-8')).hexdigest()
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ensure_schema(connection):
+    """Agrega la columna `content_hash` (y su índice) si la tabla aún no la tiene."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) AS count FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'informacion' AND COLUMN_NAME = 'content_hash'"
+        )
+        if cursor.fetchone()['count']:
+            return
+        print("Agregando la columna content_hash a la tabla informacion...")
+        cursor.execute(
+            "ALTER TABLE informacion ADD COLUMN content_hash CHAR(40) NULL, "
+            "ADD INDEX idx_informacion_content_hash (content_hash)"
+        )
+
+
+def natural_key(row: Mapping[str, Any]) -> Hashable:
+    """Clave con la que una fila modificada del CSV se empareja con la fila que reemplaza: el nombre."""
+    return clean_row(row)['nombre']
+
+
+def to_params(row: Dict[str, Any]) -> tuple:
+    return (row['nombre'], row['nombreLargo'], row['caedec'], row['descripcion'], content_hash(row))
+
+
+def insert_rows(cursor, rows: List[Dict[str, Any]]) -> int:
+    # executemany con un INSERT ... VALUES se envía como un único INSERT de varias filas
+    cursor.executemany(INSERT_SQL, [to_params(row) for row in rows])
+    return len(rows)
+
+
+def load_existing_hashes(cursor, batch_size: int) -> Tuple[Dict[str, Deque[int]], Dict[int, Hashable]]:
+    """
+    Devuelve hash -> ids (en orden de id) y id -> clave natural de las filas
+    actuales. El hash se recalcula con los valores normalizados; si falta en
+    la tabla (filas cargadas antes de existir `content_hash`) o no coincide,
+    se corrige en la misma transacción.
+    """
+    existing: Dict[str, Deque[int]] = defaultdict(deque)
+    keys: Dict[int, Hashable] = {}
+    outdated = []
+    cursor.execute("SELECT id, nombre, nombreLargo, caedec, descripcion, content_hash FROM informacion ORDER BY id")
+    for row in cursor.fetchall():
+        digest = content_hash(row)
+        existing[digest].append(row['id'])
+        keys[row['id']] = natural_key(row)
+        if row['content_hash'] != digest:
+            outdated.append((digest, row['id']))
+
+    for chunk in chunked(outdated, batch_size):
+        cursor.executemany("UPDATE informacion SET content_hash = %s WHERE id = %s", chunk)
+    return existing, keys
+
+
+def delete_ids(cursor, ids: List[int], batch_size: int) -> int:
+    deleted = 0
+    for chunk in chunked(ids, batch_size):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"DELETE FROM informacion WHERE id IN ({placeholders})", chunk)
+        deleted += len(chunk)
+    return deleted
+
+
+def load(connection, csv_path: str, mode: str = 'incremental', batch_size: int = 1000,
+         encoding: str = CSV_ENCODING, keep_missing: bool = False) -> Dict[str, Any]:
+    """Carga el CSV en la tabla y devuelve un resumen con filas por segundo."""
+    start = time.perf_counter()
+    stats = {'mode': mode, 'read': 0, 'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+
+    ensure_schema(connection)
+    rows = iter_caedec_csv(csv_path, encoding)
+
+    try:
+        with connection.cursor() as cursor:
+            if mode == 'replace':
+                cursor.execute("DELETE FROM informacion")
+                stats['deleted'] = cursor.rowcount
+                for chunk in chunked(rows, batch_size):
+                    stats['read'] += len(chunk)
+                    stats['inserted'] += insert_rows(cursor, chunk)
+                connection.commit()
+
+            elif mode == 'append':
+                for chunk in chunked(rows, batch_size):
+                    stats['read'] += len(chunk)
+                    stats['inserted'] += insert_rows(cursor, chunk)
+                    connection.commit()
+
+            elif mode == 'incremental':
+                existing, remaining = load_existing_hashes(cursor, batch_size)
+                changed = []
+                for chunk in chunked(rows, batch_size):
+                    stats['read'] += len(chunk)
+                    for row in chunk:
+                        ids = existing.get(content_hash(row))
+                        if ids:
+                            # Fila sin cambios: se "consume" una de las filas idénticas existentes
+                            del remaining[ids.popleft()]
+                            stats['unchanged'] += 1
+                        else:
+                            changed.append(row)
+
+                # Las filas nuevas o modificadas reutilizan, por nombre, el id de una fila que ya no está en el CSV
+                by_key: Dict[Hashable, Deque[int]] = defaultdict(deque)
+                for row_id, key in remaining.items():
+                    by_key[key].append(row_id)
+                updates, new_rows = [], []
+                for row in changed:
+                    ids = by_key.get(natural_key(row))
+                    if ids:
+                        updates.append(to_params(row) + (ids.popleft(),))
+                    else:
+                        new_rows.append(row)
+
+                for chunk in chunked(updates, batch_size):
+                    cursor.executemany(UPDATE_SQL, chunk)
+                    stats['updated'] += len(chunk)
+                for chunk in chunked(new_rows, batch_size):
+                    stats['inserted'] += insert_rows(cursor, chunk)
+                if not keep_missing:
+                    stale = sorted(row_id for ids in by_key.values() for row_id in ids)
+                    stats['deleted'] = delete_ids(cursor, stale, batch_size)
+                connection.commit()
+            else:
+                raise ValueError(f"Modo desconocido: {mode}")
+    except Exception:
+        connection.rollback()
+        raise
+
+    elapsed = time.perf_counter() - start
+    stats['seconds'] = round(elapsed, 3)
+    stats['rows_per_sec'] = round(stats['read'] / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Carga CAEDEC1.csv en la tabla informacion.')
+    parser.add_argument('--csv', default=os.getenv('CAEDEC_CSV_PATH', DEFAULT_CSV_PATH), help='Ruta del CSV (separado por ;)')
+    parser.add_argument('--mode', choices=['replace', 'append', 'incremental'], default='incremental')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Filas por INSERT de varias filas')
+    parser.add_argument('--encoding', default=CSV_ENCODING, help='Codificación del CSV (por defecto latin-1)')
+    parser.add_argument('--keep-missing', action='store_true', help='En modo incremental, no borrar filas que no están en el CSV')
+    args = parser.parse_args(argv)
+
+    try:
+        connection = pymysql.connect(**DB_CONFIG)
+    except Exception as e:
+        print(f"Error conectando a la base de datos: {e}")
+        return 1
+
+    try:
+        stats = load(connection, args.csv, args.mode, args.batch_size, args.encoding, args.keep_missing)
+    except Exception as e:
+        print(f"Error cargando {args.csv}: {e}")
+        return 1
+    finally:
+        connection.close()
+
+    print(f"Modo: {stats['mode']}")
+    print(f"  Filas leídas:     {stats['read']:,}")
+    print(f"  Insertadas:       {stats['inserted']:,}")
+    print(f"  Actualizadas:     {stats['updated']:,}")
+    print(f"  Eliminadas:       {stats['deleted']:,}")
+    print(f"  Sin cambios:      {stats['unchanged']:,}")
+    print(f"  Tiempo:           {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} filas/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""
+Métricas en memoria (contadores, histogramas y gauges) con salida en el
+formato de texto de Prometheus, más temporizadores por etapa del chat.
+
+Cada etapa medida con `stage_timer` alimenta el histograma
+``chatai_stage_seconds{stage=...}`` y, si hay una petición en curso, se anota
+también en la lista de tiempos de esa petición (cabecera Server-Timing).
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f'{self.name}{_format_labels(key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # etiquetas -> [conteos por bucket..., suma, total]
+        self._values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def count(self, **labels) -> int:
+        data = self._values.get(_label_key(labels))
+        return data[-1] if data else 0
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(data)) for key, data in self._values.items())
+        for key, data in items:
+            for bound, count in zip(self.buckets, data):
+                lines.append(f'{self.name}_bucket{_format_labels(key, ("le", _format_value(bound)))} {count}')
+            lines.append(f'{self.name}_bucket{_format_labels(key, ("le", "+Inf"))} {data[-1]}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {_format_value(data[-2])}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {data[-1]}')
+        return lines
+
+
+class Gauge:
+    """Gauge calculado al exportar: `fn` devuelve {etiquetas: valor} o un número."""
+
+    def __init__(self, name: str, help_text: str, fn: Callable[[], object], label: Optional[str] = None):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.label = label
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        try:
+            value = self.fn()
+        except Exception:
+            return lines
+        if isinstance(value, dict):
+            for label_value, v in sorted(value.items()):
+                lines.append(f'{self.name}{_format_labels(((self.label, str(label_value)),))} {_format_value(v)}')
+        else:
+            lines.append(f'{self.name} {_format_value(value)}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], object], label: Optional[str] = None) -> Gauge:
+        return self._register(Gauge(name, help_text, fn, label))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram('chatai_stage_seconds', 'Duración de cada etapa del chat en segundos')
+REQUESTS = REGISTRY.counter('chatai_requests_total', 'Peticiones recibidas por endpoint')
+FALLBACKS = REGISTRY.counter('chatai_fallbacks_total', 'Respuestas locales en lugar de la IA, por motivo')
+EMPTY_RESULTS = REGISTRY.counter('chatai_empty_results_total', 'Búsquedas sin resultados en la base de datos')
+LLM_ERRORS = REGISTRY.counter('chatai_llm_errors_total', 'Errores al llamar al modelo')
+PROMPT_CHARS = REGISTRY.histogram('chatai_prompt_chars', 'Tamaño del prompt enviado en caracteres (instrucción de sistema + contents)',
+                                  buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000))
+ROUTES = REGISTRY.counter('chatai_route_total', 'Mensajes del chat por ruta (greeting, off_topic, caedec, name, open)')
+LLM_CALLS_AVOIDED = REGISTRY.counter('chatai_llm_calls_avoided_total', 'Llamadas a la IA evitadas por respuestas con plantilla, por ruta')
+COALESCED = REGISTRY.counter('chatai_coalesced_requests_total', 'Peticiones que reutilizaron una búsqueda o llamada a la IA ya en curso, por tipo')
+CIRCUIT_TRANSITIONS = REGISTRY.counter('chatai_llm_circuit_transitions_total', 'Cambios de estado del circuit breaker de la IA, por estado nuevo')
+
+# Tiempos por etapa de la petición en curso: lista de (etapa, segundos)
+_request_timings: contextvars.ContextVar = contextvars.ContextVar('chatai_request_timings', default=None)
+
+
+def start_request_timings() -> List[Tuple[str, float]]:
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def current_request_timings() -> Optional[List[Tuple[str, float]]]:
+    return _request_timings.get()
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Mide la duración de una etapa y la registra en el histograma y en la petición actual."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, elapsed))
+
+
+def server_timing_header(timings: Sequence[Tuple[str, float]]) -> str:
+    """Formatea los tiempos como cabecera Server-Timing (duraciones en ms)."""
+    return ', '.join(f'{stage};dur={elapsed * 1000:.2f}' for stage, elapsed in timings)
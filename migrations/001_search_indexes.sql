@@ -0,0 +1,26 @@
+-- Migración 001: índices para la búsqueda en `informacion`.
+--
+-- * Índice sobre `caedec` para las búsquedas exactas por código.
+-- * Columnas generadas (STORED) con el texto en mayúsculas y sin acentos.
+-- * Índices FULLTEXT sobre esas columnas: uno combinado para el WHERE y uno
+--   por columna para calcular la relevancia ponderada (3/2/1) con MATCH ... AGAINST.
+--
+-- Requiere MySQL 5.7+ o MariaDB 10.2+ con InnoDB. Ejecutar una sola vez:
+--     mysql -u root -p chatai < migrations/001_search_indexes.sql
+-- Si el servidor no soporta FULLTEXT, la app sigue usando la búsqueda con LIKE.
+
+ALTER TABLE informacion
+    ADD INDEX idx_informacion_caedec (caedec);
+
+ALTER TABLE informacion
+    ADD COLUMN nombre_norm VARCHAR(100)
+        AS (REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(UPPER(nombre), 'Á', 'A'), 'É', 'E'), 'Í', 'I'), 'Ó', 'O'), 'Ú', 'U'), 'Ü', 'U'), 'Ñ', 'N')) STORED,
+    ADD COLUMN nombreLargo_norm VARCHAR(255)
+        AS (REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(UPPER(nombreLargo), 'Á', 'A'), 'É', 'E'), 'Í', 'I'), 'Ó', 'O'), 'Ú', 'U'), 'Ü', 'U'), 'Ñ', 'N')) STORED,
+    ADD COLUMN descripcion_norm TEXT
+        AS (REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(UPPER(descripcion), 'Á', 'A'), 'É', 'E'), 'Í', 'I'), 'Ó', 'O'), 'Ú', 'U'), 'Ü', 'U'), 'Ñ', 'N')) STORED;
+
+ALTER TABLE informacion ADD FULLTEXT INDEX ft_informacion_texto (nombre_norm, nombreLargo_norm, descripcion_norm);
+ALTER TABLE informacion ADD FULLTEXT INDEX ft_informacion_nombre (nombre_norm);
+ALTER TABLE informacion ADD FULLTEXT INDEX ft_informacion_nombre_largo (nombreLargo_norm);
+ALTER TABLE informacion ADD FULLTEXT INDEX ft_informacion_descripcion (descripcion_norm);
@@ -0,0 +1,110 @@
+"""
+Construcción compacta del prompt para Gemini.
+
+Las reglas fijas van como instrucción de sistema (SYSTEM_INSTRUCTION) y no se
+reenvían dentro de `contents`. Los registros se agrupan por CAEDEC para que
+cada descripción de actividad aparezca una sola vez, se omiten los campos
+vacíos o repetidos y el bloque de datos se recorta a un presupuesto de
+caracteres.
+"""
+import os
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+# Presupuesto de caracteres para el bloque de datos de la BD
+PROMPT_MAX_CHARS = int(os.getenv('PROMPT_MAX_CHARS', '4000'))
+
+SYSTEM_INSTRUCTION = """Eres un asistente conversacional que ayuda a los usuarios con información de una base de datos de empresas y actividades económicas.
+
+REGLAS IMPORTANTES:
+1. Responde de forma NATURAL y CONVERSACIONAL, como si fueras un asistente humano amigable.
+2. SOLO usa la información que se te proporciona del contexto de la base de datos.
+3. NO inventes datos ni uses información externa o conocimiento general.
+4. Si te preguntan sobre temas NO relacionados con la base de datos (clima, fecha actual, noticias, recetas, programación, matemáticas, etc.), responde amablemente: "Lo siento, solo tengo acceso a información de empresas y actividades económicas en mi base de datos. No puedo ayudarte con ese tema debido a las restricciones de la aplicación."
+5. Si NO encuentras información relevante en los datos proporcionados, di: "No encontré información sobre eso en la base de datos."
+6. Responde de forma DIRECTA y CONCISA, sin listar todos los registros a menos que te lo pidan explícitamente.
+7. Si te preguntan por un dato específico (como CAEDEC, descripción, nombre), proporciona SOLO ese dato de forma clara.
+8. Mantén un tono amable y profesional.
+
+Los datos llegan agrupados por actividad: "CAEDEC <código> - <descripción>" seguido de las empresas con esa actividad.
+Las empresas marcadas con "(coincidencia aproximada)" no contienen las palabras buscadas, solo se parecen: preséntalas como posibles coincidencias y nunca como el resultado exacto."""
+
+APPROXIMATE_MARK = ' (coincidencia aproximada)'
+
+
+def is_approximate(row: Mapping[str, Any]) -> bool:
+    """Fila que solo viene de la búsqueda aproximada (tiene `similitud` pero ninguna coincidencia exacta)."""
+    return 'similitud' in row and not row.get('relevancia')
+
+
+def _company_line(row: Mapping[str, Any]) -> str:
+    nombre = (row.get('nombre') or '').strip()
+    nombre_largo = (row.get('nombreLargo') or '').strip()
+    mark = APPROXIMATE_MARK if is_approximate(row) else ''
+    if nombre and nombre_largo and nombre_largo != nombre:
+        return f"- {nombre} ({nombre_largo}){mark}"
+    return f"- {nombre or nombre_largo or 'N/A'}{mark}"
+
+
+def build_context(db_results: Sequence[Mapping[str, Any]], max_chars: Optional[int] = None,
+                  caedec_counts: Optional[Mapping[int, int]] = None) -> str:
+    """
+    Agrupa los registros por (CAEDEC, descripción) en el orden de relevancia
+    y corta el texto al llegar a `max_chars`, indicando cuántas empresas se omitieron.
+    Con `caedec_counts` cada grupo indica cuántas empresas tiene el código en total.
+    """
+    caedec_counts = caedec_counts or {}
+    max_chars = PROMPT_MAX_CHARS if max_chars is None else max_chars
+
+    groups: Dict[tuple, List[Mapping[str, Any]]] = {}
+    for row in db_results:
+        key = (row.get('caedec') or None, (row.get('descripcion') or '').strip() or None)
+        groups.setdefault(key, []).append(row)
+
+    lines: List[str] = []
+    size = 0
+    omitted = 0
+    for (caedec, descripcion), rows in groups.items():
+        total = f" ({caedec_counts[caedec]} empresas registradas en total)" if caedec in caedec_counts else ''
+        if caedec and descripcion:
+            header = f"CAEDEC {caedec} - {descripcion}{total}:"
+        elif caedec:
+            header = f"CAEDEC {caedec}{total}:"
+        elif descripcion:
+            header = f"Actividad: {descripcion}:"
+        else:
+            header = "Sin actividad registrada:"
+
+        company_lines = [_company_line(row) for row in rows]
+        # Siempre se incluye al menos el primer grupo con su primera empresa
+        if lines and size + len(header) + len(company_lines[0]) + 2 > max_chars:
+            omitted += len(company_lines)
+            continue
+        lines.append(header)
+        size += len(header) + 1
+        for i, line in enumerate(company_lines):
+            if i and size + len(line) + 1 > max_chars:
+                omitted += len(company_lines) - i
+                break
+            lines.append(line)
+            size += len(line) + 1
+
+    if omitted:
+        lines.append(f"(y {omitted} empresas más no incluidas)")
+    return '\n'.join(lines)
+
+
+def build_contents(user_question: str, db_results: Sequence[Mapping[str, Any]], max_chars: Optional[int] = None,
+                   caedec_counts: Optional[Mapping[int, int]] = None) -> str:
+    """Texto que se envía en `contents`: solo los datos y la pregunta (las reglas van en SYSTEM_INSTRUCTION)."""
+    return (f"DATOS DISPONIBLES DE LA BASE DE DATOS:\n{build_context(db_results, max_chars, caedec_counts)}\n\n"
+            f"PREGUNTA DEL USUARIO:\n{user_question}")
+
+
+def build_question(user_question: str) -> str:
+    """Turno de seguimiento sin datos: las filas ya se enviaron en un turno anterior de la conversación."""
+    return f"PREGUNTA DEL USUARIO:\n{user_question}"
+
+
+def compact_prompt_chars(contents: str) -> int:
+    """Caracteres enviados al modelo con el formato compacto: instrucción de sistema + `contents`."""
+    return len(SYSTEM_INSTRUCTION) + len(contents)
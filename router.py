@@ -0,0 +1,168 @@
+"""
+Enrutado previo de los mensajes del chat.
+
+Antes de llamar a la IA se clasifica cada mensaje:
+
+- ``greeting``: solo saludos o cortesías ("hola", "buenas tardes", "gracias").
+- ``off_topic``: preguntas fuera del ámbito de la base de datos (clima, recetas, ...).
+- ``caedec``: consulta de uno o varios códigos CAEDEC ("caedec 74990").
+- ``name``: el mensaje coincide exactamente con el nombre de una empresa.
+- ``open``: cualquier otra pregunta; solo estas llegan al modelo.
+
+(``follow_up`` lo asigna la app a las preguntas de seguimiento de una sesión, ver sessions.py.)
+
+Las cuatro primeras se responden con plantillas a partir de las filas de la
+BD. Los saludos no consultan la base de datos. Un mensaje con términos fuera de
+tema ("clima", "hora", "programacion") solo se descarta sin buscar si no le
+queda ninguna otra palabra clave; si le quedan, se busca igual y solo es fuera
+de tema cuando la búsqueda no encuentra filas ("empresas de programacion de
+software" sí tiene respuesta).
+"""
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence
+
+from search_index import STOP_WORDS, extract_keywords, normalize_question
+
+ROUTE_GREETING = 'greeting'
+ROUTE_OFF_TOPIC = 'off_topic'
+ROUTE_CAEDEC = 'caedec'
+ROUTE_NAME = 'name'
+ROUTE_OPEN = 'open'
+ROUTE_FOLLOW_UP = 'follow_up'
+
+# Palabras que forman un saludo o cortesía cuando el mensaje solo contiene estas
+GREETING_WORDS = {
+    'HOLA', 'HOLI', 'BUENAS', 'BUENOS', 'BUEN', 'DIA', 'DIAS', 'TARDE', 'TARDES', 'NOCHE', 'NOCHES',
+    'SALUDOS', 'HEY', 'HI', 'HELLO', 'GRACIAS', 'MUCHAS', 'CHAU', 'CHAO', 'ADIOS', 'HASTA', 'LUEGO',
+    'OK', 'VALE', 'QUE', 'TAL', 'COMO', 'ESTAS', 'ESTA', 'ESTAN', 'TODO', 'BIEN',
+}
+
+# Términos ajenos a la base de datos (no aparecen como palabra en CAEDEC1.csv); solo vetan el
+# mensaje si no queda otra palabra clave o si la búsqueda no encuentra nada
+OFF_TOPIC_WORDS = {
+    'CLIMA', 'LLUVIA', 'TEMPERATURA', 'PRONOSTICO', 'RECETA', 'RECETAS', 'FECHA', 'HORA',
+    'GEMINI', 'CHISTE', 'CHISTES', 'PYTHON', 'JAVASCRIPT', 'PROGRAMACION', 'PROGRAMAR',
+    'MATEMATICAS', 'ECUACION', 'VERSION',
+}
+
+# Palabras que acompañan a un número sin cambiar el sentido de "qué es el CAEDEC N"
+CAEDEC_LOOKUP_WORDS = {
+    'CORRESPONDE', 'CORRESPONDEN', 'SIGNIFICA', 'PERTENECE', 'ACTIVIDAD', 'ACTIVIDADES',
+    'DESCRIPCION', 'BUSCAR', 'BUSCA', 'DIME', 'QUIERO', 'SABER', 'VER',
+}
+
+GREETING_REPLY = ('¡Hola! Puedo ayudarte con información de empresas y actividades económicas de la base de datos. '
+                  'Por ejemplo, pregúntame por un código CAEDEC ("caedec 74990") o por el nombre de una empresa.')
+
+OFF_TOPIC_REPLY = ('Lo siento, solo tengo acceso a información de empresas y actividades económicas en mi base de datos. '
+                   'No puedo ayudarte con ese tema debido a las restricciones de la aplicación.')
+
+# Empresas que se nombran como ejemplo en la respuesta de un CAEDEC
+CAEDEC_EXAMPLES = 3
+
+
+class RoutedMessage(NamedTuple):
+    route: str
+    db_results: List[Dict[str, Any]]
+    reply: Optional[str]
+
+
+def name_key(text: Any) -> str:
+    """Clave para comparar nombres: normalizado y sin stop words (p. ej. sin 'SRL' ni 'EMPRESA')."""
+    return ' '.join(w for w in normalize_question(text or '').split() if w.lower() not in STOP_WORDS)
+
+
+def classify_text(message: str) -> Optional[str]:
+    """Clasificación que no necesita la BD: saludo, fuera de tema o None."""
+    words = normalize_question(message).split()
+    if not words:
+        return None
+    if all(w in GREETING_WORDS for w in words):
+        return ROUTE_GREETING
+    if any(w.isdigit() for w in words):
+        return None
+    if any(w in OFF_TOPIC_WORDS for w in words) and not searchable_keywords(message):
+        return ROUTE_OFF_TOPIC
+    return None
+
+
+def has_off_topic_words(message: str) -> bool:
+    return any(w in OFF_TOPIC_WORDS for w in normalize_question(message).split())
+
+
+def searchable_keywords(message: str) -> List[str]:
+    """Palabras clave del mensaje que quedan para buscar sin los términos fuera de tema ni los de saludo."""
+    text_keywords, numbers = extract_keywords(normalize_question(message))
+    return [k for k in text_keywords if k not in OFF_TOPIC_WORDS and k not in GREETING_WORDS] + numbers
+
+
+def caedec_query(message: str) -> Optional[str]:
+    """Si el mensaje solo pide códigos CAEDEC, devuelve la consulta con esos números."""
+    text_keywords, numbers = extract_keywords(normalize_question(message))
+    if numbers and all(k in CAEDEC_LOOKUP_WORDS for k in text_keywords):
+        return ' '.join(numbers)
+    return None
+
+
+def caedec_reply(db_results: Sequence[Mapping[str, Any]], counts: Optional[Mapping[int, int]] = None) -> str:
+    """
+    Respuesta con la descripción de cada CAEDEC encontrado y algunas empresas
+    de ejemplo; con `counts` indica también cuántas empresas tiene cada código.
+    """
+    counts = counts or {}
+    groups: Dict[Any, List[Mapping[str, Any]]] = {}
+    for row in db_results:
+        groups.setdefault(row.get('caedec'), []).append(row)
+
+    parts = []
+    for caedec, rows in groups.items():
+        descripcion = next((r.get('descripcion') for r in rows if r.get('descripcion')), None) or 'Sin descripción'
+        names = ', '.join(r.get('nombre') or 'N/A' for r in rows[:CAEDEC_EXAMPLES])
+        total = f" Hay {counts[caedec]} empresas registradas con esta actividad." if caedec in counts else ''
+        parts.append(f"El CAEDEC {caedec} corresponde a: {descripcion}.{total} Algunas empresas con esta actividad: {names}.")
+    return '\n'.join(parts)
+
+
+def name_reply(rows: Sequence[Mapping[str, Any]]) -> str:
+    """Respuesta con la actividad de las empresas cuyo nombre coincide con el mensaje."""
+    parts = []
+    for row in rows:
+        nombre = row.get('nombre') or 'N/A'
+        nombre_largo = row.get('nombreLargo')
+        label = f"{nombre} ({nombre_largo})" if nombre_largo and nombre_largo != nombre else nombre
+        parts.append(f"{label} tiene el CAEDEC {row.get('caedec', 'desconocido')}: "
+                     f"{row.get('descripcion') or 'Sin descripción'}.")
+    return '\n'.join(parts)
+
+
+def route_message(message: str, search: Callable[..., List[Dict[str, Any]]], limit: int = 5,
+                  caedec_counts: Optional[Callable[[Iterable[int]], Mapping[int, int]]] = None) -> RoutedMessage:
+    """
+    Clasifica el mensaje y, salvo para saludos y preguntas fuera de tema sin
+    otras palabras clave, busca en la BD con `search(query, limit=...)`. `reply` solo viene
+    informado cuando la respuesta puede darse sin la IA. `caedec_counts(codes)`
+    (opcional) da el total de empresas por código para la respuesta de CAEDEC.
+    """
+    route = classify_text(message)
+    if route == ROUTE_GREETING:
+        return RoutedMessage(route, [], GREETING_REPLY)
+    if route == ROUTE_OFF_TOPIC:
+        return RoutedMessage(route, [], OFF_TOPIC_REPLY)
+
+    query = caedec_query(message)
+    if query is not None:
+        db_results = search(query, limit=limit)
+        if not db_results:
+            return RoutedMessage(ROUTE_CAEDEC, db_results, None)
+        counts = caedec_counts({row.get('caedec') for row in db_results}) if caedec_counts else None
+        return RoutedMessage(ROUTE_CAEDEC, db_results, caedec_reply(db_results, counts))
+
+    db_results = search(message, limit=limit)
+    if not db_results and has_off_topic_words(message):
+        return RoutedMessage(ROUTE_OFF_TOPIC, [], OFF_TOPIC_REPLY)
+    key = name_key(message)
+    if key and db_results:
+        matches = [row for row in db_results
+                   if key in (name_key(row.get('nombre')), name_key(row.get('nombreLargo')))]
+        if matches:
+            return RoutedMessage(ROUTE_NAME, db_results, name_reply(matches))
+    return RoutedMessage(ROUTE_OPEN, db_results, None)
@@ -9,7 +9,18 @@ CREATE TABLE informacion (
     nombre VARCHAR(100),               -- Longitud especificada
     nombreLargo VARCHAR(255),          -- Longitud especificada
     caedec INT,                          -- Nombre de columna corregido
-    descripcion TEXT                   -- Usar TEXT para descripciones largas es a menudo mejor
+    descripcion TEXT,                  -- Usar TEXT para descripciones largas es a menudo mejor
+    content_hash CHAR(40),             -- SHA-1 del contenido, usado por load_caedec.py en modo incremental
+    -- Texto en mayúsculas y sin acentos para la búsqueda FULLTEXT (ver migrations/001_search_indexes.sql)
+    nombre_norm VARCHAR(100) AS (REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(UPPER(nombre), 'Á', 'A'), 'É', 'E'), 'Í', 'I'), 'Ó', 'O'), 'Ú', 'U'), 'Ü', 'U'), 'Ñ', 'N')) STORED,
+    nombreLargo_norm VARCHAR(255) AS (REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(UPPER(nombreLargo), 'Á', 'A'), 'É', 'E'), 'Í', 'I'), 'Ó', 'O'), 'Ú', 'U'), 'Ü', 'U'), 'Ñ', 'N')) STORED,
+    descripcion_norm TEXT AS (REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(UPPER(descripcion), 'Á', 'A'), 'É', 'E'), 'Í', 'I'), 'Ó', 'O'), 'Ú', 'U'), 'Ü', 'U'), 'Ñ', 'N')) STORED,
+    INDEX idx_informacion_content_hash (content_hash),
+    INDEX idx_informacion_caedec (caedec),
+    FULLTEXT INDEX ft_informacion_texto (nombre_norm, nombreLargo_norm, descripcion_norm),
+    FULLTEXT INDEX ft_informacion_nombre (nombre_norm),
+    FULLTEXT INDEX ft_informacion_nombre_largo (nombreLargo_norm),
+    FULLTEXT INDEX ft_informacion_descripcion (descripcion_norm)
 );
 
 
@@ -0,0 +1,92 @@
+"""
+Formatos de /search/export: NDJSON o CSV separado por ';' (mismas columnas y
+cabecera que CAEDEC1.csv), generados por bloques de filas y opcionalmente
+comprimidos con gzip sobre la marcha.
+
+Las filas llegan como tuplas con los valores de `fields` en orden (tal cual
+las devuelve un cursor sin diccionarios), así que ningún paso necesita tener
+todo el resultado en memoria.
+"""
+import csv
+import io
+import json
+import zlib
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+
+from dataset import CSV_DELIMITER
+
+EXPORT_FIELDS = ('id', 'nombre', 'nombreLargo', 'caedec', 'descripcion')
+
+# Columnas de CAEDEC1.csv (dataset.CSV_HEADER) para cada campo
+CSV_FIELD_HEADERS = {
+    'id': 'Id',
+    'nombre': 'Nombre',
+    'nombreLargo': 'Nombre Largo',
+    'caedec': 'CAEDED',
+    'descripcion': 'Descripcion',
+}
+# Sin `fields`, el CSV tiene exactamente las columnas de CAEDEC1.csv
+CSV_DEFAULT_FIELDS = ('nombre', 'nombreLargo', 'caedec', 'descripcion')
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+
+def parse_fields(value: Optional[str], default: Sequence[str] = EXPORT_FIELDS,
+                 allowed: Sequence[str] = EXPORT_FIELDS) -> List[str]:
+    """Lista de campos pedidos (`nombre,caedec`); lanza ValueError si alguno no está en `allowed`."""
+    if not value:
+        return list(default)
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown or not fields:
+        raise ValueError(f"Campos no válidos: {', '.join(unknown) or value}. Disponibles: {', '.join(allowed)}")
+    return list(dict.fromkeys(fields))
+
+
+def ndjson_chunks(batches: Iterable[Sequence[tuple]], fields: Sequence[str]) -> Iterator[str]:
+    """Un objeto JSON por línea; un fragmento de texto por bloque de filas."""
+    for batch in batches:
+        yield ''.join(json.dumps(dict(zip(fields, values)), ensure_ascii=False) + '\n' for values in batch)
+
+
+def csv_chunks(batches: Iterable[Sequence[tuple]], fields: Sequence[str]) -> Iterator[str]:
+    """CSV con ';' y la cabecera de CAEDEC1.csv; los NULL quedan como campos vacíos."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=CSV_DELIMITER, lineterminator='\n')
+    writer.writerow([CSV_FIELD_HEADERS[f] for f in fields])
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def encode_chunks(chunks: Iterable[str], compress: bool = False) -> Iterator[bytes]:
+    """Codifica en UTF-8 y, con `compress`, comprime en formato gzip (zlib con wbits=31) sin acumular la salida."""
+    if not compress:
+        for chunk in chunks:
+            yield chunk.encode('utf-8')
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(batches: Iterable[Sequence[tuple]], fields: Sequence[str], fmt: str,
+                  compress: bool = False) -> Iterator[bytes]:
+    """Bytes de la exportación en el formato pedido ('ndjson' o 'csv')."""
+    chunks = csv_chunks(batches, fields) if fmt == 'csv' else ndjson_chunks(batches, fields)
+    return encode_chunks(chunks, compress)
+
+
+def row_values(rows: Iterable[Any], fields: Sequence[str]) -> List[tuple]:
+    """Tuplas de valores de filas tipo diccionario (índice en memoria)."""
+    return [tuple(row.get(f) for f in fields) for row in rows]
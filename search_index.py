@@ -0,0 +1,272 @@
+"""
+Índice invertido en memoria sobre la tabla `informacion`.
+
+Reproduce en Python la misma búsqueda que `search_in_database` hace en SQL
+(``UPPER(col) LIKE '%KW%'`` con pesos 3/2/1 y 10 para CAEDEC), pero sin
+recorrer la tabla completa en cada petición: los campos se tokenizan una sola
+vez al arrancar y cada palabra clave se resuelve contra el vocabulario.
+"""
+import heapq
+import random
+import re
+import threading
+import unicodedata
+from typing import List, Dict, Any, Iterable, Mapping, Optional, Sequence, Tuple
+
+STOP_WORDS = {
+    'el', 'la', 'de', 'del', 'los', 'las', 'un', 'una', 'unos', 'unas',
+    'es', 'son', 'esta', 'este', 'esa', 'ese', 'cual', 'que', 'quien',
+    'como', 'donde', 'cuando', 'por', 'para', 'con', 'sin', 'sobre',
+    'en', 'al', 'a', 'y', 'o', 'pero', 'si', 'no', 'me', 'te', 'se',
+    'cual', 'cuales', 'cuanto', 'cuantos', 'tiene', 'tienen', 'hay',
+    'eres', 'soy', 'somos', 'tengo', 'tienes', 'ser', 'estar',
+    'empresa', 'empresas', 'empresarial', 'empresariales',
+    'compania', 'compañia', 'companias', 'compañias',
+    'sociedad', 'sociedades', 'sa', 'srl', 'ltda',
+    'informacion', 'información', 'datos', 'dato',
+    'caedec', 'caeded', 'codigo', 'código', 'numero', 'número',
+    'nombre', 'llamada', 'llama', 'llamado', 'llamados'
+}
+
+# Campos de texto indexados y su peso en la relevancia (igual que en el SQL)
+TEXT_FIELDS = (('nombre', 3), ('nombreLargo', 2), ('descripcion', 1))
+CAEDEC_WEIGHT = 10
+
+# Número máximo de palabras clave cuya resolución se guarda en memoria
+KEYWORD_CACHE_SIZE = 4096
+
+# Longitudes de las subcadenas de cada token que se indexan para resolver palabras clave
+GRAM_SIZES = (2, 3)
+
+
+def normalize_text(text: Any) -> str:
+    """Pasa el texto a mayúsculas y quita los acentos (como la collation *_ci de MySQL)."""
+    if text is None:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', str(text).upper())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize_question(question: str) -> str:
+    """Normaliza una pregunta para usarla como clave: sin acentos, mayúsculas, sin signos y espacios simples."""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', normalize_text(question)).split())
+
+
+def extract_keywords(query: str) -> Tuple[List[str], List[str]]:
+    """
+    Extrae las palabras clave de una consulta.
+
+    Devuelve ``(text_keywords, numbers)``: las palabras de texto en mayúsculas
+    (longitud >= 2, sin números ni stop words) y los números (posibles CAEDEC).
+    """
+    keywords = query.upper().split()
+    numbers = [k for k in keywords if k.isdigit()]
+    text_keywords = [k for k in keywords if len(k) >= 2 and not k.isdigit() and k.lower() not in STOP_WORDS]
+    return text_keywords, numbers
+
+
+def parse_caedec_numbers(numbers: Iterable[str]) -> List[int]:
+    """Convierte los números de la consulta a enteros, ignorando los que no son válidos."""
+    values = []
+    for num in numbers:
+        try:
+            values.append(int(num))
+        except ValueError:
+            pass
+    return values
+
+
+def build_postings(rows: Iterable[Mapping[str, Any]]):
+    """
+    Recorre las filas y devuelve ``(terms, postings, caedec)``: el vocabulario
+    ordenado, por campo la lista de posiciones de cada token (por id de token)
+    y las posiciones de cada CAEDEC.
+    """
+    by_token: Dict[str, Dict[str, List[int]]] = {}
+    caedec: Dict[int, List[int]] = {}
+    for pos, row in enumerate(rows):
+        for field, _weight in TEXT_FIELDS:
+            for token in set(normalize_text(row.get(field)).split()):
+                by_token.setdefault(token, {}).setdefault(field, []).append(pos)
+        code = row.get('caedec')
+        if code is not None:
+            caedec.setdefault(int(code), []).append(pos)
+
+    terms = sorted(by_token)
+    postings = {field: [by_token[term].get(field, ()) for term in terms] for field, _ in TEXT_FIELDS}
+    return terms, postings, caedec
+
+
+def column_values(rows: Sequence[Mapping[str, Any]], name: str) -> Sequence[Any]:
+    """
+    Valores de una columna de todas las filas. El snapshot los lee de su
+    columna sin crear un objeto por fila; una lista de diccionarios los copia.
+    """
+    column = getattr(rows, 'column', None)
+    if column is not None:
+        return column(name)
+    return [row.get(name) for row in rows]
+
+
+def build_gram_index(terms: Sequence[str]) -> Dict[str, List[int]]:
+    """Subcadena de 2 o 3 caracteres -> ids (posición en `terms`) de los tokens que la contienen, en orden."""
+    grams: Dict[str, List[int]] = {}
+    for term_id, term in enumerate(terms):
+        seen = set()
+        for n in GRAM_SIZES:
+            for i in range(len(term) - n + 1):
+                gram = term[i:i + n]
+                if gram not in seen:
+                    seen.add(gram)
+                    grams.setdefault(gram, []).append(term_id)
+    return grams
+
+
+class SearchIndex:
+    """
+    Índice invertido de tokens normalizados de nombre, nombreLargo y descripcion,
+    más un mapa hash de CAEDEC a filas.
+
+    Los tokens se separan solo por espacios, así que una palabra clave (que
+    tampoco tiene espacios) aparece como subcadena de un campo si y solo si
+    aparece dentro de alguno de sus tokens: el resultado coincide con el LIKE
+    (con ``%`` y ``_`` escapados, ver `like_pattern`). Para no recorrer todo el
+    vocabulario en cada palabra clave, cada token se indexa también por sus
+    subcadenas de 2 y 3 caracteres (`GRAM_SIZES`): una palabra clave se
+    resuelve intersecando las listas de sus trigramas y comprobando solo esos
+    tokens candidatos.
+    """
+
+    def __init__(self, rows: Sequence[Mapping[str, Any]], terms: Optional[Sequence[str]] = None,
+                 postings: Optional[Mapping[str, Sequence[Sequence[int]]]] = None,
+                 grams: Optional[Mapping[str, Sequence[int]]] = None,
+                 caedec: Optional[Mapping[int, Sequence[int]]] = None):
+        """
+        Sin `terms`/`postings`/`grams`/`caedec` las estructuras se construyen
+        recorriendo las filas; el snapshot (snapshot.py) las trae ya calculadas.
+        """
+        self.rows = rows
+        # ids por posición, para ordenar resultados sin materializar las filas
+        self.ids: Sequence[int] = column_values(rows, 'id')
+        self._keyword_cache: Dict[str, Dict[str, frozenset]] = {}
+        self._lock = threading.Lock()
+
+        if terms is None:
+            terms, postings, caedec = build_postings(rows)
+            grams = build_gram_index(terms)
+        # Vocabulario ordenado; las listas de posiciones se guardan por campo e id de token
+        self._terms: Sequence[str] = terms
+        self._postings: Mapping[str, Sequence[Sequence[int]]] = postings
+        self._grams: Mapping[str, Sequence[int]] = grams
+        self._caedec: Mapping[int, Sequence[int]] = caedec
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping[str, Any]]) -> 'SearchIndex':
+        return cls(list(rows))
+
+    @classmethod
+    def from_csv(cls, path: str, encoding: Optional[str] = None) -> 'SearchIndex':
+        """Construye el índice desde CAEDEC1.csv (los ids se asignan en orden de archivo, como AUTO_INCREMENT)."""
+        from dataset import iter_caedec_csv, CSV_ENCODING
+
+        rows = []
+        for i, row in enumerate(iter_caedec_csv(path, encoding or CSV_ENCODING), 1):
+            row = {'id': i, **row}
+            rows.append(row)
+        return cls(rows)
+
+    @classmethod
+    def from_snapshot(cls, path: str) -> 'SearchIndex':
+        """
+        Abre el índice guardado en el snapshot (snapshot.py): filas, vocabulario
+        y listas de posiciones se leen del archivo mapeado sin recorrer las filas.
+        """
+        from snapshot import Snapshot
+
+        snapshot = Snapshot(path)
+        return cls(snapshot, **snapshot.index_parts())
+
+    @classmethod
+    def from_connection(cls, connection) -> 'SearchIndex':
+        """Construye el índice leyendo la tabla `informacion` completa."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT id, nombre, nombreLargo, caedec, descripcion FROM informacion ORDER BY id")
+            return cls(list(cursor.fetchall()))
+
+    def _matching_terms(self, keyword: str) -> Iterable[int]:
+        """Ids de los tokens que contienen la palabra clave."""
+        if len(keyword) < min(GRAM_SIZES):
+            return [i for i, term in enumerate(self._terms) if keyword in term]
+        if len(keyword) <= max(GRAM_SIZES):
+            # La palabra clave es ella misma una subcadena indexada: no hay que comprobar nada
+            return self._grams.get(keyword, ())
+
+        n = max(GRAM_SIZES)
+        lists = sorted((self._grams.get(keyword[i:i + n], ()) for i in range(len(keyword) - n + 1)), key=len)
+        if not lists[0]:
+            return ()
+        candidates = set(lists[0])
+        for term_ids in lists[1:]:
+            candidates.intersection_update(term_ids)
+            if not candidates:
+                return ()
+        return [i for i in candidates if keyword in self._terms[i]]
+
+    def _lookup(self, keyword: str) -> Dict[str, frozenset]:
+        """Devuelve, por campo, las posiciones de las filas que contienen la palabra clave."""
+        cached = self._keyword_cache.get(keyword)
+        if cached is not None:
+            return cached
+
+        matches: Dict[str, set] = {field: set() for field, _ in TEXT_FIELDS}
+        for term_id in self._matching_terms(keyword):
+            for field, _ in TEXT_FIELDS:
+                matches[field].update(self._postings[field][term_id])
+        result = {field: frozenset(positions) for field, positions in matches.items()}
+
+        with self._lock:
+            if len(self._keyword_cache) >= KEYWORD_CACHE_SIZE:
+                self._keyword_cache.clear()
+            self._keyword_cache[keyword] = result
+        return result
+
+    def _row_dict(self, pos: int, relevancia: Optional[int] = None) -> Dict[str, Any]:
+        row = dict(self.rows[pos])
+        if relevancia is not None:
+            row['relevancia'] = relevancia
+        return row
+
+    def score(self, text_keywords: Sequence[str], caedec_values: Sequence[int]) -> Dict[int, int]:
+        """Calcula la relevancia (posición -> puntuación) de todas las filas que coinciden."""
+        scores: Dict[int, int] = {}
+        for keyword in text_keywords:
+            matches = self._lookup(normalize_text(keyword))
+            for field, weight in TEXT_FIELDS:
+                for pos in matches[field]:
+                    scores[pos] = scores.get(pos, 0) + weight
+        for value in caedec_values:
+            for pos in self._caedec.get(value, ()):
+                scores[pos] = scores.get(pos, 0) + CAEDEC_WEIGHT
+        return scores
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Misma semántica que `search_in_database`, resuelta en memoria."""
+        text_keywords, numbers = extract_keywords(query)
+        caedec_values = parse_caedec_numbers(numbers)
+
+        # Solo números: búsqueda exacta por CAEDEC en orden de tabla
+        if numbers and not text_keywords and caedec_values:
+            positions = sorted({pos for value in caedec_values for pos in self._caedec.get(value, ())})
+            return [self._row_dict(pos) for pos in positions[:limit]]
+
+        if not text_keywords and not caedec_values:
+            # Sin palabras clave válidas: registros aleatorios
+            sample = random.sample(range(len(self.rows)), min(limit, len(self.rows)))
+            return [self._row_dict(pos) for pos in sample]
+
+        scores = self.score(text_keywords, caedec_values)
+        top = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self._row_dict(pos, relevancia) for pos, relevancia in top]
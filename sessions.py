@@ -0,0 +1,179 @@
+"""
+Sesiones de conversación del chat.
+
+Cada sesión guarda un historial acotado de turnos (lo que se envió al modelo
+y su respuesta) y las últimas filas recuperadas de la BD. Las preguntas de
+seguimiento ("¿y cuál es su descripción?") se responden con esas filas sin
+volver a buscar, y el modelo recibe el historial como conversación de varios
+turnos en lugar de un prompt nuevo en cada mensaje.
+
+`SessionStore` expulsa las sesiones por LRU, por inactividad (TTL) y cuando
+el tamaño aproximado de todas ellas supera `max_bytes`.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Sequence
+
+from search_index import extract_keywords, normalize_question
+
+# Ids de sesión aceptados desde el cliente
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+# Palabras que, sin ninguna otra palabra clave, indican una pregunta sobre los resultados anteriores
+FOLLOW_UP_WORDS = {
+    'SU', 'SUS', 'ESO', 'ESA', 'ESAS', 'ESOS', 'ELLA', 'ELLAS', 'ELLOS', 'DICHA', 'DICHO', 'MISMA', 'MISMO',
+    'DESCRIPCION', 'ACTIVIDAD', 'ACTIVIDADES', 'COMPLETO', 'LARGO', 'RUBRO', 'DEDICA', 'HACE',
+    'PRIMERA', 'PRIMERO', 'SEGUNDA', 'SEGUNDO', 'TERCERA', 'TERCERO', 'ULTIMA', 'ULTIMO', 'OTRA', 'OTRO', 'OTRAS',
+    'MAS', 'TAMBIEN', 'ENTONCES', 'CORRESPONDE', 'SIGNIFICA',
+}
+
+
+def is_follow_up(message: str) -> bool:
+    """
+    Indica si el mensaje solo pregunta por los resultados anteriores: no tiene
+    números ni palabras clave propias, salvo pronombres y campos (FOLLOW_UP_WORDS).
+    Un mensaje sin ninguna palabra clave ("que", "cuales son las empresas")
+    solo cuenta si nombra explícitamente los resultados ("¿y esa?").
+    """
+    normalized = normalize_question(message)
+    text_keywords, numbers = extract_keywords(normalized)
+    if numbers:
+        return False
+    if not text_keywords:
+        return any(word in FOLLOW_UP_WORDS for word in normalized.split())
+    return all(k in FOLLOW_UP_WORDS for k in text_keywords)
+
+
+def _rows_size(rows: Sequence[Mapping[str, Any]]) -> int:
+    return sum(len(str(v)) for row in rows for v in row.values() if v is not None)
+
+
+class Session:
+    """Historial de una conversación y las últimas filas recuperadas."""
+
+    def __init__(self, session_id: str, max_turns: int):
+        self.id = session_id
+        # Cada turno: (texto enviado como usuario, respuesta, ids de las filas cuyos datos incluye el texto)
+        self.turns: deque = deque(maxlen=max(1, max_turns))
+        self.last_rows: List[Dict[str, Any]] = []
+        self.last_seen = time.monotonic()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def _recompute_size(self):
+        self.size = sum(len(user) + len(model) for user, model, _ in self.turns) + _rows_size(self.last_rows)
+
+    def row_ids(self, rows: Sequence[Mapping[str, Any]]) -> tuple:
+        return tuple(row.get('id') for row in rows)
+
+    def history(self) -> List[tuple]:
+        """Copia de los turnos tomada con el lock (otra petición de la misma sesión puede estar añadiendo uno)."""
+        with self.lock:
+            return list(self.turns)
+
+    def has_context_for(self, rows: Sequence[Mapping[str, Any]]) -> bool:
+        """Indica si algún turno del historial ya envió al modelo los datos de estas filas."""
+        ids = self.row_ids(rows)
+        return bool(ids) and any(data_ids == ids for _, _, data_ids in self.history())
+
+    def context_key(self) -> Hashable:
+        """Clave del historial actual (para separar respuestas en caché con contextos distintos)."""
+        return hash(tuple((user, model) for user, model, _ in self.history()))
+
+    def contents(self, user_text: str) -> List[Dict[str, Any]]:
+        """Historial en formato de `contents` de Gemini, seguido del turno actual."""
+        contents = []
+        for user, model, _ in self.history():
+            contents.append({'role': 'user', 'parts': [{'text': user}]})
+            contents.append({'role': 'model', 'parts': [{'text': model}]})
+        contents.append({'role': 'user', 'parts': [{'text': user_text}]})
+        return contents
+
+    def record(self, user_text: str, answer: str, rows: Sequence[Mapping[str, Any]], includes_data: bool = False):
+        """Añade un turno y guarda las filas como resultado vigente de la sesión."""
+        with self.lock:
+            self.turns.append((user_text, answer or '', self.row_ids(rows) if includes_data else ()))
+            if rows:
+                self.last_rows = [dict(row) for row in rows]
+            self._recompute_size()
+
+
+class SessionStore:
+    """Sesiones por id con expulsión LRU, TTL de inactividad y límite de memoria aproximado."""
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl: float = 1800.0, max_bytes: int = 32 * 1024 * 1024,
+                 max_turns: int = 6):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self._sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expire(self, now: float):
+        # Las menos usadas están al principio: se recorre hasta la primera vigente
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_seen < self.idle_ttl:
+                break
+            del self._sessions[session_id]
+            self.expirations += 1
+
+    def get(self, session_id: Optional[str]) -> Optional[Session]:
+        """
+        Devuelve la sesión con ese id, creándola si no existe. Sin id (o con
+        un id no válido) devuelve None y el mensaje se trata sin sesión.
+        """
+        if self.max_sessions <= 0 or not session_id or not SESSION_ID_PATTERN.match(session_id):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = Session(session_id, self.max_turns)
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evictions += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_seen = now
+            return session
+
+    def record(self, session: Session, user_text: str, answer: str, rows: Sequence[Mapping[str, Any]],
+               includes_data: bool = False):
+        """Añade el turno a la sesión y aplica el límite de memoria."""
+        session.record(user_text, answer, rows, includes_data)
+        self.enforce_memory()
+
+    def enforce_memory(self):
+        """Expulsa las sesiones menos usadas mientras el tamaño total supere `max_bytes`."""
+        with self._lock:
+            total = sum(s.size for s in self._sessions.values())
+            while total > self.max_bytes and len(self._sessions) > 1:
+                _, session = self._sessions.popitem(last=False)
+                total -= session.size
+                self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'idle_ttl': self.idle_ttl,
+                'bytes': sum(s.size for s in self._sessions.values()),
+                'max_bytes': self.max_bytes,
+                'max_turns': self.max_turns,
+                'created': self.created,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,121 @@
+"""
+Agrupación de peticiones idénticas en curso ("single flight").
+
+Cuando varias peticiones piden lo mismo a la vez (la misma búsqueda o la
+misma pregunta con las mismas filas), solo la primera ejecuta el trabajo; las
+demás esperan su resultado y lo comparten. Si la primera falla, todas reciben
+la misma excepción. Las claves se olvidan en cuanto termina la llamada: no es
+una caché, solo evita repetir trabajo que ya está en marcha.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Iterator, Optional, Tuple
+
+
+class FlightAborted(Exception):
+    """La llamada compartida se interrumpió antes de terminar."""
+
+
+class _Call:
+    __slots__ = ('event', 'value', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Llamadas en curso por clave; `do` ejecuta la función una sola vez por clave a la vez."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def begin(self, key: Hashable) -> Tuple[_Call, bool]:
+        """Devuelve la llamada en curso para `key` (creándola) y si quien llama debe ejecutarla."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self.leaders += 1
+            return call, True
+
+    def finish(self, key: Hashable, call: _Call, value: Any = None, error: Optional[BaseException] = None):
+        """Publica el resultado (o el error) de la llamada y libera la clave."""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.value = value
+        call.error = error
+        call.event.set()
+
+    @staticmethod
+    def wait(call: _Call, timeout: Optional[float] = None) -> Any:
+        """Espera el resultado de otra petición; lanza TimeoutError si no llega a tiempo."""
+        if not call.event.wait(timeout):
+            raise TimeoutError('La llamada compartida no terminó a tiempo')
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Ejecuta `fn()` o espera a la llamada en curso con la misma clave.
+        Devuelve ``(resultado, compartido)``; `timeout` solo limita la espera.
+        """
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call, timeout), True
+        try:
+            value = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, value)
+        return value, False
+
+    def stream(self, key: Hashable, call: _Call, items: Iterator) -> Iterator:
+        """
+        Reenvía los elementos de `items` a quien ejecuta la llamada y, al
+        terminar, publica la lista completa para las peticiones en espera. Si
+        el cliente se desconecta y hay peticiones esperando, se consume el resto
+        para que reciban la respuesta completa.
+        """
+        parts = []
+        try:
+            for item in items:
+                parts.append(item)
+                yield item
+        except GeneratorExit:
+            error = None
+            if call.waiters:
+                try:
+                    parts.extend(items)
+                except Exception as e:
+                    error = e
+            else:
+                error = FlightAborted('El cliente se desconectó')
+            self.finish(key, call, None if error else parts, error)
+            raise
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, parts)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+            }
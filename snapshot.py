@@ -0,0 +1,395 @@
+"""
+Snapshot columnar de la tabla `informacion` y de su índice de búsqueda en un
+archivo mapeado en memoria.
+
+En lugar de cargar la tabla como una lista de diccionarios (como los que
+devuelve el DictCursor de pymysql) y construir el índice invertido en cada
+proceso, se genera una vez un archivo con:
+
+- ``id`` y ``caedec`` como arrays de enteros de 64 y 32 bits,
+- ``nombre``, ``nombreLargo`` y ``descripcion`` como un array de offsets
+  más un bloque de bytes UTF-8 por columna,
+- el vocabulario ordenado de `SearchIndex` y, por campo, las posiciones de
+  las filas de cada token (offsets + array de enteros de 32 bits),
+- las subcadenas de 2 y 3 caracteres de los tokens con sus ids, y los
+  códigos CAEDEC ordenados con las posiciones de sus filas.
+
+`SearchIndex.from_snapshot` usa estas secciones tal cual: abrir el índice no
+recorre las filas ni crea objetos por fila o por token, y cada lista de
+posiciones se lee del archivo al resolver una palabra clave. Una fila se
+materializa solo cuando pasa a ser un resultado, como un `Row` (con
+``__slots__``) que se comporta como un diccionario de solo lectura. El
+catálogo CAEDEC y /suggest leen las columnas con `Snapshot.column`, sin
+crear filas. `benchmark_snapshot.py` compara el arranque con el del CSV.
+
+Generar el snapshot (hay que regenerarlo si cambia `SNAPSHOT_VERSION`):
+
+    python snapshot.py --source csv [--csv CAEDEC1.csv] [--output informacion.snap]
+    python snapshot.py --source db  [--output informacion.snap]
+"""
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence as SequenceABC
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from search_index import TEXT_FIELDS, build_gram_index, build_postings
+
+SNAPSHOT_MAGIC = b'CHATSNAP'
+SNAPSHOT_VERSION = 2
+
+# Columnas de cada fila, en el mismo orden que SEARCH_COLUMNS en app.py
+COLUMNS = ('id', 'nombre', 'nombreLargo', 'caedec', 'descripcion')
+TEXT_COLUMNS = ('nombre', 'nombreLargo', 'descripcion')
+
+# Valor guardado en la columna caedec para NULL
+NULL_CAEDEC = -1
+
+# Secciones del archivo, en orden: columnas de la tabla y estructuras del índice
+_SECTIONS = (
+    ['ids', 'caedecs']
+    + [f"{column}.{part}" for column in TEXT_COLUMNS for part in ('offsets', 'data')]
+    + ['terms.offsets', 'terms.data']
+    + [f"postings.{field}.{part}" for field, _ in TEXT_FIELDS for part in ('offsets', 'values')]
+    + ['grams.offsets', 'grams.data', 'grams.postings.offsets', 'grams.postings.values']
+    + ['caedec.codes', 'caedec.postings.offsets', 'caedec.postings.values']
+)
+# magic, versión, número de filas y (offset, longitud) de cada sección
+_HEADER = struct.Struct('<8sII' + 'QQ' * len(_SECTIONS))
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class StringTable(SequenceABC):
+    """Textos guardados como offsets + bytes UTF-8; se decodifican al acceder a cada uno."""
+
+    def __init__(self, offsets: Sequence[int], data: memoryview, empty: Optional[str] = ''):
+        self._offsets = offsets
+        self._data = data
+        # Valor de los textos vacíos (None en las columnas de la tabla, como NULL)
+        self._empty = empty
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> Optional[str]:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('posición fuera de la tabla')
+        start, end = self._offsets[i], self._offsets[i + 1]
+        return str(self._data[start:end], 'utf-8') if end > start else self._empty
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        offsets, data, empty = self._offsets, self._data, self._empty
+        for i in range(len(offsets) - 1):
+            start, end = offsets[i], offsets[i + 1]
+            yield str(data[start:end], 'utf-8') if end > start else empty
+
+
+class NullableInts(SequenceABC):
+    """Columna de enteros en la que `null` representa NULL (se lee como None)."""
+
+    def __init__(self, values: Sequence[int], null: int):
+        self._values = values
+        self._null = null
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getitem__(self, i: int) -> Optional[int]:
+        value = self._values[i]
+        return None if value == self._null else value
+
+    def __iter__(self) -> Iterator[Optional[int]]:
+        null = self._null
+        return (None if value == null else value for value in self._values)
+
+
+class PostingsTable(SequenceABC):
+    """Listas de posiciones guardadas seguidas; cada una es una vista sin copia del archivo."""
+
+    def __init__(self, offsets: Sequence[int], values: memoryview):
+        self._offsets = offsets
+        self._values = values
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> memoryview:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('posición fuera de la tabla')
+        return self._values[self._offsets[i]:self._offsets[i + 1]]
+
+
+class PostingsMap:
+    """Claves ordenadas -> listas de posiciones; `get` busca la clave con bisect, como un dict de solo lectura."""
+
+    def __init__(self, keys: Sequence[Any], postings: PostingsTable):
+        self._keys = keys
+        self._postings = postings
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return self._postings[i]
+        return default
+
+
+class Row(Mapping):
+    """Fila del snapshot; los valores se leen del archivo al acceder a cada columna."""
+
+    __slots__ = ('_snapshot', '_pos')
+
+    def __init__(self, snapshot: 'Snapshot', pos: int):
+        self._snapshot = snapshot
+        self._pos = pos
+
+    def __getitem__(self, key: str) -> Any:
+        return self._snapshot.value(self._pos, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(COLUMNS)
+
+    def __len__(self) -> int:
+        return len(COLUMNS)
+
+    def __contains__(self, key: object) -> bool:
+        return key in COLUMNS
+
+    def __repr__(self) -> str:
+        return f"Row({dict(self)!r})"
+
+
+class Snapshot(SequenceABC):
+    """
+    Snapshot abierto con ``mmap``. Se usa como secuencia de filas
+    (``len``, índice por posición e iteración) en lugar de la lista de
+    diccionarios que carga `SearchIndex`; `column` e `index_parts` dan acceso
+    a las columnas y al índice sin crear filas.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._open()
+        except Exception:
+            self._mmap.close()
+            raise
+
+    def _open(self):
+        if len(self._mmap) < _HEADER.size:
+            raise ValueError(f"{self.path}: archivo demasiado corto para ser un snapshot")
+        header = _HEADER.unpack_from(self._mmap, 0)
+        magic, version, n_rows = header[:3]
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"{self.path}: no es un snapshot de la versión {SNAPSHOT_VERSION} "
+                             f"(regenerarlo con `python snapshot.py`)")
+
+        view = memoryview(self._mmap)
+        sections: Dict[str, memoryview] = {}
+        for i, name in enumerate(_SECTIONS):
+            offset, length = header[3 + 2 * i], header[4 + 2 * i]
+            if offset + length > len(self._mmap):
+                raise ValueError(f"{self.path}: snapshot truncado")
+            sections[name] = view[offset:offset + length]
+        # Vistas sin copia sobre el archivo mapeado; se liberan en close()
+        self._views = [view] + list(sections.values())
+
+        def cast(name: str, fmt: str) -> memoryview:
+            cast_view = sections[name].cast(fmt)
+            self._views.append(cast_view)
+            return cast_view
+
+        def postings(prefix: str) -> PostingsTable:
+            return PostingsTable(cast(f"{prefix}.offsets", 'Q'), cast(f"{prefix}.values", 'I'))
+
+        self._rows = n_rows
+        self.ids = cast('ids', 'q')
+        self.caedecs = cast('caedecs', 'i')
+        self._columns: Dict[str, Sequence[Any]] = {'id': self.ids, 'caedec': NullableInts(self.caedecs, NULL_CAEDEC)}
+        for column in TEXT_COLUMNS:
+            self._columns[column] = StringTable(cast(f"{column}.offsets", 'Q'), sections[f"{column}.data"], empty=None)
+        if len(self.ids) != n_rows or len(self.caedecs) != n_rows:
+            raise ValueError(f"{self.path}: número de filas inconsistente")
+
+        self._terms = StringTable(cast('terms.offsets', 'Q'), sections['terms.data'])
+        self._postings = {field: postings(f"postings.{field}") for field, _ in TEXT_FIELDS}
+        grams = StringTable(cast('grams.offsets', 'Q'), sections['grams.data'])
+        self._grams = PostingsMap(grams, postings('grams.postings'))
+        self._caedec = PostingsMap(cast('caedec.codes', 'i'), postings('caedec.postings'))
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [Row(self, i) for i in range(*pos.indices(self._rows))]
+        if pos < 0:
+            pos += self._rows
+        if not 0 <= pos < self._rows:
+            raise IndexError('posición fuera del snapshot')
+        return Row(self, pos)
+
+    def __iter__(self) -> Iterator[Row]:
+        for pos in range(self._rows):
+            yield Row(self, pos)
+
+    def value(self, pos: int, column: str) -> Any:
+        """Valor de una columna de la fila en `pos` (los textos vacíos se leen como None)."""
+        values = self._columns.get(column)
+        if values is None:
+            raise KeyError(column)
+        return values[pos]
+
+    def column(self, name: str) -> Sequence[Any]:
+        """Todos los valores de una columna, leídos del archivo sin crear filas."""
+        return self._columns[name]
+
+    def index_parts(self) -> Dict[str, Any]:
+        """Argumentos de `SearchIndex` con el vocabulario y las posiciones guardadas."""
+        return {'terms': self._terms, 'postings': self._postings, 'grams': self._grams, 'caedec': self._caedec}
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mmap)
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+
+def _string_sections(values: Iterable[str]) -> List[bytes]:
+    offsets = array('Q', [0])
+    data = bytearray()
+    for value in values:
+        data += value.encode('utf-8')
+        offsets.append(len(data))
+    return [offsets.tobytes(), bytes(data)]
+
+
+def _postings_sections(lists: Iterable[Iterable[int]]) -> List[bytes]:
+    offsets = array('Q', [0])
+    values = array('I')
+    for positions in lists:
+        values.extend(positions)
+        offsets.append(len(values))
+    return [offsets.tobytes(), values.tobytes()]
+
+
+def write_snapshot(rows: Iterable[Mapping[str, Any]], path: str) -> int:
+    """
+    Escribe las filas y su índice en `path` y devuelve cuántas filas se
+    guardaron. Se escribe en un archivo temporal que luego reemplaza al
+    anterior, así los procesos que ya tienen abierto el snapshot siguen
+    leyendo la versión antigua.
+    """
+    ids = array('q')
+    caedecs = array('i')
+    texts = {column: [] for column in TEXT_COLUMNS}
+
+    def collect() -> Iterator[Mapping[str, Any]]:
+        # Las columnas se guardan mientras `build_postings` recorre las filas, en una sola pasada
+        for row in rows:
+            ids.append(int(row['id']))
+            caedec = row.get('caedec')
+            caedecs.append(NULL_CAEDEC if caedec is None else int(caedec))
+            for column in TEXT_COLUMNS:
+                value = row.get(column)
+                texts[column].append(str(value) if value else '')
+            yield row
+
+    terms, postings, caedec = build_postings(collect())
+    grams = build_gram_index(terms)
+    gram_keys = sorted(grams)
+    caedec_codes = sorted(caedec)
+
+    sections = [ids.tobytes(), caedecs.tobytes()]
+    for column in TEXT_COLUMNS:
+        sections.extend(_string_sections(texts[column]))
+    sections.extend(_string_sections(terms))
+    for field, _ in TEXT_FIELDS:
+        sections.extend(_postings_sections(postings[field]))
+    sections.extend(_string_sections(gram_keys))
+    sections.extend(_postings_sections(grams[gram] for gram in gram_keys))
+    sections.append(array('i', caedec_codes).tobytes())
+    sections.extend(_postings_sections(caedec[code] for code in caedec_codes))
+
+    header_fields = []
+    position = _align(_HEADER.size)
+    for section in sections:
+        header_fields.extend((position, len(section)))
+        position = _align(position + len(section))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(ids), *header_fields))
+        for offset, section in zip(header_fields[::2], sections):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(section)
+    os.replace(tmp_path, path)
+    return len(ids)
+
+
+def _csv_rows(path: str, encoding: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Filas del CSV con ids en orden de archivo (como AUTO_INCREMENT)."""
+    from dataset import CSV_ENCODING, iter_caedec_csv
+
+    for i, row in enumerate(iter_caedec_csv(path, encoding or CSV_ENCODING), 1):
+        yield {'id': i, **row}
+
+
+def _db_rows() -> Iterator[Dict[str, Any]]:
+    """Filas de la tabla `informacion` leídas sin cargar todo el resultado en memoria."""
+    import pymysql
+    from load_caedec import DB_CONFIG
+
+    connection = pymysql.connect(**{**DB_CONFIG, 'cursorclass': pymysql.cursors.SSDictCursor})
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(COLUMNS)} FROM informacion ORDER BY id")
+            yield from cursor
+    finally:
+        connection.close()
+
+
+def main(argv=None) -> int:
+    from dataset import DEFAULT_CSV_PATH
+
+    parser = argparse.ArgumentParser(description='Genera el snapshot columnar de la tabla informacion.')
+    parser.add_argument('--source', choices=('csv', 'db'), default='csv')
+    parser.add_argument('--csv', default=os.getenv('CAEDEC_CSV_PATH', DEFAULT_CSV_PATH), help='Ruta del CSV (separado por ;)')
+    parser.add_argument('--encoding', default=None)
+    parser.add_argument('--output', default=os.getenv('SNAPSHOT_PATH', 'informacion.snap'))
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        rows = _csv_rows(args.csv, args.encoding) if args.source == 'csv' else _db_rows()
+        count = write_snapshot(rows, args.output)
+    except Exception as e:
+        print(f"Error generando el snapshot: {e}")
+        return 1
+    print(f"Snapshot guardado en {args.output}: {count} filas, {os.path.getsize(args.output) / 1e6:.1f} MB "
+          f"en {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
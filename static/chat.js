@@ -3,9 +3,23 @@ document.addEventListener('DOMContentLoaded', () => {
   const msgInput = document.getElementById('message')
   const sendBtn = document.getElementById('send')
   const statusDiv = document.getElementById('status')
+  const suggestList = document.getElementById('suggestions')
 
   let hasMessages = false
 
+  // Conversation id kept for the tab so follow-up questions reuse the previous results
+  function getSessionId() {
+    let id = sessionStorage.getItem('chatai_session_id')
+    if (!id) {
+      id = window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : Date.now().toString(36) + Math.random().toString(36).slice(2, 12)
+      sessionStorage.setItem('chatai_session_id', id)
+    }
+    return id
+  }
+  const sessionId = getSessionId()
+
   function clearEmptyState() {
     if (!hasMessages) {
       chat.innerHTML = ''
@@ -31,6 +45,7 @@ document.addEventListener('DOMContentLoaded', () => {
     msgDiv.appendChild(content)
     chat.appendChild(msgDiv)
     chat.scrollTop = chat.scrollHeight
+    return content
   }
 
   async function loadStatus() {
@@ -47,14 +62,108 @@ document.addEventListener('DOMContentLoaded', () => {
 
   loadStatus()
 
+  // Type-ahead: company names and CAEDEC codes from /suggest
+  const SUGGEST_DELAY_MS = 150
+  let suggestTimer = null
+  let suggestController = null
+  let suggestions = []
+  let activeSuggestion = -1
+
+  function hideSuggestions() {
+    clearTimeout(suggestTimer)
+    if (suggestController) suggestController.abort()
+    suggestions = []
+    activeSuggestion = -1
+    suggestList.hidden = true
+    suggestList.innerHTML = ''
+  }
+
+  function renderSuggestions() {
+    suggestList.innerHTML = ''
+    suggestions.forEach((s, i) => {
+      const li = document.createElement('li')
+      li.setAttribute('role', 'option')
+      if (i === activeSuggestion) li.className = 'active'
+
+      const label = document.createElement('span')
+      label.textContent = s.label
+      const type = document.createElement('span')
+      type.className = 'suggestion-type'
+      type.textContent = s.type === 'caedec' ? s.count + ' empresas' : 'CAEDEC ' + (s.caedec ?? '-')
+
+      li.appendChild(label)
+      li.appendChild(type)
+      // mousedown so the choice is taken before the textarea loses focus
+      li.addEventListener('mousedown', (e) => {
+        e.preventDefault()
+        chooseSuggestion(i)
+      })
+      suggestList.appendChild(li)
+    })
+    suggestList.hidden = suggestions.length === 0
+  }
+
+  async function fetchSuggestions(text) {
+    if (suggestController) suggestController.abort()
+    suggestController = new AbortController()
+    try {
+      const r = await fetch('/suggest?q=' + encodeURIComponent(text), { signal: suggestController.signal })
+      if (!r.ok) return hideSuggestions()
+      const j = await r.json()
+      // Ignore answers for text the user has already changed
+      if (msgInput.value.trim() !== text) return
+      suggestions = j.suggestions || []
+      activeSuggestion = -1
+      renderSuggestions()
+    } catch (err) {
+      if (err.name !== 'AbortError') hideSuggestions()
+    }
+  }
+
+  // Send the exact entity so the server answers it without fuzzy search or AI
+  function chooseSuggestion(i) {
+    const s = suggestions[i]
+    if (!s) return
+    msgInput.value = s.value
+    hideSuggestions()
+    send()
+  }
+
   // Auto-resize textarea
   msgInput.addEventListener('input', () => {
     msgInput.style.height = 'auto'
     msgInput.style.height = Math.min(msgInput.scrollHeight, 150) + 'px'
+
+    const text = msgInput.value.trim()
+    clearTimeout(suggestTimer)
+    if (text.length < 2 || text.includes('\n')) return hideSuggestions()
+    suggestTimer = setTimeout(() => fetchSuggestions(text), SUGGEST_DELAY_MS)
   })
 
+  msgInput.addEventListener('blur', hideSuggestions)
+
   sendBtn.addEventListener('click', send)
   msgInput.addEventListener('keydown', (e) => {
+    if (!suggestList.hidden && suggestions.length) {
+      if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+        e.preventDefault()
+        // -1 means "no suggestion selected": cycle through -1, 0, ..., n - 1
+        const states = suggestions.length + 1
+        const step = e.key === 'ArrowDown' ? 1 : -1
+        activeSuggestion = (activeSuggestion + 1 + step + states) % states - 1
+        renderSuggestions()
+        return
+      }
+      if (e.key === 'Escape') {
+        hideSuggestions()
+        return
+      }
+      if (e.key === 'Enter' && !e.shiftKey && activeSuggestion >= 0) {
+        e.preventDefault()
+        chooseSuggestion(activeSuggestion)
+        return
+      }
+    }
     if (e.key === 'Enter' && !e.shiftKey) {
       e.preventDefault()
       send()
@@ -64,6 +173,7 @@ document.addEventListener('DOMContentLoaded', () => {
   async function send() {
     const text = msgInput.value.trim()
     if (!text) return
+    hideSuggestions()
 
     // Disable controls
     sendBtn.disabled = true
@@ -84,29 +194,7 @@ document.addEventListener('DOMContentLoaded', () => {
     chat.scrollTop = chat.scrollHeight
 
     try {
-      const res = await fetch('/chat', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: text })
-      })
-
-      // Remove typing indicator
-      typingDiv.remove()
-
-      const j = await res.json()
-      if (res.ok) {
-        append('bot', j.reply)
-      } else {
-        const errMsg = j.detail || j.error || 'Error desconocido'
-        append('bot', '❌ ' + errMsg, true)
-
-        // Show fallback if available
-        if (j.fallback_reply) {
-          setTimeout(() => {
-            append('bot', '💡 Respuesta local: ' + j.fallback_reply)
-          }, 500)
-        }
-      }
+      await sendStream(text, typingDiv)
     } catch (err) {
       typingDiv.remove()
       append('bot', '❌ Error de conexión: ' + err.message, true)
@@ -118,6 +206,84 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  // Parse one Server-Sent Events block ("event: x\ndata: {...}")
+  function parseEvent(block) {
+    let event = 'message'
+    let data = ''
+    for (const line of block.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim()
+      else if (line.startsWith('data:')) data += line.slice(5).trim()
+    }
+    return { event, data: data ? JSON.parse(data) : {} }
+  }
+
+  // Send the message to /chat/stream and render tokens as they arrive
+  async function sendStream(text, typingDiv) {
+    const res = await fetch('/chat/stream', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ message: text, session_id: sessionId })
+    })
+
+    if (!res.ok || !res.body) {
+      typingDiv.remove()
+      return handleJson(res)
+    }
+
+    const reader = res.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let content = null
+    let failed = false
+
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      let sep
+      while ((sep = buffer.indexOf('\n\n')) !== -1) {
+        const { event, data } = parseEvent(buffer.slice(0, sep))
+        buffer = buffer.slice(sep + 2)
+
+        if (event === 'token') {
+          if (!content) {
+            typingDiv.remove()
+            content = append('bot', '')
+          }
+          content.textContent += data.text
+          chat.scrollTop = chat.scrollHeight
+        } else if (event === 'error') {
+          failed = true
+          typingDiv.remove()
+          append('bot', '❌ ' + (data.detail || data.error || 'Error desconocido'), true)
+          if (data.fallback_reply) append('bot', '💡 Respuesta local: ' + data.fallback_reply)
+        }
+      }
+    }
+
+    typingDiv.remove()
+    if (!content && !failed) append('bot', 'No pude generar una respuesta en este momento.')
+  }
+
+  // Render a JSON (non-streaming) response, e.g. validation errors
+  async function handleJson(res) {
+    const j = await res.json()
+    if (res.ok) {
+      append('bot', j.reply)
+    } else {
+      const errMsg = j.detail || j.error || 'Error desconocido'
+      append('bot', '❌ ' + errMsg, true)
+
+      // Show fallback if available
+      if (j.fallback_reply) {
+        setTimeout(() => {
+          append('bot', '💡 Respuesta local: ' + j.fallback_reply)
+        }, 500)
+      }
+    }
+  }
+
   // Focus on input
   msgInput.focus()
 })
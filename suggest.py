@@ -0,0 +1,113 @@
+"""
+Autocompletado por prefijo para /suggest.
+
+Las claves (nombres normalizados, sus palabras a partir de cada posición,
+códigos CAEDEC y descripciones de actividad) se guardan en una lista
+ordenada; un prefijo se resuelve con ``bisect`` y un recorrido corto hacia
+delante, sin estructuras por carácter. Cada clave apunta a una entrada
+(empresa o actividad) con el texto que el chat debe enviar al elegirla, que
+coincide con las rutas exactas de router.py ("caedec N" o el nombre tal cual).
+"""
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence as SequenceABC
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, NamedTuple, Optional
+
+from search_index import STOP_WORDS, column_values, normalize_question
+
+# Claves con prefijo común que se examinan como mucho para ordenar las sugerencias
+SCAN_LIMIT = 256
+
+
+class Suggestion(NamedTuple):
+    type: str
+    label: str
+    value: str
+    caedec: Optional[int]
+    count: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+class SuggestIndex:
+    """Lista ordenada de claves normalizadas -> sugerencias."""
+
+    def __init__(self, rows: Iterable[Mapping[str, Any]], catalog=None, version: Hashable = None):
+        self.version = version
+        self._entries: List[Suggestion] = []
+        pairs = []
+        seen_names: Dict[str, int] = {}
+
+        if not isinstance(rows, SequenceABC):
+            rows = list(rows)
+        columns = zip(column_values(rows, 'nombre'), column_values(rows, 'nombreLargo'), column_values(rows, 'caedec'))
+        for nombre, nombre_largo, caedec in columns:
+            nombre = (nombre or '').strip()
+            if not nombre:
+                continue
+            key = normalize_question(nombre)
+            if not key:
+                continue
+            entry_id = seen_names.get(key)
+            if entry_id is None:
+                entry_id = seen_names[key] = len(self._entries)
+                self._entries.append(Suggestion('nombre', nombre, nombre, caedec, 1))
+                pairs.extend((k, entry_id, rank) for rank, k in enumerate(self._keys_for(key)))
+            nombre_largo = normalize_question(nombre_largo or '')
+            if nombre_largo and nombre_largo != key:
+                pairs.extend((k, entry_id, rank) for rank, k in enumerate(self._keys_for(nombre_largo)))
+
+        if catalog is not None:
+            for entry in catalog.page(None, len(catalog)):
+                label = f"CAEDEC {entry.code}" + (f" - {entry.description}" if entry.description else '')
+                entry_id = len(self._entries)
+                self._entries.append(Suggestion('caedec', label, f"caedec {entry.code}", entry.code, entry.count))
+                pairs.append((str(entry.code), entry_id, 0))
+                if entry.description:
+                    pairs.extend((k, entry_id, rank + 1)
+                                 for rank, k in enumerate(self._keys_for(normalize_question(entry.description))))
+
+        pairs.sort()
+        self._keys: List[str] = [k for k, _, _ in pairs]
+        self._ids = array('i', (entry_id for _, entry_id, _ in pairs))
+        # 0 = la clave es el inicio del texto; >0 = empieza en una palabra posterior
+        self._ranks = array('B', (min(rank, 255) for _, _, rank in pairs))
+
+    @staticmethod
+    def _keys_for(text: str) -> List[str]:
+        """El texto completo y el resto del texto a partir de cada palabra que no es stop word."""
+        words = text.split()
+        keys = [text]
+        for i in range(1, len(words)):
+            if words[i].lower() not in STOP_WORDS and len(words[i]) > 1:
+                keys.append(' '.join(words[i:]))
+        return keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def suggest(self, prefix: str, limit: int = 8) -> List[Suggestion]:
+        """
+        Hasta `limit` sugerencias cuyas claves empiezan por `prefix`: primero las
+        que empiezan el nombre y después las que empiezan en una palabra
+        interior; dentro de cada grupo, las coincidencias exactas, las
+        actividades con más empresas y los textos más cortos.
+        """
+        query = normalize_question(prefix)
+        if not query:
+            return []
+
+        start = bisect_left(self._keys, query)
+        best: Dict[int, tuple] = {}
+        for i in range(start, min(start + SCAN_LIMIT, len(self._keys))):
+            key = self._keys[i]
+            if not key.startswith(query):
+                break
+            entry_id = self._ids[i]
+            entry = self._entries[entry_id]
+            order = (self._ranks[i] > 0, key != query, -entry.count, len(entry.label), key)
+            if entry_id not in best or order < best[entry_id]:
+                best[entry_id] = order
+        ranked = sorted(best, key=best.__getitem__)
+        return [self._entries[entry_id] for entry_id in ranked[:limit]]
@@ -0,0 +1,108 @@
+"""
+Pruebas de la caché de respuestas (cache.py): expiración por TTL, expulsión
+LRU y la clave con la que /chat reutiliza una respuesta:
+
+    python -m pytest -q test_cache.py
+"""
+import os
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pytest
+
+import cache
+from cache import TTLCache
+from fake_gemini import FakeGeminiServer
+from sessions import Session
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    answers = TTLCache(maxsize=4, ttl=10)
+    answers.set('a', 1)
+
+    clock.now += 9.9
+    assert answers.peek('a')
+    assert answers.get('a') == 1
+
+    clock.now += 0.1
+    assert not answers.peek('a')
+    assert answers.get('a', 'caducada') == 'caducada'
+    assert len(answers) == 0
+    stats = answers.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations']) == (1, 1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    answers = TTLCache(maxsize=2, ttl=10)
+    answers.set('a', 1)
+    answers.set('b', 2)
+    # Leer 'a' la vuelve la más reciente; peek no cambia el orden
+    assert answers.get('a') == 1
+    assert answers.peek('b')
+    answers.set('c', 3)
+
+    assert answers.get('b') is None
+    assert (answers.get('a'), answers.get('c')) == (1, 3)
+    assert answers.stats()['evictions'] == 1
+
+    disabled = TTLCache(maxsize=0)
+    disabled.set('a', 1)
+    assert disabled.get('a') is None and len(disabled) == 0
+
+
+def test_answer_cache_key_changes_with_rows_model_and_history():
+    import app
+
+    rows = [{'id': 1}, {'id': 2}]
+    key = app.answer_cache_key('¿Qué es ACME?', rows, 'modelo')
+
+    # Misma pregunta con otros acentos, mayúsculas o signos: misma clave
+    assert app.answer_cache_key('que es acme', rows, 'modelo') == key
+    assert app.answer_cache_key('que es acme', [{'id': 1}, {'id': 3}], 'modelo') != key
+    assert app.answer_cache_key('que es acme', rows, 'otro-modelo') != key
+
+    # Una sesión sin turnos no cambia la clave; con historial, sí
+    session = Session('sesion-cache', max_turns=4)
+    assert app.answer_cache_key('que es acme', rows, 'modelo', session) == key
+    session.turns.append(('hola', 'Hola, ¿en qué te ayudo?', ()))
+    assert app.answer_cache_key('que es acme', rows, 'modelo', session) != key
+
+
+def test_repeated_chat_question_uses_the_cached_answer(monkeypatch):
+    import app
+
+    if app.genai is None:
+        pytest.skip('google-genai no está instalado')
+    server = FakeGeminiServer(latency=0.0).start()
+    monkeypatch.setenv('GEMINI_API_KEY', 'fake')
+    monkeypatch.setenv('GEMINI_BASE_URL', server.base_url)
+    monkeypatch.setattr(app, '_genai_client', None)
+    app.answer_cache.clear()
+    try:
+        client = app.app.test_client()
+        first = client.post('/chat', json={'message': 'empresas de plasticos'}).get_json()
+        second = client.post('/chat', json={'message': 'EMPRESAS DE PLASTICOS'}).get_json()
+        assert first['reply'] == second['reply'] == server.reply
+        assert server.requests == 1
+
+        # Otras filas recuperadas: otra clave y otra llamada
+        client.post('/chat', json={'message': 'empresas de transporte de carga'})
+        assert server.requests == 2
+    finally:
+        server.stop()
+        app.answer_cache.clear()
@@ -0,0 +1,108 @@
+"""
+Pruebas de la actualización del catálogo CAEDEC (caedec_catalog.py) con
+funciones de carga falsas:
+
+    python -m pytest -q test_caedec_catalog.py
+"""
+import caedec_catalog
+from caedec_catalog import CatalogHolder
+
+ROWS = [
+    {'id': 1, 'caedec': 1111, 'descripcion': 'CULTIVO DE CEREALES'},
+    {'id': 2, 'caedec': 1111, 'descripcion': 'CULTIVO DE CEREALES'},
+    {'id': 3, 'caedec': 74990, 'descripcion': 'SERVICIOS EMPRESARIALES'},
+]
+
+
+class FakeSource:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.version = (len(ROWS), 3)
+        self.version_calls = 0
+        self.row_loads = 0
+
+    def load_version(self):
+        self.version_calls += 1
+        if self.fail:
+            raise ConnectionError('BD caída')
+        return self.version
+
+    def load_rows(self):
+        self.row_loads += 1
+        return ROWS
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_never_touches_the_source():
+    source = FakeSource(fail=True)
+    holder = CatalogHolder(source.load_version, source.load_rows, check_interval=60)
+
+    for _ in range(100):
+        assert holder.get() is None
+    assert source.version_calls == 0
+
+
+def test_failed_refresh_is_retried_only_after_the_interval(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(caedec_catalog.time, 'monotonic', clock)
+    source = FakeSource(fail=True)
+    holder = CatalogHolder(source.load_version, source.load_rows, check_interval=60)
+
+    for _ in range(10):
+        assert holder.refresh_if_due() is None
+    assert source.version_calls == 1
+
+    source.fail = False
+    clock.now += 60
+    catalog = holder.refresh_if_due()
+    assert catalog is not None and catalog.counts([1111]) == {1111: 2}
+    assert source.version_calls == 2 and source.row_loads == 1
+
+
+def test_rebuilds_only_when_the_version_changes(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(caedec_catalog.time, 'monotonic', clock)
+    source = FakeSource()
+    holder = CatalogHolder(source.load_version, source.load_rows, check_interval=60)
+    first = holder.refresh(force=True)
+
+    clock.now += 60
+    assert holder.refresh_if_due() is first
+    source.version = (4, 4)
+    clock.now += 60
+    assert holder.refresh_if_due() is not first
+    assert source.row_loads == 2
+
+
+def test_listeners_reuse_the_rows_loaded_for_the_catalog(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(caedec_catalog.time, 'monotonic', clock)
+    source = FakeSource()
+    holder = CatalogHolder(source.load_version, source.load_rows, check_interval=60)
+    built = []
+    holder.add_listener(lambda rows, catalog: built.append((rows, catalog.version)))
+
+    def broken(rows, catalog):
+        raise ValueError('oyente roto')
+    holder.add_listener(broken)
+
+    catalog = holder.refresh(force=True)
+    assert built == [(ROWS, (3, 3))] and source.row_loads == 1
+
+    # Sin cambio de versión no se vuelve a cargar ni a notificar
+    clock.now += 60
+    assert holder.refresh_if_due() is catalog
+    assert len(built) == 1
+
+    source.version = (4, 4)
+    clock.now += 60
+    holder.refresh_if_due()
+    assert [version for _, version in built] == [(3, 3), (4, 4)]
+    assert source.row_loads == 2
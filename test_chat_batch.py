@@ -0,0 +1,90 @@
+"""
+Pruebas de /chat/batch (chat_batch en app.py) contra el índice construido
+desde CAEDEC1.csv, con llamadas a la IA falsas:
+
+    python -m pytest -q test_chat_batch.py
+"""
+import os
+import threading
+import time
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pytest
+
+import app
+from router import OFF_TOPIC_REPLY, ROUTE_OFF_TOPIC, ROUTE_OPEN
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Sustituye la llamada a la IA y registra cuántas hay en curso a la vez."""
+    state = {'calls': 0, 'running': 0, 'max_running': 0}
+    lock = threading.Lock()
+
+    def run_llm_call(message, db_results, deadline=None):
+        with lock:
+            state['calls'] += 1
+            state['running'] += 1
+            state['max_running'] = max(state['max_running'], state['running'])
+        time.sleep(0.05)
+        with lock:
+            state['running'] -= 1
+        return f"respuesta: {message}"
+
+    monkeypatch.setattr(app, 'needs_llm_call', lambda message, db_results, session=None: True)
+    monkeypatch.setattr(app, 'run_llm_call', run_llm_call)
+    return state
+
+
+def test_rejects_invalid_and_oversized_batches(client, monkeypatch):
+    assert client.post('/chat/batch', json={}).status_code == 400
+    assert client.post('/chat/batch', json={'messages': []}).status_code == 400
+    assert client.post('/chat/batch', json={'messages': 'hola'}).status_code == 400
+
+    monkeypatch.setattr(app, 'BATCH_MAX_MESSAGES', 2)
+    response = client.post('/chat/batch', json={'messages': ['a', 'b', 'c']})
+    assert response.status_code == 413
+
+
+def test_results_keep_the_input_order_with_per_item_errors(client, fake_llm, monkeypatch):
+    searches = []
+    search_many = app.search_many
+    monkeypatch.setattr(app, 'search_many', lambda queries, limit=10: searches.append(queries) or search_many(queries, limit))
+    messages = ['empresas de plasticos', '', 'que hora es', 'empresas de transporte de carga', 42, 'xqzwvk plmnbv']
+
+    response = client.post('/chat/batch', json={'messages': messages})
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [item['index'] for item in results] == list(range(len(messages)))
+    assert [item['message'] for item in results] == messages
+    assert results[0]['route'] == ROUTE_OPEN and results[0]['reply'] == 'respuesta: empresas de plasticos'
+    assert results[1]['error'] == results[4]['error'] == 'No se proporcionó ningún mensaje'
+    assert results[2]['route'] == ROUTE_OFF_TOPIC and results[2]['reply'] == OFF_TOPIC_REPLY
+    assert results[3]['reply'] == 'respuesta: empresas de transporte de carga'
+    assert results[5]['reply'] == app.NO_RESULTS_REPLY
+    # Una sola búsqueda para todo el lote, sin el mensaje fuera de tema
+    assert searches == [['empresas de plasticos', 'empresas de transporte de carga', 'xqzwvk plmnbv']]
+    assert fake_llm['calls'] == 2
+
+
+def test_llm_calls_are_bounded_and_share_the_batch_deadline(fake_llm):
+    messages = [f"empresas de {word}" for word in ('plasticos', 'transporte', 'madera', 'software', 'cemento', 'carne')]
+
+    results = app.chat_batch(messages, parallelism=2)
+    assert all(item['reply'].startswith('respuesta: ') for item in results)
+    assert fake_llm['calls'] == len(messages)
+    assert fake_llm['max_running'] == 2
+
+    # Con la fecha límite del lote vencida se responde con los datos encontrados
+    results = app.chat_batch(messages[:2], timeout=0)
+    for item in results:
+        assert item['error'] == 'La respuesta tardó demasiado'
+        assert item['fallback_reply']
+    assert fake_llm['calls'] == len(messages)
@@ -0,0 +1,150 @@
+"""
+Pruebas de /chat/stream (Server-Sent Events) contra el servidor Gemini falso
+de fake_gemini.py:
+
+    python -m pytest -q test_chat_stream.py
+"""
+import json
+import os
+import threading
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pytest
+
+from circuit_breaker import CircuitBreaker
+from fake_gemini import FakeGeminiServer
+from llm_gate import LLMGate
+
+QUESTION = 'empresas de plasticos en la paz'
+
+
+def parse_sse(body: str):
+    """Eventos (nombre, datos) del cuerpo; cada bloque debe tener una línea `event:` y una `data:`."""
+    assert body.endswith('\n\n')
+    events = []
+    for block in body[:-2].split('\n\n'):
+        lines = block.split('\n')
+        assert len(lines) == 2, block
+        assert lines[0].startswith('event: ') and lines[1].startswith('data: ')
+        events.append((lines[0][len('event: '):], json.loads(lines[1][len('data: '):])))
+    return events
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    import app
+
+    if app.genai is None:
+        pytest.skip('google-genai no está instalado')
+    server = FakeGeminiServer(latency=0.05).start()
+    monkeypatch.setenv('GEMINI_API_KEY', 'fake')
+    monkeypatch.setenv('GEMINI_BASE_URL', server.base_url)
+    monkeypatch.setattr(app, '_genai_client', None)
+    monkeypatch.setattr(app, 'COALESCE_REQUESTS', False)
+    monkeypatch.setattr(app, 'llm_breaker', CircuitBreaker(failure_threshold=100))
+    app.answer_cache.clear()
+    yield app, server
+    server.stop()
+    app.answer_cache.clear()
+
+
+def post_stream(app, message=QUESTION, session_id=None):
+    response = app.app.test_client().post('/chat/stream', json={'message': message, 'session_id': session_id})
+    return response, response.get_data(as_text=True)
+
+
+def test_stream_framing_with_multi_line_chunks(fake_model):
+    app, server = fake_model
+    server.reply = 'Primera línea de la respuesta.\nSegunda línea con "comillas".\n\nFin.'
+
+    response, body = post_stream(app)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events = parse_sse(body)
+    names = [name for name, _ in events]
+    assert names[0] == 'results' and names[-1] == 'done'
+    assert set(names[1:-1]) == {'token'} and len(names) > 3
+    assert events[0][1]['results']
+    # Los saltos de línea viajan escapados dentro del JSON y se recuperan intactos
+    assert ''.join(data['text'] for name, data in events if name == 'token').strip() == server.reply
+
+
+def test_greeting_is_a_single_token(fake_model):
+    app, server = fake_model
+    events = parse_sse(post_stream(app, 'hola')[1])
+    assert [name for name, _ in events] == ['results', 'token', 'done']
+    assert server.requests == 0
+
+
+def test_slow_but_steady_stream_is_not_cut(fake_model, monkeypatch):
+    app, server = fake_model
+    server.reply = ' '.join(f'palabra{i}' for i in range(10))
+    server.latency = 2.0  # 0.2 s entre fragmentos, 2 s en total
+    # El límite de la llamada solo se aplica al primer fragmento
+    monkeypatch.setattr(app, 'LLM_CALL_TIMEOUT', 0.5)
+
+    events = parse_sse(post_stream(app)[1])
+
+    names = [name for name, _ in events]
+    assert names[0] == 'results' and names[-1] == 'done' and 'error' not in names
+    assert ''.join(data['text'] for name, data in events if name == 'token').strip() == server.reply
+    # Un stream que fue produciendo texto no cuenta como llamada lenta
+    breaker = app.llm_breaker.stats()
+    assert breaker['failures'] == 0 and breaker['successes'] == 1
+
+
+def test_stalled_stream_sends_error_event_then_done(fake_model, monkeypatch):
+    app, server = fake_model
+    server.reply = ' '.join(f'palabra{i}' for i in range(10))
+    server.stall_after = 2
+    server.stall = 1.5
+    monkeypatch.setattr(app, 'LLM_STREAM_IDLE_TIMEOUT', 0.3)
+
+    events = parse_sse(post_stream(app)[1])
+
+    names = [name for name, _ in events]
+    assert names[:2] == ['results', 'token'] and names[-2:] == ['error', 'done']
+    tokens = [data['text'] for name, data in events if name == 'token']
+    assert ''.join(tokens).split() == ['palabra0', 'palabra1']
+    error = events[-2][1]
+    assert error['fallback_reply'] == app.local_answer(events[0][1]['results'])
+
+
+def test_failed_stream_still_records_the_turn(fake_model, monkeypatch):
+    app, server = fake_model
+    server.reply = ' '.join(f'palabra{i}' for i in range(10))
+    server.stall_after = 2
+    server.stall = 1.5
+    monkeypatch.setattr(app, 'LLM_STREAM_IDLE_TIMEOUT', 0.3)
+
+    events = parse_sse(post_stream(app, session_id='sesion-stream-1')[1])
+
+    assert [name for name, _ in events][-2:] == ['error', 'done']
+    session = app.sessions.get('sesion-stream-1')
+    [(user, answer, _)] = session.history()
+    # Queda la pregunta, lo que llegó a verse de la respuesta y las filas para las preguntas de seguimiento
+    assert QUESTION in user
+    assert answer.split() == ['palabra0', 'palabra1']
+    assert [row['id'] for row in session.last_rows] == [row['id'] for row in events[0][1]['results']]
+
+
+def test_full_gate_rejects_before_streaming(fake_model, monkeypatch):
+    app, server = fake_model
+    gate = LLMGate(max_concurrency=1, max_queue=0, retry_after=7)
+    monkeypatch.setattr(app, 'llm_gate', gate)
+    release = threading.Event()
+    busy = gate.submit(release.wait, 5)
+    try:
+        response, _ = post_stream(app)
+    finally:
+        release.set()
+        busy.result(5)
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '7'
+    body = response.get_json()
+    assert body['fallback_reply'] and 'error' in body
+    assert server.requests == 0
@@ -0,0 +1,131 @@
+"""
+Pruebas del circuit breaker (circuit_breaker.py) y de la fecha límite por
+llamada a la IA contra el servidor falso de fake_gemini.py:
+
+    python -m pytest -q test_circuit_breaker.py
+"""
+import os
+import time
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from fake_gemini import FakeGeminiServer
+
+QUESTION = 'empresas de plasticos en la paz'
+
+
+def wait_for(condition, timeout=5.0):
+    """Espera a que `condition()` sea verdadera (las llamadas lentas terminan en otro hilo)."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_opens_after_consecutive_failures_and_closes_after_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10, clock=clock)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    # Solo una sonda a la vez
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert [t['to'] for t in breaker.stats()['transitions']] == [OPEN, HALF_OPEN, CLOSED]
+
+
+def test_failed_probe_reopens():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+    assert breaker.allow()
+    breaker.record_failure('timeout')
+    assert breaker.state == OPEN
+    assert breaker.stats()['retry_in'] == 5
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    import app
+
+    if app.genai is None:
+        pytest.skip('google-genai no está instalado')
+    server = FakeGeminiServer(latency=1.0).start()
+    monkeypatch.setenv('GEMINI_API_KEY', 'fake')
+    monkeypatch.setenv('GEMINI_BASE_URL', server.base_url)
+    monkeypatch.setattr(app, '_genai_client', None)
+    monkeypatch.setattr(app, 'COALESCE_REQUESTS', False)
+    monkeypatch.setattr(app, 'LLM_CALL_TIMEOUT', 0.3)
+    monkeypatch.setattr(app, 'llm_breaker', CircuitBreaker(failure_threshold=1, reset_timeout=1.5))
+    app.answer_cache.clear()
+    yield app, server
+    server.stop()
+    app.answer_cache.clear()
+
+
+def test_slow_model_gets_local_answer_then_circuit_opens(fake_model):
+    app, server = fake_model
+    client = app.app.test_client()
+
+    start = time.monotonic()
+    body = client.post('/chat', json={'message': QUESTION}).get_json()
+    assert body['fallback'] == 'timeout'
+    assert time.monotonic() - start < 0.9
+
+    # La llamada lenta termina en segundo plano: abre el circuito y guarda su respuesta
+    assert wait_for(lambda: app.llm_breaker.state != CLOSED and len(app.answer_cache) > 0)
+    assert app.llm_breaker.state == OPEN
+    assert client.post('/chat', json={'message': QUESTION}).get_json()['reply'] == server.reply
+
+    requests_before = server.requests
+    body = client.post('/chat', json={'message': 'minera clavijo cereales'}).get_json()
+    assert 'fallback' not in body
+    assert server.requests == requests_before
+
+    # Pasada la espera, una sonda rápida cierra el circuito
+    server.latency = 0.0
+    assert wait_for(lambda: app.llm_breaker.state == HALF_OPEN)
+    assert client.post('/chat', json={'message': 'minera clavijo cereales'}).get_json()['reply'] == server.reply
+    # /status lee el último estado recogido: se fuerza una recogida
+    app.health_monitor.refresh()
+    status = client.get('/status').get_json()['circuit_breaker']
+    assert status['state'] == CLOSED
+    assert [t['to'] for t in status['transitions']] == [OPEN, HALF_OPEN, CLOSED]
+
+
+def test_late_model_answer_is_not_recorded_in_the_session(fake_model):
+    app, server = fake_model
+    client = app.app.test_client()
+    session_id = 'sesion-lenta-1'
+
+    body = client.post('/chat', json={'message': QUESTION, 'session_id': session_id}).get_json()
+    assert body['fallback'] == 'timeout'
+
+    # La respuesta del modelo llega después y queda en la caché, pero no en la sesión
+    assert wait_for(lambda: len(app.answer_cache) > 0)
+    session = app.sessions.get(session_id)
+    assert [answer for _, answer, _ in session.history()] == [body['reply']]
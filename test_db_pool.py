@@ -0,0 +1,128 @@
+"""
+Pruebas del pool de conexiones (db_pool.py) con un driver falso, sin MySQL:
+
+    python -m pytest -q test_db_pool.py
+"""
+import threading
+import time
+
+import pytest
+
+import db_pool
+from db_pool import ConnectionPool, PoolTimeout, ProcessLocalPool
+
+
+class FakeConnection:
+    def __init__(self, n):
+        self.n = n
+        self.closed = False
+        self.broken = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return None
+
+    def rollback(self):
+        if self.broken:
+            raise ConnectionError('conexión perdida')
+        self.rollbacks += 1
+
+    def ping(self, reconnect=False):
+        if self.broken:
+            raise ConnectionError('conexión perdida')
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDriver:
+    def __init__(self):
+        self.connections = []
+
+    def connect(self):
+        connection = FakeConnection(len(self.connections))
+        self.connections.append(connection)
+        return connection
+
+
+@pytest.fixture
+def driver():
+    return FakeDriver()
+
+
+def test_checkout_and_return_reuses_the_connection(driver):
+    pool = ConnectionPool(driver.connect, min_size=0, max_size=2)
+
+    first = pool.acquire()
+    first.close()
+    # close() devuelve al pool (con rollback) en lugar de cerrar
+    assert not driver.connections[0].closed
+    assert driver.connections[0].rollbacks == 1
+
+    second = pool.acquire()
+    assert second._raw is driver.connections[0]
+    second.close()
+    # Cerrar dos veces no devuelve la conexión dos veces
+    second.close()
+    assert pool.stats()['idle'] == 1 and pool.stats()['in_use'] == 0
+    assert len(driver.connections) == 1
+
+
+def test_broken_connection_is_discarded_on_close(driver):
+    pool = ConnectionPool(driver.connect, min_size=0, max_size=2)
+    connection = pool.acquire()
+    driver.connections[0].broken = True
+    connection.close()
+
+    assert driver.connections[0].closed
+    stats = pool.stats()
+    assert stats['size'] == 0 and stats['discarded'] == 1
+
+    # El siguiente préstamo abre una conexión nueva
+    pool.acquire().discard()
+    assert len(driver.connections) == 2 and driver.connections[1].closed
+
+
+def test_failed_health_check_replaces_idle_connection(driver):
+    pool = ConnectionPool(driver.connect, min_size=1, max_size=1)
+    pool.warm_up()
+    driver.connections[0].broken = True
+
+    connection = pool.acquire()
+    assert connection._raw is driver.connections[1]
+    assert pool.stats()['failed_health_checks'] == 1
+
+
+def test_exhausted_pool_times_out_and_wakes_waiters(driver):
+    pool = ConnectionPool(driver.connect, min_size=0, max_size=1, wait_timeout=0.1)
+    held = pool.acquire()
+
+    start = time.monotonic()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert 0.1 <= time.monotonic() - start < 1
+    assert pool.stats()['timeouts'] == 1
+
+    # Un hilo que espera recibe la conexión en cuanto se devuelve
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(pool.acquire(timeout=2)))
+    waiter.start()
+    time.sleep(0.05)
+    held.close()
+    waiter.join()
+    assert result[0]._raw is driver.connections[0]
+
+
+def test_each_process_gets_its_own_pool(driver, monkeypatch):
+    pools = ProcessLocalPool(lambda: ConnectionPool(driver.connect, min_size=1, max_size=2))
+    pools.warm_up()
+    parent = pools.get()
+    assert pools.get() is parent
+
+    # Tras un fork el hijo crea otro pool y no cierra las conexiones heredadas
+    monkeypatch.setattr(db_pool.os, 'getpid', lambda: -1)
+    child = pools.get()
+    assert child is not parent
+    child.acquire().close()
+    assert len(driver.connections) == 2
+    assert not driver.connections[0].closed
@@ -0,0 +1,117 @@
+"""
+Pruebas de la búsqueda FULLTEXT en SQL (search_fulltext en app.py) con un
+cursor falso, sin MySQL: la consulta MATCH ... AGAINST que se construye y el
+paso a la búsqueda con LIKE cuando el servidor no tiene los índices:
+
+    python -m pytest -q test_fulltext.py
+"""
+import os
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pymysql
+import pytest
+
+import app
+
+ROW = {'id': 7, 'nombre': 'PLASTICOS ANDINOS', 'nombreLargo': None, 'caedec': 25200,
+       'descripcion': 'FABRICACION DE PRODUCTOS DE PLASTICO', 'relevancia': 4}
+
+
+class FakeCursor:
+    """Guarda cada consulta; las que contienen MATCH fallan con `fulltext_error` si está definido."""
+
+    def __init__(self, fulltext_error=None):
+        self.fulltext_error = fulltext_error
+        self.queries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, sql, params=()):
+        self.queries.append((' '.join(sql.split()), list(params)))
+        if 'MATCH(' in sql and self.fulltext_error is not None:
+            raise self.fulltext_error
+
+    def fetchall(self):
+        return [dict(ROW)]
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sql_backend(monkeypatch):
+    """Búsqueda por SQL: sin índice en memoria, con FULLTEXT habilitado y el catálogo sin usar."""
+    monkeypatch.setattr(app, 'search_index', None)
+    monkeypatch.setattr(app, 'SEARCH_SQL_BACKEND', 'auto')
+    monkeypatch.setattr(app, '_fulltext_supported', True)
+    monkeypatch.setattr(app, 'COALESCE_REQUESTS', False)
+    return monkeypatch
+
+
+def test_fulltext_expression_uses_word_prefixes():
+    assert app.fulltext_expression('plásticos') == 'PLASTICOS*'
+    # Palabras clave con signos se parten en términos obligatorios
+    assert app.fulltext_expression('COCHABAMBA-BOLIVIA') == '(+COCHABAMBA* +BOLIVIA*)'
+    # Más cortas que el mínimo indexable de InnoDB: no hay término
+    assert app.fulltext_expression('S.A.') is None
+
+
+def test_search_fulltext_builds_weighted_match_query(sql_backend):
+    cursor = FakeCursor()
+    rows = app.search_fulltext(cursor, ['PLASTICOS', 'SA', 'ANDINOS'], ['25200'], limit=5)
+
+    assert rows == [ROW]
+    (sql, params), = cursor.queries
+    assert 'MATCH(nombre_norm, nombreLargo_norm, descripcion_norm) AGAINST(%s IN BOOLEAN MODE)' in sql
+    assert 'UNION SELECT id FROM informacion WHERE caedec IN (%s)' in sql
+    assert sql.endswith('ORDER BY relevancia DESC, i.id LIMIT %s')
+    assert sql.count('3 * (MATCH(i.nombre_norm)') == 2 and '10 * (i.caedec = %s)' in sql
+    # Relevancia (3 por palabra + CAEDEC), WHERE (todas las palabras juntas + CAEDEC) y límite; 'SA' se ignora
+    assert params == ['PLASTICOS*'] * 3 + ['ANDINOS*'] * 3 + [25200, 'PLASTICOS* ANDINOS*', 25200, 5]
+
+    # Sin ninguna palabra indexable se deja la consulta a LIKE
+    assert app.search_fulltext(FakeCursor(), ['SA'], [], limit=5) is None
+
+
+def test_missing_fulltext_index_falls_back_to_like(sql_backend):
+    cursor = FakeCursor(fulltext_error=pymysql.err.InternalError(1191, "Can't find FULLTEXT index"))
+    sql_backend.setattr(app, 'get_db_connection', lambda: FakeConnection(cursor))
+
+    assert app.search_exact('plasticos andinos', limit=5) == [ROW]
+    (fulltext_sql, _), (like_sql, like_params) = cursor.queries
+    assert 'MATCH(' in fulltext_sql
+    assert 'UPPER(nombre) LIKE %s' in like_sql and 'MATCH(' not in like_sql
+    assert like_params[:3] == ['%PLASTICOS%'] * 3 and like_params[-1] == 5
+    assert app._fulltext_supported is False
+
+    # Las siguientes búsquedas ya no intentan FULLTEXT
+    cursor.queries.clear()
+    app.search_exact('plasticos', limit=5)
+    assert len(cursor.queries) == 1 and 'MATCH(' not in cursor.queries[0][0]
+
+
+def test_other_sql_errors_do_not_disable_fulltext(sql_backend):
+    cursor = FakeCursor(fulltext_error=pymysql.err.ProgrammingError(1064, 'error de sintaxis'))
+    with pytest.raises(pymysql.err.ProgrammingError):
+        app.search_fulltext(cursor, ['PLASTICOS'], [], limit=5)
+    assert app._fulltext_supported is True
+
+    # Con SEARCH_SQL_BACKEND=fulltext tampoco se pasa a LIKE en silencio
+    sql_backend.setattr(app, 'SEARCH_SQL_BACKEND', 'fulltext')
+    cursor = FakeCursor(fulltext_error=pymysql.err.InternalError(1191, "Can't find FULLTEXT index"))
+    with pytest.raises(pymysql.err.InternalError):
+        app.search_fulltext(cursor, ['PLASTICOS'], [], limit=5)
+    assert app._fulltext_supported is True
@@ -0,0 +1,59 @@
+"""
+Pruebas de la búsqueda aproximada (fuzzy_search.py): cómo llegan sus filas
+al prompt y su reconstrucción junto con el catálogo CAEDEC:
+
+    python -m pytest -q test_fuzzy_search.py
+"""
+import os
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pytest
+
+from prompt_builder import APPROXIMATE_MARK, build_context
+
+pytest.importorskip('numpy')
+
+ROWS = [
+    {'id': 1, 'nombre': 'SERV HOLANDES DE COOPERACION', 'nombreLargo': None, 'caedec': 85319,
+     'descripcion': 'OTROS SERV ASIST SOCIAL'},
+    {'id': 2, 'nombre': 'CONSTRUCTORA FERNANDEZ', 'nombreLargo': None, 'caedec': 45209,
+     'descripcion': 'CONSTRUCCION DE OBRAS'},
+]
+
+
+def test_fuzzy_rows_are_marked_as_approximate_in_the_context():
+    rows = [dict(ROWS[0], relevancia=3, similitud=0.9), dict(ROWS[1], similitud=0.42)]
+    lines = build_context(rows).splitlines()
+    assert '- SERV HOLANDES DE COOPERACION' in lines
+    assert f'- CONSTRUCTORA FERNANDEZ{APPROXIMATE_MARK}' in lines
+
+
+@pytest.fixture
+def fuzzy_app(monkeypatch):
+    import app
+
+    holder = app.caedec_catalog
+    table = {'rows': list(ROWS)}
+    monkeypatch.setattr(app, 'FUZZY_SEARCH', 'fallback')
+    monkeypatch.setattr(app, 'FUZZY_MIN_SCORE', 0.3)
+    monkeypatch.setattr(holder, 'load_version', lambda: (len(table['rows']), max(r['id'] for r in table['rows'])))
+    monkeypatch.setattr(holder, 'load_rows', lambda: list(table['rows']))
+    holder.refresh(force=True)
+    yield app, table
+    monkeypatch.undo()
+    app.fuzzy_index = None
+    holder.refresh(force=True)
+
+
+def test_fuzzy_index_is_rebuilt_when_the_data_changes(fuzzy_app):
+    app, table = fuzzy_app
+    [row] = app.apply_fuzzy('holandez', [], 1)
+    assert row['id'] == 1 and 'relevancia' not in row
+    assert app.local_answer([row]).startswith('No encontré coincidencias exactas')
+
+    # La fila borrada deja de aparecer tras la siguiente comprobación de versión
+    table['rows'] = [ROWS[1], {'id': 3, 'nombre': 'HOLANDESA IMPORT', 'nombreLargo': None, 'caedec': 51900,
+                               'descripcion': 'COMERCIO AL POR MAYOR'}]
+    app.caedec_catalog.refresh()
+    assert [r['id'] for r in app.apply_fuzzy('holandez', [], 5)] == [3]
@@ -0,0 +1,58 @@
+"""
+Pruebas del arranque de la app: importarla no abre conexiones a la BD y los
+datos del proceso los carga el hilo de salud (health.py):
+
+    python -m pytest -q test_health.py
+"""
+import os
+import subprocess
+import sys
+import textwrap
+
+from health import HealthMonitor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_import_opens_no_connections_and_health_loads_the_catalog():
+    script = textwrap.dedent("""
+        import time
+
+        import pymysql
+
+        calls = []
+
+        def connect(**kwargs):
+            calls.append(kwargs)
+            raise ConnectionError('sin BD')
+
+        pymysql.connect = connect
+        import app
+
+        assert calls == [], calls
+        assert app.caedec_catalog.get() is None and not app.health_monitor.running()
+
+        app.app.test_client().get('/healthz')
+        assert app.health_monitor.running()
+        deadline = time.monotonic() + 30
+        while app.caedec_catalog.get() is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert len(app.caedec_catalog.get()) > 0
+        assert app.get_suggest_index() is not None
+        # El hilo intentó precalentar el pool y comprobar la BD
+        assert calls
+    """)
+    env = {**os.environ, 'SEARCH_INDEX_SOURCE': 'csv'}
+    result = subprocess.run([sys.executable, '-c', script], cwd=HERE, env=env, capture_output=True, text=True,
+                            timeout=60)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_start_is_idempotent_within_a_process():
+    monitor = HealthMonitor(lambda: {'ok': True}, interval=60)
+    assert not monitor.running()
+    monitor.start()
+    thread = monitor._thread
+    monitor.start()
+    assert monitor.running() and monitor._thread is thread
+    monitor.stop()
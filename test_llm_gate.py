@@ -0,0 +1,96 @@
+"""
+Pruebas de la ejecución acotada de llamadas a la IA (llm_gate.py):
+
+    python -m pytest -q test_llm_gate.py
+"""
+import threading
+import time
+
+import pytest
+
+from llm_gate import DeadlineExceeded, LLMGate, LLMSaturated
+
+
+def blocked_call(release: threading.Event):
+    release.wait(5)
+    return 'ok'
+
+
+def test_full_queue_is_rejected_without_waiting():
+    gate = LLMGate(max_concurrency=1, max_queue=1)
+    release = threading.Event()
+    futures = [gate.submit(blocked_call, release) for _ in range(2)]
+
+    start = time.monotonic()
+    with pytest.raises(LLMSaturated):
+        gate.run(blocked_call, release, deadline=time.monotonic() + 5)
+    assert time.monotonic() - start < 0.1
+
+    release.set()
+    assert [f.result(1) for f in futures] == ['ok', 'ok']
+    assert gate.stats()['rejected'] == 1
+
+
+def test_call_that_would_not_start_before_its_deadline_is_rejected():
+    gate = LLMGate(max_concurrency=1, max_queue=4)
+    # Duración media conocida: 0.2 s por llamada
+    gate.run(time.sleep, 0.2)
+    release = threading.Event()
+    running = gate.submit(blocked_call, release)
+
+    start = time.monotonic()
+    with pytest.raises(LLMSaturated):
+        gate.run(lambda: 'tarde', deadline=time.monotonic() + 0.1)
+    assert time.monotonic() - start < 0.05
+
+    # Con margen suficiente sí se encola y espera su turno
+    waiting = gate.submit(lambda: 'a tiempo', deadline=time.monotonic() + 2)
+    release.set()
+    assert running.result(1) == 'ok'
+    assert waiting.result(1) == 'a tiempo'
+
+
+def test_wait_never_exceeds_the_deadline():
+    gate = LLMGate(max_concurrency=1, max_queue=0)
+    release = threading.Event()
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        gate.run(blocked_call, release, deadline=time.monotonic() + 0.1)
+    assert time.monotonic() - start < 0.3
+    release.set()
+
+    with pytest.raises(DeadlineExceeded):
+        gate.run(lambda: 'nunca', deadline=time.monotonic() - 1)
+
+
+def chunks(delays):
+    for i, delay in enumerate(delays):
+        time.sleep(delay)
+        yield i
+
+
+def test_stream_deadline_applies_to_the_first_chunk_only():
+    gate = LLMGate(max_concurrency=1, max_queue=0)
+    # 6 fragmentos cada 0.1 s: más que la fecha límite, pero ninguna espera pasa del límite entre fragmentos
+    items = gate.stream(chunks, [0.1] * 6, deadline=time.monotonic() + 0.3, idle_timeout=0.3)
+    assert list(items) == list(range(6))
+
+    with pytest.raises(DeadlineExceeded):
+        list(gate.stream(chunks, [0.3], deadline=time.monotonic() + 0.1))
+
+
+def test_stalled_or_too_long_stream_times_out():
+    gate = LLMGate(max_concurrency=2, max_queue=0)
+    received = []
+    with pytest.raises(DeadlineExceeded):
+        for item in gate.stream(chunks, [0, 0, 0.5], deadline=time.monotonic() + 1, idle_timeout=0.2):
+            received.append(item)
+    assert received == [0, 1]
+
+    received = []
+    with pytest.raises(DeadlineExceeded):
+        for item in gate.stream(chunks, [0.1] * 10, deadline=time.monotonic() + 1, idle_timeout=1,
+                                max_deadline=time.monotonic() + 0.45):
+            received.append(item)
+    assert 2 <= len(received) <= 5
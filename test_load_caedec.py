@@ -0,0 +1,168 @@
+"""
+Pruebas del cargador (load_caedec.py) con un cursor falso sobre SQLite, sin
+MySQL: hashes normalizados y modos incremental, append y replace.
+
+    python -m pytest -q test_load_caedec.py
+"""
+import csv
+import sqlite3
+
+import pytest
+
+from load_caedec import content_hash, load, load_existing_hashes
+
+COLUMNS = ('nombre', 'nombreLargo', 'caedec', 'descripcion')
+
+
+class FakeConnection:
+    """Conexión con la interfaz de pymysql (DictCursor, parámetros %s) sobre SQLite."""
+
+    def __init__(self):
+        self.db = sqlite3.connect(':memory:')
+        self.db.execute(
+            "CREATE TABLE informacion (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT, nombreLargo TEXT, "
+            "caedec INTEGER, descripcion TEXT, content_hash TEXT)"
+        )
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self.db.cursor())
+
+    def commit(self):
+        self.commits += 1
+        self.db.commit()
+
+    def rollback(self):
+        self.db.rollback()
+
+    def insert(self, *rows, content_hash=None):
+        for row in rows:
+            self.db.execute("INSERT INTO informacion (nombre, nombreLargo, caedec, descripcion, content_hash) "
+                            "VALUES (?, ?, ?, ?, ?)", (*row, content_hash))
+        self.db.commit()
+
+    def rows(self):
+        return {row[0]: row[1:] for row in self.db.execute(f"SELECT id, {', '.join(COLUMNS)} FROM informacion")}
+
+
+class FakeCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cursor.close()
+
+    def execute(self, sql, params=()):
+        if 'information_schema' in sql:
+            # La tabla de prueba ya tiene content_hash
+            self._result = [{'count': 1}]
+            return
+        self.cursor.execute(sql.replace('%s', '?'), list(params))
+        self.rowcount = self.cursor.rowcount
+        columns = [c[0] for c in self.cursor.description or ()]
+        self._result = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+
+    def executemany(self, sql, params):
+        self.cursor.executemany(sql.replace('%s', '?'), params)
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return self._result
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='latin-1') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['Nombre', 'Nombre Largo', 'CAEDED', 'Descripcion'])
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+    return str(path)
+
+
+@pytest.fixture
+def connection():
+    return FakeConnection()
+
+
+def test_content_hash_normalizes_like_the_csv():
+    stored = {'nombre': ' ACME ', 'nombreLargo': '', 'caedec': '74990', 'descripcion': 'SERVICIOS  '}
+    from_csv = {'nombre': 'ACME', 'nombreLargo': None, 'caedec': 74990, 'descripcion': 'SERVICIOS'}
+    assert content_hash(stored) == content_hash(from_csv)
+    assert content_hash(from_csv) != content_hash({**from_csv, 'caedec': 74991})
+
+
+def test_load_existing_hashes_recomputes_missing_and_outdated_hashes(connection):
+    connection.insert(('ACME', None, 1, 'A'), ('ACME', None, 1, 'A'))
+    connection.insert(('BETA ', None, 2, 'B'), content_hash='desactualizado')
+    connection.insert(('GAMA', None, 3, 'C'), content_hash=content_hash({'nombre': 'GAMA', 'caedec': 3, 'descripcion': 'C'}))
+
+    with connection.cursor() as cursor:
+        existing, keys = load_existing_hashes(cursor, batch_size=1)
+
+    acme = content_hash({'nombre': 'ACME', 'caedec': 1, 'descripcion': 'A'})
+    assert list(existing[acme]) == [1, 2]
+    assert list(existing[content_hash({'nombre': 'BETA', 'caedec': 2, 'descripcion': 'B'})]) == [3]
+    assert keys == {1: 'ACME', 2: 'ACME', 3: 'BETA', 4: 'GAMA'}
+    stored = [row[0] for row in connection.db.execute("SELECT content_hash FROM informacion ORDER BY id")]
+    assert stored[:2] == [acme, acme] and stored[2] != 'desactualizado'
+
+
+def test_incremental_updates_changed_rows_in_place_in_one_transaction(connection, tmp_path):
+    connection.insert(('ACME', None, 1, 'A'), ('BETA', None, 2, 'B'), ('BETA', None, 2, 'B'),
+                      ('GAMA', None, 3, 'C'), ('DELTA', None, 4, 'D'))
+    path = write_csv(tmp_path / 'caedec.csv', [
+        (' ACME ', '', 1, 'A'),        # sin cambios (con espacios en el CSV)
+        ('BETA', None, 2, 'B'),        # consume una sola de las dos filas idénticas
+        ('GAMA', None, 3, 'C nueva'),  # modificada: conserva el id
+        ('EPSILON', None, 5, 'E'),     # nueva
+    ])
+
+    stats = load(connection, path, 'incremental', batch_size=2)
+
+    assert (stats['unchanged'], stats['updated'], stats['inserted'], stats['deleted']) == (2, 1, 1, 2)
+    assert connection.commits == 1
+    assert connection.rows() == {
+        1: ('ACME', None, 1, 'A'),
+        2: ('BETA', None, 2, 'B'),
+        4: ('GAMA', None, 3, 'C nueva'),
+        6: ('EPSILON', None, 5, 'E'),
+    }
+
+    # Con los mismos datos no se escribe nada
+    stats = load(connection, path, 'incremental', batch_size=2)
+    assert (stats['unchanged'], stats['updated'], stats['inserted'], stats['deleted']) == (4, 0, 0, 0)
+
+
+def test_incremental_keep_missing_keeps_rows_not_in_the_csv(connection, tmp_path):
+    connection.insert(('ACME', None, 1, 'A'), ('ACME', None, 1, 'A'), ('DELTA', None, 4, 'D'))
+    path = write_csv(tmp_path / 'caedec.csv', [('ACME', None, 1, 'A2')])
+
+    stats = load(connection, path, 'incremental', keep_missing=True)
+
+    assert (stats['unchanged'], stats['updated'], stats['inserted'], stats['deleted']) == (0, 1, 0, 0)
+    assert connection.rows() == {1: ('ACME', None, 1, 'A2'), 2: ('ACME', None, 1, 'A'), 3: ('DELTA', None, 4, 'D')}
+
+
+def test_append_and_replace(connection, tmp_path):
+    connection.insert(('ACME', None, 1, 'A'))
+    path = write_csv(tmp_path / 'caedec.csv', [('BETA', None, 2, 'B'), ('GAMA', None, 3, 'C'), ('DELTA', None, 4, 'D')])
+
+    stats = load(connection, path, 'append', batch_size=2)
+    assert (stats['read'], stats['inserted'], stats['deleted']) == (3, 3, 0)
+    # append confirma cada bloque
+    assert connection.commits == 2
+    assert len(connection.rows()) == 4
+
+    connection.commits = 0
+    stats = load(connection, path, 'replace', batch_size=2)
+    assert (stats['read'], stats['inserted'], stats['deleted']) == (3, 3, 4)
+    assert connection.commits == 1
+    assert sorted(connection.rows().values()) == sorted([('BETA', None, 2, 'B'), ('GAMA', None, 3, 'C'), ('DELTA', None, 4, 'D')])
+    stored = [row[0] for row in connection.db.execute("SELECT content_hash FROM informacion")]
+    assert content_hash({'nombre': 'BETA', 'caedec': 2, 'descripcion': 'B'}) in stored
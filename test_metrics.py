@@ -0,0 +1,84 @@
+"""
+Pruebas de las métricas (metrics.py): temporizadores por etapa, cabecera
+Server-Timing y formato de texto de Prometheus en /metrics:
+
+    python -m pytest -q test_metrics.py
+"""
+import os
+import re
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pytest
+
+from metrics import (Registry, STAGE_SECONDS, current_request_timings, server_timing_header, stage_timer,
+                     start_request_timings)
+
+# Línea de muestra del formato de texto: nombre, etiquetas opcionales y valor
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"'
+                         r'(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*")*\})? (-?[0-9.e+-]+|\+Inf|NaN)$')
+
+
+def test_stage_timer_records_histogram_and_request_timings():
+    before = STAGE_SECONDS.count(stage='prueba')
+    timings = start_request_timings()
+
+    with stage_timer('prueba'):
+        pass
+    with pytest.raises(ValueError):
+        with stage_timer('prueba'):
+            raise ValueError('la etapa falla')
+
+    # Las etapas que fallan también se miden
+    assert STAGE_SECONDS.count(stage='prueba') == before + 2
+    assert current_request_timings() is timings
+    assert [stage for stage, _ in timings] == ['prueba', 'prueba']
+    assert all(elapsed >= 0 for _, elapsed in timings)
+    assert server_timing_header([('search', 0.0123), ('llm', 1.5)]) == 'search;dur=12.30, llm;dur=1500.00'
+
+
+def test_registry_renders_prometheus_text_format():
+    registry = Registry()
+    counter = registry.counter('prueba_total', 'Contador de prueba')
+    histogram = registry.histogram('prueba_seconds', 'Histograma de prueba', buckets=(0.1, 1))
+    registry.gauge('prueba_estado', 'Gauge de prueba', lambda: {'b': 2, 'a': 1.5}, label='estado')
+    counter.inc(endpoint='chat')
+    counter.inc(2, endpoint='con "comillas"\n')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(3)
+
+    lines = registry.render().splitlines()
+    assert lines[:4] == [
+        '# HELP prueba_total Contador de prueba',
+        '# TYPE prueba_total counter',
+        'prueba_total{endpoint="chat"} 1',
+        'prueba_total{endpoint="con \\"comillas\\"\\n"} 2',
+    ]
+    # Buckets acumulados, +Inf igual al total
+    assert 'prueba_seconds_bucket{le="0.1"} 1' in lines
+    assert 'prueba_seconds_bucket{le="1"} 2' in lines
+    assert 'prueba_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'prueba_seconds_sum 3.55' in lines and 'prueba_seconds_count 3' in lines
+    assert lines[-2:] == ['prueba_estado{estado="a"} 1.5', 'prueba_estado{estado="b"} 2']
+
+
+def test_metrics_endpoint_and_server_timing_header():
+    import app
+
+    client = app.app.test_client()
+    response = client.post('/chat', json={'message': 'que hora es'}, headers={'X-Debug-Timing': '1'})
+    assert response.status_code == 200
+    assert re.fullmatch(r'[a-z_]+;dur=\d+\.\d{2}(, [a-z_]+;dur=\d+\.\d{2})*', response.headers['Server-Timing'])
+    # Sin la cabecera de depuración no se añade
+    assert 'Server-Timing' not in client.post('/chat', json={'message': 'que hora es'}).headers
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    body = response.get_data(as_text=True)
+    assert 'chatai_requests_total{endpoint="chat"}' in body
+    assert '# TYPE chatai_stage_seconds histogram' in body
+    for line in body.splitlines():
+        if line and not line.startswith('#'):
+            assert SAMPLE_LINE.match(line), line
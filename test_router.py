@@ -0,0 +1,45 @@
+"""
+Pruebas del enrutado previo (router.py) contra el índice construido desde
+CAEDEC1.csv, sin MySQL ni Gemini:
+
+    python -m pytest -q test_router.py
+"""
+import pytest
+
+from dataset import DEFAULT_CSV_PATH
+from router import (OFF_TOPIC_REPLY, ROUTE_GREETING, ROUTE_OFF_TOPIC, ROUTE_OPEN, classify_text,
+                    route_message)
+from search_index import SearchIndex
+
+
+@pytest.fixture(scope='module')
+def index():
+    return SearchIndex.from_csv(DEFAULT_CSV_PATH)
+
+
+def test_off_topic_word_alone_skips_the_search():
+    def search(query, limit=5):
+        raise AssertionError('no debería buscar')
+
+    for message in ('que hora es', 'hola, cual es la fecha?', 'version de gemini', 'como esta el clima'):
+        routed = route_message(message, search)
+        assert routed.route == ROUTE_OFF_TOPIC
+        assert routed.reply == OFF_TOPIC_REPLY
+    assert classify_text('hola buenas tardes') == ROUTE_GREETING
+
+
+def test_question_with_off_topic_word_and_data_keywords_is_searched(index):
+    message = 'que empresas hacen programacion de software'
+    assert classify_text(message) is None
+
+    routed = route_message(message, index.search)
+
+    assert routed.route == ROUTE_OPEN
+    assert routed.reply is None
+    assert any('SOFTWARE' in (row['nombre'] or '') + (row['descripcion'] or '') for row in routed.db_results)
+
+
+def test_off_topic_word_without_matches_is_off_topic(index):
+    routed = route_message('pronostico de xqzwvk', index.search)
+    assert routed.route == ROUTE_OFF_TOPIC
+    assert routed.db_results == []
@@ -0,0 +1,79 @@
+"""
+Pruebas de /search contra el índice de CAEDEC1.csv: paginación por clave con
+`next_cursor` y respuestas condicionales con ETag / If-None-Match:
+
+    python -m pytest -q test_search_api.py
+"""
+import os
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def client():
+    # El ETag usa la versión del catálogo: se carga aquí en lugar de esperar al hilo de salud
+    if app.caedec_catalog.get() is None:
+        app.caedec_catalog.refresh()
+    return app.app.test_client()
+
+
+def all_pages(client, url):
+    results, cursor, pages = [], None, 0
+    while True:
+        body = client.get(url + (f"&cursor={cursor}" if cursor else '')).get_json()
+        results.extend(body['results'])
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            return results, pages
+
+
+def test_cursor_walks_every_match_once_in_ranking_order(client):
+    expected = app.ranked_page(['TRANSPORTE'], [60230], limit=10 ** 6)
+    results, pages = all_pages(client, '/search?q=transporte&caedec=60230&limit=7&fields=id,relevancia')
+
+    assert [(row['id'], row['relevancia']) for row in results] == [(row['id'], row['relevancia']) for row in expected]
+    assert len({row['id'] for row in results}) == len(results)
+    assert pages == len(results) // 7 + 1
+    assert results == sorted(results, key=lambda row: (-row['relevancia'], row['id']))
+
+
+def test_invalid_requests_are_rejected(client):
+    assert client.get('/search?q=transporte&cursor=no-es-un-cursor').status_code == 400
+    assert client.get('/search?q=transporte&limit=abc').status_code == 400
+    assert client.get('/search?q=de la').status_code == 400
+
+
+def test_etag_returns_304_without_searching_until_the_data_changes(client, monkeypatch):
+    url = '/search?q=plasticos&limit=5'
+    first = client.get(url)
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'no-cache'
+
+    searches = []
+    ranked_page = app.ranked_page
+    monkeypatch.setattr(app, 'ranked_page', lambda *args, **kwargs: searches.append(args) or ranked_page(*args, **kwargs))
+
+    cached = client.get(url, headers={'If-None-Match': etag})
+    assert cached.status_code == 304 and cached.data == b''
+    assert cached.headers['ETag'] == etag
+    assert searches == []
+
+    # Otra página u otros campos son otra respuesta
+    next_page = client.get(f"{url}&cursor={first.get_json()['next_cursor']}", headers={'If-None-Match': etag})
+    assert next_page.status_code == 200 and next_page.headers['ETag'] != etag
+    assert client.get(url + '&fields=id', headers={'If-None-Match': etag}).status_code == 200
+
+    # Con otra versión de los datos el ETag cambia
+    monkeypatch.setattr(app, 'data_version', lambda: ('index', -1))
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+
+    # Sin catálogo cargado no se puede saber si cambió: sin ETag
+    monkeypatch.setattr(app, 'data_version', lambda: None)
+    unknown = client.get(url, headers={'If-None-Match': etag})
+    assert unknown.status_code == 200 and 'ETag' not in unknown.headers
@@ -0,0 +1,151 @@
+"""
+Pruebas de /search/export: NDJSON, CSV y gzip desde el índice de
+CAEDEC1.csv, y el límite de exportaciones simultáneas contra la BD con un
+cursor falso:
+
+    python -m pytest -q test_search_export.py
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import threading
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pytest
+
+import app
+from dataset import CSV_HEADER
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def ndjson(data: bytes):
+    return [json.loads(line) for line in data.decode('utf-8').splitlines()]
+
+
+def test_ndjson_export_streams_every_match_in_id_order(client, monkeypatch):
+    monkeypatch.setattr(app, 'EXPORT_CHUNK_ROWS', 7)
+    response = client.get('/search/export?q=plasticos')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert 'informacion.ndjson' in response.headers['Content-Disposition']
+    rows = ndjson(response.data)
+    expected = sorted(app.search_index.score(['PLASTICOS'], []))
+    assert [row['id'] for row in rows] == [app.search_index.ids[pos] for pos in expected]
+    assert len(rows) > 7 and list(rows[0]) == list(app.EXPORT_FIELDS)
+
+    limited = ndjson(client.get('/search/export?q=plasticos&fields=nombre,id&limit=3').data)
+    assert limited == [{'nombre': row['nombre'], 'id': row['id']} for row in rows[:3]]
+
+
+def test_csv_export_uses_the_dataset_header(client):
+    response = client.get('/search/export?caedec=74990&format=csv')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    records = list(csv.reader(io.StringIO(response.get_data(as_text=True)), delimiter=';'))
+    assert records[0] == CSV_HEADER
+    assert len(records) - 1 == len(app.search_index.score([], [74990])) > 0
+    assert all(record[2] == '74990' for record in records[1:])
+
+
+def test_gzip_export_matches_the_plain_export(client):
+    plain = client.get('/search/export?q=transporte&format=csv').data
+
+    by_param = client.get('/search/export?q=transporte&format=csv&gzip=1')
+    assert by_param.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(by_param.data) == plain
+
+    by_header = client.get('/search/export?q=transporte&format=csv', headers={'Accept-Encoding': 'gzip'})
+    assert by_header.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(by_header.data) == plain
+
+
+def test_invalid_parameters_are_rejected(client):
+    assert client.get('/search/export?format=xml').status_code == 400
+    assert client.get('/search/export?fields=nombre,clave').status_code == 400
+    assert client.get('/search/export?caedec=abc').status_code == 400
+
+
+class FakeExportCursor:
+    def __init__(self, rows, fail_after=None):
+        self.rows = list(rows)
+        self.fail_after = fail_after
+        self.fetches = 0
+
+    def fetchmany(self, size):
+        if self.fail_after is not None and self.fetches >= self.fail_after:
+            raise RuntimeError('conexión perdida')
+        self.fetches += 1
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+
+class FakeExportConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ExportState:
+    def __init__(self):
+        self.opened = []
+        # Bloques que se leen antes de que falle el cursor (None = no falla)
+        self.fail_after = None
+
+
+@pytest.fixture
+def sql_export(monkeypatch):
+    """Exportación desde la BD con una sola plaza y un cursor falso por petición."""
+    monkeypatch.setattr(app, 'search_index', None)
+    monkeypatch.setattr(app, 'export_slots', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(app, 'EXPORT_CHUNK_ROWS', 2)
+    state = ExportState()
+
+    def open_export_cursor(text_keywords, caedec_values, fields, limit=None):
+        connection = FakeExportConnection()
+        state.opened.append(connection)
+        return connection, FakeExportCursor([(i, f"EMPRESA {i}") for i in range(1, 6)], state.fail_after)
+
+    monkeypatch.setattr(app, 'open_export_cursor', open_export_cursor)
+    return state
+
+
+def test_export_slots_limit_concurrent_database_exports(client, sql_export):
+    first = client.get('/search/export?fields=id,nombre', buffered=False)
+    assert first.status_code == 200
+
+    # Mientras la primera descarga sigue abierta no hay plaza
+    busy = client.get('/search/export?fields=id,nombre')
+    assert busy.status_code == 503
+    assert busy.headers['Retry-After'] == str(app.EXPORT_RETRY_AFTER)
+    assert len(sql_export.opened) == 1
+
+    assert [row['id'] for row in ndjson(b''.join(first.response))] == [1, 2, 3, 4, 5]
+    first.close()
+    assert sql_export.opened[0].closed
+
+    # Al terminar la plaza se libera
+    second = client.get('/search/export?fields=id,nombre')
+    assert second.status_code == 200 and len(ndjson(second.data)) == 5
+
+
+def test_failed_export_releases_its_slot(client, sql_export):
+    sql_export.fail_after = 1
+    response = client.get('/search/export?fields=id,nombre', buffered=False)
+    with pytest.raises(RuntimeError):
+        b''.join(response.response)
+    response.close()
+    assert sql_export.opened[0].closed
+
+    sql_export.fail_after = None
+    assert client.get('/search/export?fields=id,nombre').status_code == 200
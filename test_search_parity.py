@@ -0,0 +1,154 @@
+"""
+Paridad entre el índice en memoria (search_index.py) y la búsqueda con LIKE
+en SQL sobre las mismas filas. El SQL se ejecuta en SQLite con un LIKE que
+imita al de MySQL (``\\`` como carácter de escape por defecto):
+
+    python -m pytest -q test_search_parity.py
+"""
+import os
+import re
+import sqlite3
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pytest
+
+from search_index import SearchIndex, extract_keywords, parse_caedec_numbers
+
+ROWS = [
+    {'id': 1, 'nombre': 'DESCUENTOS 50% S.R.L.', 'nombreLargo': None, 'caedec': 52390, 'descripcion': 'VENTA AL POR MENOR'},
+    {'id': 2, 'nombre': 'ABC_XYZ', 'nombreLargo': 'ABC_XYZ LTDA', 'caedec': 72300, 'descripcion': 'PROCESAMIENTO DE DATOS'},
+    {'id': 3, 'nombre': 'ABCDXYZ', 'nombreLargo': None, 'caedec': 72300, 'descripcion': 'PROCESAMIENTO DE DATOS'},
+    {'id': 4, 'nombre': 'PLASTICOS ANDINOS', 'nombreLargo': 'PLASTICOS ANDINOS S.A.', 'caedec': 25200,
+     'descripcion': 'FABRICACION DE PRODUCTOS DE PLASTICO'},
+    {'id': 5, 'nombre': 'DESCUENTOS 500', 'nombreLargo': None, 'caedec': 52390, 'descripcion': 'VENTA AL POR MENOR'},
+    {'id': 6, 'nombre': 'RUTA A\\B', 'nombreLargo': None, 'caedec': 60230, 'descripcion': 'TRANSPORTE DE CARGA'},
+    {'id': 7, 'nombre': 'RUTA AB', 'nombreLargo': None, 'caedec': 60230, 'descripcion': 'TRANSPORTE DE CARGA POR CARRETERA'},
+]
+
+QUERIES = ['50%', 'C_X', 'C_', 'A\\B', 'plast', 'carga', 'descuentos 52390', 'procesamiento xyz', 'ab']
+
+
+def mysql_like(pattern, value):
+    """LIKE de MySQL: `%` y `_` comodines, `\\` escapa el carácter siguiente."""
+    if pattern is None or value is None:
+        return None
+    regex = []
+    chars = iter(pattern)
+    for c in chars:
+        if c == '\\':
+            regex.append(re.escape(next(chars, '\\')))
+        elif c == '%':
+            regex.append('.*')
+        elif c == '_':
+            regex.append('.')
+        else:
+            regex.append(re.escape(c))
+    return re.fullmatch(''.join(regex), value, re.S) is not None
+
+
+class SqliteConnection:
+    """Conexión con la interfaz de pymysql (DictCursor, parámetros %s) sobre SQLite."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return SqliteCursor(self.db.cursor())
+
+    def close(self):
+        pass
+
+
+class SqliteCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cursor.close()
+
+    def execute(self, sql, params=()):
+        self.cursor.execute(sql.replace('%s', '?'), list(params))
+
+    def fetchall(self):
+        columns = [c[0] for c in self.cursor.description]
+        return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+
+
+@pytest.fixture
+def sql_app(monkeypatch):
+    import app
+
+    db = sqlite3.connect(':memory:', check_same_thread=False)
+    db.create_function('like', 2, mysql_like)
+    db.execute("CREATE TABLE informacion (id INTEGER PRIMARY KEY, nombre TEXT, nombreLargo TEXT, caedec INTEGER,"
+               " descripcion TEXT)")
+    db.executemany("INSERT INTO informacion VALUES (:id, :nombre, :nombreLargo, :caedec, :descripcion)", ROWS)
+    monkeypatch.setattr(app, 'get_db_connection', lambda: SqliteConnection(db))
+    return app
+
+
+def test_like_pattern_escapes_wildcards():
+    import app
+
+    assert app.like_pattern('C_X') == '%C\\_X%'
+    assert app.like_pattern('50%') == '%50\\%%'
+    assert app.like_pattern('A\\B') == '%A\\\\B%'
+    assert mysql_like(app.like_pattern('C_X'), 'ABC_XYZ') and not mysql_like(app.like_pattern('C_X'), 'ABCDXYZ')
+
+
+def test_index_and_sql_return_the_same_ranking(sql_app, monkeypatch):
+    app = sql_app
+    index = SearchIndex(ROWS)
+    for query in QUERIES:
+        text_keywords, numbers = extract_keywords(query)
+        caedec_values = parse_caedec_numbers(numbers)
+
+        monkeypatch.setattr(app, 'search_index', index)
+        from_index = app.ranked_page(text_keywords, caedec_values, limit=len(ROWS))
+        monkeypatch.setattr(app, 'search_index', None)
+        from_sql = app.ranked_page(text_keywords, caedec_values, limit=len(ROWS))
+
+        assert [(r['id'], r['relevancia']) for r in from_index] == [(r['id'], r['relevancia']) for r in from_sql], query
+
+    # Los comodines se comparan como caracteres literales en ambos lados
+    monkeypatch.setattr(app, 'search_index', None)
+    assert [r['id'] for r in app.ranked_page(['C_X'], [])] == [2]
+    assert [r['id'] for r in app.ranked_page(['50%'], [])] == [1]
+
+
+def test_batch_search_matches_single_searches(sql_app, monkeypatch):
+    app = sql_app
+    index = SearchIndex(ROWS)
+    monkeypatch.setattr(app, 'search_index', None)
+    # Bloques de dos consultas: varias idas a la BD con candidatos de otras consultas mezclados
+    monkeypatch.setattr(app, 'BATCH_SEARCH_CHUNK', 2)
+
+    results = app.search_many_exact(QUERIES + QUERIES[:2], limit=len(ROWS))
+
+    assert list(results) == QUERIES
+    for query in QUERIES:
+        assert results[query] == index.search(query, len(ROWS)), query
+
+
+def test_sql_keyset_pages_match_the_index(sql_app, monkeypatch):
+    app = sql_app
+    index = SearchIndex(ROWS)
+    text_keywords, caedec_values = ['DESCUENTOS', 'PROCESAMIENTO', 'CARGA'], [60230]
+
+    def pages(search_index):
+        monkeypatch.setattr(app, 'search_index', search_index)
+        rows, after = [], None
+        while True:
+            page = app.ranked_page(text_keywords, caedec_values, after, limit=2)
+            rows.extend((row['id'], row['relevancia']) for row in page)
+            if len(page) < 2:
+                return rows
+            after = (page[-1]['relevancia'], page[-1]['id'])
+
+    from_index = pages(index)
+    assert len(from_index) == 6
+    assert pages(None) == from_index
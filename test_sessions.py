@@ -0,0 +1,64 @@
+"""
+Pruebas de las sesiones de conversación (sessions.py):
+
+    python -m pytest -q test_sessions.py
+"""
+import threading
+
+from sessions import SessionStore, is_follow_up
+
+ROWS = [{'id': 1, 'nombre': 'ESTANCIAS SAN JUAN', 'caedec': 1111, 'descripcion': 'CULTIVO DE CEREALES'}]
+
+
+def test_history_is_bounded_and_keeps_last_rows():
+    store = SessionStore(max_turns=2)
+    session = store.get('sesion-prueba-1')
+    for i in range(3):
+        store.record(session, f'pregunta {i}', f'respuesta {i}', ROWS, includes_data=True)
+
+    assert [user for user, _, _ in session.history()] == ['pregunta 1', 'pregunta 2']
+    assert session.last_rows == ROWS
+    assert session.has_context_for(ROWS)
+    assert session.contents('otra')[-1] == {'role': 'user', 'parts': [{'text': 'otra'}]}
+    assert is_follow_up('y cual es su descripcion?')
+
+
+def test_reads_while_other_requests_record_turns():
+    store = SessionStore(max_turns=50)
+    session = store.get('sesion-prueba-2')
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            store.record(session, f'pregunta {i}', 'respuesta', ROWS, includes_data=bool(i % 2))
+            i += 1
+
+    def reader():
+        try:
+            for _ in range(2000):
+                session.contents('pregunta')
+                session.context_key()
+                session.has_context_for(ROWS)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer) for _ in range(2)]
+    for t in threads:
+        t.start()
+    try:
+        reader()
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+    assert errors == []
+
+
+def test_stop_word_only_messages_are_not_follow_ups():
+    for message in ('que', 'cuales son las empresas', 'y?', 'de la'):
+        assert not is_follow_up(message), message
+    for message in ('¿a qué se dedica la primera?', 'y esa?', 'y la otra'):
+        assert is_follow_up(message), message
+    assert not is_follow_up('y la de caedec 1111?')
@@ -0,0 +1,150 @@
+"""
+Pruebas de la agrupación de peticiones idénticas (singleflight.py) con un
+generador falso lento, sin MySQL ni Gemini:
+
+    python -m pytest -q test_singleflight.py
+"""
+import json
+import os
+import threading
+import time
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pytest
+
+from singleflight import SingleFlight
+
+SLOW_SECONDS = 0.3
+CONCURRENT = 8
+QUESTION = 'empresas de plasticos en la paz'
+
+
+def run_concurrently(fn, n=CONCURRENT):
+    """Ejecuta `fn()` en `n` hilos que arrancan a la vez y devuelve sus resultados."""
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def worker(i):
+        barrier.wait()
+        results[i] = fn()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+class SlowFakeGenerator:
+    """Generador de respuestas falso: tarda SLOW_SECONDS y cuenta sus llamadas."""
+
+    def __init__(self, reply='Respuesta generada una sola vez.'):
+        self.reply = reply
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.calls += 1
+
+    def generate(self, user_question, db_results, session=None):
+        self._count()
+        time.sleep(SLOW_SECONDS)
+        return self.reply
+
+    def stream(self, user_question, db_results, session=None):
+        self._count()
+        for word in self.reply.split(' '):
+            time.sleep(SLOW_SECONDS / 3)
+            yield word + ' '
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    fake = SlowFakeGenerator()
+
+    results = run_concurrently(lambda: flight.do('clave', lambda: fake.generate('q', [])))
+
+    assert fake.calls == 1
+    assert all(value == fake.reply for value, _ in results)
+    assert sum(shared for _, shared in results) == CONCURRENT - 1
+    assert flight.stats() == {'in_flight': 0, 'leaders': 1, 'coalesced': CONCURRENT - 1}
+
+
+def test_waiters_receive_the_leader_error():
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(SLOW_SECONDS)
+        raise RuntimeError('fallo del modelo')
+
+    def call():
+        try:
+            flight.do('clave', failing)
+        except RuntimeError as e:
+            return str(e)
+
+    assert run_concurrently(call) == ['fallo del modelo'] * CONCURRENT
+    # La clave se libera: la siguiente llamada vuelve a ejecutar la función
+    assert flight.do('clave', lambda: 'ok') == ('ok', False)
+
+
+def test_wait_timeout():
+    flight = SingleFlight()
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(SLOW_SECONDS)
+        return 'tarde'
+
+    leader = threading.Thread(target=flight.do, args=('clave', slow))
+    leader.start()
+    started.wait()
+    with pytest.raises(TimeoutError):
+        flight.do('clave', slow, timeout=0.01)
+    leader.join()
+
+
+@pytest.fixture
+def chat_app(monkeypatch):
+    import app
+
+    fake = SlowFakeGenerator()
+    monkeypatch.setattr(app, 'COALESCE_REQUESTS', True)
+    monkeypatch.setattr(app, 'needs_llm_call', lambda *args, **kwargs: True)
+    monkeypatch.setattr(app, 'generate_ai_response_with_context', fake.generate)
+    monkeypatch.setattr(app, 'stream_ai_response_with_context', fake.stream)
+    return app, fake
+
+
+def test_chat_requests_share_one_llm_call(chat_app):
+    app, fake = chat_app
+    before = app.COALESCED.value(kind='llm')
+
+    def post():
+        response = app.app.test_client().post('/chat', json={'message': QUESTION})
+        return response.status_code, response.get_json()['reply']
+
+    results = run_concurrently(post)
+
+    assert fake.calls == 1
+    assert results == [(200, fake.reply)] * CONCURRENT
+    assert app.COALESCED.value(kind='llm') - before == CONCURRENT - 1
+
+
+def test_stream_requests_share_one_llm_call(chat_app):
+    app, fake = chat_app
+
+    def post():
+        response = app.app.test_client().post('/chat/stream', json={'message': QUESTION})
+        body = response.get_data(as_text=True)
+        return ''.join(json.loads(line[5:])['text']
+                       for line in body.splitlines() if line.startswith('data:') and '"text"' in line)
+
+    results = run_concurrently(post)
+
+    assert fake.calls == 1
+    assert [text.strip() for text in results] == [fake.reply] * CONCURRENT
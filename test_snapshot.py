@@ -0,0 +1,70 @@
+"""
+Pruebas del snapshot columnar (snapshot.py): el índice, el catálogo CAEDEC y
+/suggest abiertos desde el snapshot dan lo mismo que desde CAEDEC1.csv:
+
+    python -m pytest -q test_snapshot.py
+"""
+import random
+
+import pytest
+
+from caedec_catalog import CaedecCatalog
+from dataset import DEFAULT_CSV_PATH
+from search_index import SearchIndex
+from snapshot import Row, Snapshot, _csv_rows, write_snapshot
+from suggest import SuggestIndex
+
+QUERIES = ['plast', 'carga', 'descuentos 52390', 'ab', 'servicios de transporte', 'caedec 74990', '1111',
+           'holandes', 'procesamiento xyz']
+
+
+@pytest.fixture(scope='module')
+def indexes(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('snapshot') / 'informacion.snap')
+    write_snapshot(_csv_rows(DEFAULT_CSV_PATH), path)
+    snapshot_index = SearchIndex.from_snapshot(path)
+    yield SearchIndex.from_csv(DEFAULT_CSV_PATH), snapshot_index
+    snapshot_index.rows.close()
+
+
+def test_snapshot_index_matches_csv_index(indexes):
+    csv_index, snapshot_index = indexes
+    assert isinstance(snapshot_index.rows, Snapshot)
+    assert len(snapshot_index) == len(csv_index)
+
+    for query in QUERIES:
+        assert snapshot_index.search(query, 20) == csv_index.search(query, 20), query
+
+    # Subcadenas al azar de tokens del vocabulario, incluidas las de 1 a 3 caracteres
+    rng = random.Random(7)
+    terms = list(csv_index._terms)
+    for _ in range(500):
+        term = rng.choice(terms)
+        start = rng.randrange(len(term))
+        keyword = term[start:start + rng.randint(1, 6)]
+        assert snapshot_index._lookup(keyword) == csv_index._lookup(keyword), keyword
+
+
+def test_catalog_and_suggest_read_the_snapshot_columns(indexes, monkeypatch):
+    csv_index, snapshot_index = indexes
+    csv_catalog = CaedecCatalog(csv_index.rows)
+
+    # Construirlos no debe materializar filas del snapshot
+    created = []
+    original_init = Row.__init__
+    monkeypatch.setattr(Row, '__init__', lambda self, *args: created.append(args) or original_init(self, *args))
+    catalog = CaedecCatalog(snapshot_index.rows)
+    suggest = SuggestIndex(snapshot_index.rows, catalog)
+    assert created == []
+
+    assert len(catalog) == len(csv_catalog)
+    assert catalog.total_companies == csv_catalog.total_companies
+    assert catalog.page(None, 20) == csv_catalog.page(None, 20)
+    code = catalog.page(None, 1)[0].code
+    assert [dict(row) for row in catalog.companies(code, limit=5)] == csv_catalog.companies(code, limit=5)
+    assert catalog.lookup([code], 3) == csv_catalog.lookup([code], 3)
+    assert len(created) == 8
+
+    csv_suggest = SuggestIndex(csv_index.rows, csv_catalog)
+    for prefix in ('pla', 'artes', '749', 'cooperativa'):
+        assert suggest.suggest(prefix) == csv_suggest.suggest(prefix), prefix
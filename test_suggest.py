@@ -0,0 +1,63 @@
+"""
+Pruebas de /suggest (suggest.py) y de su reconstrucción junto con el
+catálogo CAEDEC, con filas falsas en lugar de la tabla:
+
+    python -m pytest -q test_suggest.py
+"""
+import os
+
+os.environ.setdefault('SEARCH_INDEX_SOURCE', 'csv')
+
+import pytest
+
+from suggest import SuggestIndex
+
+ROWS = [
+    {'id': 1, 'nombre': 'PLASTICOS ANDINOS', 'nombreLargo': 'PLASTICOS ANDINOS S.R.L.', 'caedec': 25200,
+     'descripcion': 'FABRICACION DE PRODUCTOS DE PLASTICO'},
+    {'id': 2, 'nombre': 'PANADERIA LA ESPIGA', 'nombreLargo': None, 'caedec': 15410,
+     'descripcion': 'ELABORACION DE PRODUCTOS DE PANADERIA'},
+]
+
+
+def suggested(client, prefix):
+    response = client.get('/suggest', query_string={'q': prefix})
+    assert response.status_code == 200
+    return [s['label'] for s in response.get_json()['suggestions']]
+
+
+@pytest.fixture
+def fake_table(monkeypatch):
+    import app
+
+    holder = app.caedec_catalog
+    table = {'rows': list(ROWS)}
+    monkeypatch.setattr(holder, 'load_version', lambda: (len(table['rows']), max(r['id'] for r in table['rows'])))
+    monkeypatch.setattr(holder, 'load_rows', lambda: list(table['rows']))
+    holder.refresh(force=True)
+    yield app, table
+    monkeypatch.undo()
+    holder.refresh(force=True)
+
+
+def test_name_and_activity_prefixes():
+    index = SuggestIndex(ROWS)
+    assert [s.label for s in index.suggest('plast')] == ['PLASTICOS ANDINOS']
+    # Palabra interior del nombre
+    assert [s.value for s in index.suggest('espiga')] == ['PANADERIA LA ESPIGA']
+
+
+def test_suggest_index_follows_catalog_refreshes(fake_table):
+    app, table = fake_table
+    client = app.app.test_client()
+    assert suggested(client, 'plast')[0] == 'PLASTICOS ANDINOS'
+    assert suggested(client, 'metal') == []
+
+    # Se borra una empresa y se inserta otra: el índice cambia en la siguiente comprobación de versión
+    table['rows'] = [ROWS[1], {'id': 3, 'nombre': 'METALURGICA DEL SUR', 'nombreLargo': None, 'caedec': 28990,
+                               'descripcion': 'FABRICACION DE PRODUCTOS METALICOS'}]
+    app.caedec_catalog.refresh()
+
+    assert suggested(client, 'metal')[0] == 'METALURGICA DEL SUR'
+    assert 'PLASTICOS ANDINOS' not in suggested(client, 'plast')
+    assert app.get_suggest_index().version == (2, 3)